@@ -16,10 +16,8 @@ import numpy as np
 from functools import partial
 
 from itmlogic.misc.qerfi import qerfi
-from itmlogic.preparatory_subroutines.qlra import qlra
-from itmlogic.lrprop import lrprop
-from itmlogic.statistics.avar import avar
-from terrain_module import terrain_area
+from itmlogic.area import area_distances, area_loss
+from terrain_module import TileCache, build_tile_cache, terrain_area
 
 # #set up file paths
 CONFIG = configparser.ConfigParser()
@@ -39,10 +37,11 @@ def itmlogic_area(main_user_defined_parameters):
     main_user_defined_parameters : dict
         User defined parameters.
 
-    Returns
-    -------
-    output : list of dicts
-        Contains model output results.
+    Yields
+    ------
+    row : dict
+        Contains a model output result, so that the results can be written as they are
+        found.
 
     """
     prop = main_user_defined_parameters
@@ -102,42 +101,11 @@ def itmlogic_area(main_user_defined_parameters):
     ZL = qerfi([x / 100 for x in QL])[0]
     ZC = qerfi([x / 100 for x in QC])
 
-    #The number of confidence intervals requested
-    NC = len(QC)
-
-    #Don't allow negative distances
-    if (D0 <= 0):
-        D0 = DS1
-
-    #Set initial distance to 2 km if D0<=0
-    if (D0 <= 0):
-        D0= 2
-
-    #If final distance less than initial, only do one distance
-    if (D1 <= D0) or (DS1 <= 0):
-        ND = 1
-        D1 = D0
-    #Otherwise compute the number of distance points in the loop
-    #and recompute the final distance using this grid
-    else:
-        DS = DS1
-        ND = math.floor((D1 - D0) / DS + 1.75)
-        D1 = D0 + (ND - 1) * DS
-
-    #Repeat these corrections for the "coarse" grid in range that follows the fine grid
-    if (D2 <= D1 ) or ( DS2 <= 0):
-        NDC = 0 #If input parameters are wrong, don't do a coarse grid
-    #Otherwise set up appropriate coarse grid
-    else:
-        NDC = ND
-        ND = math.floor((D2 - D1) / DS2 + 0.75)
-        D2 = D1 + ND * DS2
-        ND = NDC + ND
+    #Distances (km) of the fine grid in range, and of the coarse grid beyond it
+    DD = area_distances(D0, D1, DS1, D2, DS2)
 
     #Standard Earth curvature parameter
     prop['gma'] = 157E-9
-    #Scale factor for converting Np/km to dB/km
-    DB = 8.685890
     #Scale factor to convert km to m
     AKM = 1000
 
@@ -169,57 +137,17 @@ def itmlogic_area(main_user_defined_parameters):
         prop['zgnd'] = prop['zgnd'] / zq
 
     #Qlra initializes all the required parameters for area-prediction mode given
-    #siting type and other params already set in "prop"
-    prop = qlra(KST, prop)
+    #siting type and other params already set in "prop", and the loss is then found at
+    #every distance (columns) for every confidence level (rows) in one call
+    loss, prop = area_loss(prop, KST, DD * AKM, ZT, ZL, np.array(ZC)[:, None])
 
-    #Starting distances for loop over range
-    D = D0
-    #First range step is that of the fine grid
-    DT = DS
-
-    FS = []
-    DD = []
-
-    output = []
-
-    for JD in range(0, ND): #0-22
-
-        #Ensure that AVAR routines adjust only for distance (not quantiles which are set)
-        prop['lvar'] = max(1, prop['lvar'])
-
-        #Compute baseline propagation loss at current range
-        prop = lrprop(D * AKM, prop)
-
-        #Compute and store baseline loss
-        FS.append(DB * np.log(2 * prop['wn'] * prop['dist']))
-
-        #Store distance at this increment
-        DD.append(D)
-
-        #Loop over confidence intervals requested by user
-        for JC in range(0, NC): #0-3
-
-            #Get confidence interval
-            confidence_level = QC[JC]
-
-            #Compute adjustment for specified confidence levels
-            avar1, prop = avar(ZT, ZL, ZC[JC], prop)
-
-            #Store results
-            output.append({
+    for JD, D in enumerate(DD.tolist()):
+        for JC, confidence_level in enumerate(QC):
+            yield {
                 'distance_km': D,
                 'confidence_level_%': confidence_level,
-                'propagation_loss_dB': FS[JD] + avar1 #Add in the adjustment for this level
-                })
-
-        #Switch to the coarse grid increment in range when we get there
-        if JD + 1 == NDC:
-            DT = DS2
-
-        #Increment range
-        D = D + DT
-
-    return output
+                'propagation_loss_dB': float(loss[JC, JD])
+                }
 
 
 def csv_writer(data, directory, filename):
@@ -228,8 +156,9 @@ def csv_writer(data, directory, filename):
 
     Parameters
     ----------
-    data : list of dicts
-        Data to be written.
+    data : iterable of dicts
+        Data to be written. A generator is written row by row as it is consumed,
+        without holding the rows in memory.
     directory : string
         Folder to write the results to.
     filename : string
@@ -240,13 +169,21 @@ def csv_writer(data, directory, filename):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-    fieldnames = []
-    for name, value in data[0].items():
-        fieldnames.append(name)
+    #The fieldnames are taken from the first row, and no rows give an empty file
+    data = iter(data)
+    first = next(data, None)
 
     with open(os.path.join(directory, filename), 'w') as csv_file:
+        if first is None:
+            return
+
+        fieldnames = []
+        for name, value in first.items():
+            fieldnames.append(name)
+
         writer = csv.DictWriter(csv_file, fieldnames, lineterminator = '\n')
         writer.writeheader()
+        writer.writerow(first)
         writer.writerows(data)
 
 
@@ -270,11 +207,16 @@ if __name__ == '__main__':
 
     print('Getting Terrain Irregularity Parameter (delta h) (in meters)')
     #Terrain Irregularity Parameter delta h (in meters)
-    tip = terrain_area(
-        os.path.join(dem_path, 'S_AVE_DSM.vrt'),
-        transmitter['geometry']['coordinates'][0],
-        transmitter['geometry']['coordinates'][1],
-        cell_range)
+    #Convert the mosaic to a memory-mapped tile cache once, and sample through it
+    tile_cache = build_tile_cache(
+        os.path.join(dem_path, 'S_AVE_DSM.vrt'), os.path.join(DATA_PROCESSED, 'tiles'))
+
+    with TileCache(tile_cache) as dem:
+        tip = terrain_area(
+            dem,
+            transmitter['geometry']['coordinates'][0],
+            transmitter['geometry']['coordinates'][1],
+            cell_range)
     print('TIP for AST DEM', tip)
 
     #DEFINE MAIN USER PARAMETERS
@@ -0,0 +1,221 @@
+"""
+Coverage map runner.
+
+Predicts the propagation loss from a single transmitter to every cell of a raster
+within a radius, and writes the result as a GeoTIFF.
+
+"""
+import configparser
+import os
+import math
+import numpy as np
+
+import rasterio
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.transform import from_origin
+from rasterio.warp import reproject, transform_bounds
+from rasterio.windows import Window, from_bounds
+
+from itmlogic.coverage import coverage_map
+
+# #set up file paths
+CONFIG = configparser.ConfigParser()
+CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
+BASE_PATH = CONFIG['file_locations']['base_path']
+
+DATA_PROCESSED = os.path.join(BASE_PATH, 'processed')
+RESULTS = os.path.join(BASE_PATH, '..', 'results')
+
+
+def read_dem_window(dem, tx, radius, resolution):
+    """
+    Reads the Digital Elevation Model around a transmitter once, onto a square grid in an
+    azimuthal equidistant projection centred on the transmitter.
+
+    Parameters
+    ----------
+    dem : str
+        Path to the available Digital Elevation Model as single raster file or vrt.
+    tx : tuple
+        Longitude and latitude of the transmitter.
+    radius : float
+        Radius of the coverage area (meters).
+    resolution : float
+        Width of a grid cell (meters).
+
+    Returns
+    -------
+    elevation : numpy.ndarray
+        Elevations (meters), with the transmitter at the centre cell.
+    transform : affine.Affine
+        Transform of the grid.
+    crs : rasterio.crs.CRS
+        Coordinate reference system of the grid.
+
+    """
+    half = int(radius // resolution)
+    extent = (half + 0.5) * resolution
+
+    crs = CRS.from_proj4(
+        '+proj=aeqd +lat_0={} +lon_0={} +x_0=0 +y_0=0 +ellps=WGS84 +units=m'.format(
+            tx[1], tx[0])
+        )
+    transform = from_origin(-extent, extent, resolution, resolution)
+
+    elevation = np.empty((2 * half + 1, 2 * half + 1))
+
+    with rasterio.open(dem) as src:
+        bounds = transform_bounds(crs, src.crs, -extent, -extent, extent, extent)
+
+        #pad the window by a cell so the edges can be interpolated
+        window = from_bounds(*bounds, transform=src.transform)
+        row_off = math.floor(window.row_off) - 1
+        col_off = math.floor(window.col_off) - 1
+        window = Window(
+            col_off, row_off,
+            math.ceil(window.col_off + window.width) + 1 - col_off,
+            math.ceil(window.row_off + window.height) + 1 - row_off
+            )
+
+        source = src.read(1, window=window, boundless=True, fill_value=0)
+
+        reproject(
+            source,
+            elevation,
+            src_transform=src.window_transform(window),
+            src_crs=src.crs,
+            dst_transform=transform,
+            dst_crs=crs,
+            resampling=Resampling.bilinear,
+            )
+
+    return elevation, transform, crs
+
+
+def write_geotiff(data, directory, filename, transform, crs):
+    """
+    Write a grid of values to a GeoTIFF.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Values to be written.
+    directory : string
+        Folder to write the results to.
+    filename : string
+        Name of the file to write.
+    transform : affine.Affine
+        Transform of the grid.
+    crs : rasterio.crs.CRS
+        Coordinate reference system of the grid.
+
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    with rasterio.open(
+        os.path.join(directory, filename), 'w',
+        driver='GTiff', height=data.shape[0], width=data.shape[1], count=1,
+        dtype='float32', crs=crs, transform=transform, nodata=np.nan) as sink:
+        sink.write(data.astype('float32'), 1)
+
+
+def itmlogic_coverage(main_user_defined_parameters, dem, tx, radius, resolution):
+    """
+    Run itmlogic in point to point prediction mode for every cell around a transmitter.
+
+    Parameters
+    ----------
+    main_user_defined_parameters : dict
+        User defined parameters.
+    dem : str
+        Path to the available Digital Elevation Model as single raster file or vrt.
+    tx : tuple
+        Longitude and latitude of the transmitter.
+    radius : float
+        Radius of the coverage area (meters).
+    resolution : float
+        Width of a grid cell (meters).
+
+    Returns
+    -------
+    loss : numpy.ndarray
+        Propagation loss (dB) at each cell.
+    transform : affine.Affine
+        Transform of the grid.
+    crs : rasterio.crs.CRS
+        Coordinate reference system of the grid.
+
+    """
+    prop = main_user_defined_parameters
+
+    elevation, transform, crs = read_dem_window(dem, tx, radius, resolution)
+
+    #Refractivity scaling ens=ens0*exp(-zsys/9460.) for the elevation of the transmitter
+    centre = elevation.shape[0] // 2
+    zsys = elevation[centre, centre]
+
+    prop['wn'] = prop['fmhz'] / 47.7
+    prop['ens'] = prop['ens0']
+
+    if zsys != 0:
+        prop['ens'] = prop['ens'] * math.exp(-zsys / 9460)
+
+    prop['gme'] = prop['gma'] * (1 - 0.04665 * math.exp(prop['ens'] / 179.3))
+
+    zq = complex(prop['eps'], 376.62 * prop['sgm'] / prop['wn'])
+    prop['zgnd'] = np.sqrt(zq - 1)
+
+    if prop['ipol'] != 0:
+        prop['zgnd'] = prop['zgnd'] / zq
+
+    prop['kwx'] = 0
+
+    loss = coverage_map(elevation, (centre, centre), radius, resolution, prop)
+
+    return loss, transform, crs
+
+
+if __name__ == '__main__':
+
+    dem = os.path.join(BASE_PATH, 'S_AVE_DSM.vrt')
+
+    #DEFINE MAIN USER PARAMETERS
+    main_user_defined_parameters = {}
+
+    #Define radio operating frequency (MHz)
+    main_user_defined_parameters['fmhz'] = 800
+
+    #Define antenna heights - transmitter height (m) # receiver height (m)
+    main_user_defined_parameters['hg'] = [30, 1.5]
+
+    #Polarization selection (0=horizontal, 1=vertical)
+    main_user_defined_parameters['ipol'] = 0
+
+    # Terrain relative permittivity
+    main_user_defined_parameters['eps'] = 15
+
+    # Terrain conductivity (S/m)
+    main_user_defined_parameters['sgm'] = 0.005
+
+    # Surface refractivity (N-units): also controls effective Earth radius
+    main_user_defined_parameters['ens0'] = 314
+
+    # Inverse Earth radius
+    main_user_defined_parameters['gma'] = 157E-9
+
+    #Climate, continental temperate, and mode of variability, broadcast
+    #(see itmlogic_p2p)
+    main_user_defined_parameters['klimx'] = 5
+    main_user_defined_parameters['mdvarx'] = 13
+    main_user_defined_parameters['lvar'] = 5
+
+    #Transmitter location (longitude, latitude)
+    transmitter = (26.5, -3.5)
+
+    loss, transform, crs = itmlogic_coverage(
+        main_user_defined_parameters, dem, transmitter, 10000, 30
+        )
+
+    write_geotiff(loss, RESULTS, 'coverage_map.tif', transform, crs)
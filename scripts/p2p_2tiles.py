@@ -23,7 +23,7 @@ from shapely.ops import transform
 from itmlogic.misc.qerfi import qerfi
 from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl
 from itmlogic.statistics.avar import avar
-from terrain_module import terrain_p2p
+from terrain_module import TileCache, build_tile_cache, terrain_p2p
 
 # #set up file paths
 CONFIG = configparser.ConfigParser()
@@ -45,10 +45,11 @@ def itmlogic_p2p(main_user_defined_parameters, surface_profile_m):
     surface_profile_m : list
         Contains surface profile measurements in meters.
 
-    Returns
-    -------
-    output : list of dicts
-        Contains model output results.
+    Yields
+    ------
+    row : dict
+        Contains a model output result, so that the results can be written as they are
+        found.
 
     """
     prop = main_user_defined_parameters
@@ -212,20 +213,17 @@ def itmlogic_p2p(main_user_defined_parameters, surface_profile_m):
     # Reliability levels for predictions
     qr = [1, 10, 50, 90, 99]
 
-    output = []
     for jr in range(0, (nr)):
         for jc in range(0, nc):
             #Compute corrections to free space loss based on requested confidence
             #and reliability quantities
             avar1, prop = avar(zr[jr], 0, zc[jc], prop)
-            output.append({
+            yield {
                 'distance_km': prop['d'],
                 'reliability_level_%': qr[jr],
                 'confidence_level_%': qc[jc],
                 'propagation_loss_dB': fs + avar1 #Add free space loss and correction
-                })
-
-    return output
+                }
 
 
 def csv_writer(data, directory, filename):
@@ -234,8 +232,9 @@ def csv_writer(data, directory, filename):
 
     Parameters
     ----------
-    data : list of dicts
-        Data to be written.
+    data : iterable of dicts
+        Data to be written. A generator is written row by row as it is consumed,
+        without holding the rows in memory.
     directory : string
         Folder to write the results to.
     filename : string
@@ -246,13 +245,21 @@ def csv_writer(data, directory, filename):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-    fieldnames = []
-    for name, value in data[0].items():
-        fieldnames.append(name)
+    #The fieldnames are taken from the first row, and no rows give an empty file
+    data = iter(data)
+    first = next(data, None)
 
     with open(os.path.join(directory, filename), 'w') as csv_file:
+        if first is None:
+            return
+
+        fieldnames = []
+        for name, value in first.items():
+            fieldnames.append(name)
+
         writer = csv.DictWriter(csv_file, fieldnames, lineterminator = '\n')
         writer.writeheader()
+        writer.writerow(first)
         writer.writerows(data)
 
 
@@ -408,8 +415,12 @@ if __name__ == '__main__':
     line = straight_line_from_points(transmitter, receiver)
 
     #Run terrain module
-    measured_terrain_profile, distance_km, points = terrain_p2p(
-        os.path.join(dem_folder, 'S_AVE_DSM.vrt'), line)
+    #Convert the mosaic to a memory-mapped tile cache once, and sample through it
+    tile_cache = build_tile_cache(
+        os.path.join(dem_folder, 'S_AVE_DSM.vrt'), os.path.join(DATA_PROCESSED, 'tiles'))
+
+    with TileCache(tile_cache) as dem:
+        measured_terrain_profile, distance_km, points = terrain_p2p(dem, line)
 
     print("Profile [",
         measured_terrain_profile[0],
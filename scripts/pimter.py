@@ -16,8 +16,8 @@ from functools import partial
 from collections import OrderedDict
 
 from itmlogic.misc.qerfi import qerfi
-from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl
-from itmlogic.statistics.avar import avar
+from itmlogic.preparatory_subroutines.profile_index import ProfileIndex
+from itmlogic.sweep import sweep_heights
 
 CONFIG = configparser.ConfigParser()
 CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
@@ -107,7 +107,9 @@ def run_itmlogic(surface_profile_m, distance_km):
 
     #Length of profile (km)
     prop['d'] = distance_km[-1]/1000
-    prop['pfl'] = PFL
+
+    #Profile indexed once, as it is reused for every Tx height
+    prop['pfl'] = ProfileIndex(PFL)
 
     output = []
     for frequency in range(0, len(frequencies)):
@@ -129,44 +131,38 @@ def run_itmlogic(surface_profile_m, distance_km):
             prop['hg'] = [0, 0]
             prop['hg'][0] = rxht[1]
 
-        #Tx ht (UAV)
-        for iht in range(0, len(txht)):
-
-            hg = txht[iht]
-
-            # Antenna 2 height (m)
-            prop['hg'][1] = hg
-
-            #Setup some intermediate quantities
-            #Initial values for AVAR control parameter:
-            #LVAR=0 for quantile change, 1 for dist change,
-            #2 for HE change, 3 for WN change,
-            # 4 for MDVAR change, 5 for KLIM change
-            prop['lvar'] = 5
-            #Zero out error flag
-            prop['kwx'] = 0
-            prop['klimx'] = 0
-            prop['mdvarx'] = 11
-
-            prop = qlrpfl(prop)
-
-            #Here HE = effective antenna heights
-            #DL = horizon distances
-            #THE = horizon elevation angles
-            #MDVAR = mode of variability calculation: 0=single message mode,
-                #1=accidental mode, 2=mobile mode, 3=broadcast mode,
-                #+10 =point-to-point, +20=interference
-
-            # Free space loss in dB
-            FS = DB * np.log(2 * prop['wn'] * prop['dist'])
-
+        #Tx ht (UAV), swept in a single call
+        #Setup some intermediate quantities
+        #Initial values for AVAR control parameter:
+        #LVAR=0 for quantile change, 1 for dist change,
+        #2 for HE change, 3 for WN change,
+        # 4 for MDVAR change, 5 for KLIM change
+        prop['lvar'] = 5
+        #Zero out error flag
+        prop['kwx'] = 0
+        prop['klimx'] = 0
+        prop['mdvarx'] = 11
+
+        #Here HE = effective antenna heights
+        #DL = horizon distances
+        #THE = horizon elevation angles
+        #MDVAR = mode of variability calculation: 0=single message mode,
+            #1=accidental mode, 2=mobile mode, 3=broadcast mode,
+            #+10 =point-to-point, +20=interference
+        avar1, prop = sweep_heights(
+            prop, [prop['hg'][0], txht],
+            np.array(ZR)[:, None, None], 0, np.array(ZC)[None, :, None]
+            )
+
+        # Free space loss in dB
+        FS = DB * np.log(2 * prop['wn'] * prop['dist'])
 
+        for iht in range(0, len(txht)):
             for jr in range(0, NR):
                 xlb = []
                 for jc in range(0, NC):
-                    avar1, prop = avar(ZR[jr], 0, ZC[jc], prop)
-                    xlb.append(FS + avar1)
-                output.append((prop['fmhz'], hg, qr[jr], xlb[0]))
+                    xlb.append(FS[iht] + avar1[jr, jc, iht])
+                output.append((prop['fmhz'], txht[iht], qr[jr], xlb[0]))
 
     return output
 
@@ -7,9 +7,12 @@ June 2019
 
 """
 import glob
+import json
 import math
 import os
+import shutil
 import sys
+import uuid
 from collections import OrderedDict
 from functools import partial, lru_cache
 
@@ -18,9 +21,422 @@ import pyproj
 import rasterio
 import numpy as np
 from fiona.crs import from_epsg
-from rasterstats import gen_zonal_stats, point_query
-from shapely.ops import transform
-from shapely.geometry import Point, LineString, mapping
+from rasterio.windows import Window, from_bounds, transform as window_transform
+from rasterstats import gen_zonal_stats
+from shapely.geometry import Point, Polygon
+
+from itmlogic.area import dh_grid
+
+
+class DemSource:
+    """
+    A Digital Elevation Model kept open for repeated sampling.
+
+    The rasterio dataset is opened once, and the blocks of the raster are read as they
+    are needed and kept (decompressed, in the data type of the raster) in a least recently used
+    cache, up to a budget in bytes. Points
+    and lines are sampled by bilinear interpolation from the cached blocks, so a batch of
+    links only reads each part of the raster once.
+
+    Parameters
+    ----------
+    path : str
+        Path to the available Digital Elevation Model as single raster file or vrt.
+    cache_bytes : int
+        Budget for the cache of decoded blocks in bytes.
+
+    """
+    def __init__(self, path, cache_bytes=256 * 2**20):
+        self.path = path
+        self.dataset = rasterio.open(path)
+        self.cache_bytes = cache_bytes
+
+        self.width = self.dataset.width
+        self.height = self.dataset.height
+        self.transform = self.dataset.transform
+        self.nodata = self.dataset.nodata
+
+        self.block_height, self.block_width = self.dataset.block_shapes[0]
+
+        self._blocks = OrderedDict()
+        self._size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.dataset.close()
+        self._blocks.clear()
+        self._size = 0
+
+    def _block(self, block_row, block_col):
+        """
+        Return a block of elevations, from the cache or read from the dataset.
+
+        """
+        key = (block_row, block_col)
+
+        if key in self._blocks:
+            self._blocks.move_to_end(key)
+            return self._blocks[key]
+
+        window = Window(
+            block_col * self.block_width, block_row * self.block_height,
+            min(self.block_width, self.width - block_col * self.block_width),
+            min(self.block_height, self.height - block_row * self.block_height),
+        )
+        block = self.dataset.read(1, window=window)
+
+        self._blocks[key] = block
+        self._size += block.nbytes
+
+        while self._size > self.cache_bytes and len(self._blocks) > 1:
+            key, evicted = self._blocks.popitem(last=False)
+            self._size -= evicted.nbytes
+
+        return block
+
+    def read(self, rows, cols):
+        """
+        Read the elevations of raster cells, NaN outside the raster.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            Row of each cell.
+        cols : numpy.ndarray
+            Column of each cell.
+
+        Returns
+        -------
+        z : numpy.ndarray
+            Elevation of each cell.
+
+        """
+        rows, cols = np.broadcast_arrays(
+            np.asarray(rows, dtype=int), np.asarray(cols, dtype=int))
+        z = np.full(rows.shape, np.nan)
+
+        inside = (
+            (rows >= 0) & (rows < self.height) &
+            (cols >= 0) & (cols < self.width)
+        )
+
+        block_rows = rows // self.block_height
+        block_cols = cols // self.block_width
+
+        keys = np.unique(np.stack([block_rows[inside], block_cols[inside]]), axis=1)
+
+        for block_row, block_col in keys.T:
+            block = self._block(block_row, block_col)
+
+            mask = inside & (block_rows == block_row) & (block_cols == block_col)
+            z[mask] = block[
+                rows[mask] - block_row * self.block_height,
+                cols[mask] - block_col * self.block_width,
+            ]
+
+        if self.nodata is not None:
+            z[z == self.nodata] = np.nan
+
+        return z
+
+    def sample(self, x, y):
+        """
+        Sample elevations at points by bilinear interpolation between cell centres.
+
+        Parameters
+        ----------
+        x : array_like
+            Longitude (or x coordinate in the raster CRS) of each point.
+        y : array_like
+            Latitude (or y coordinate in the raster CRS) of each point.
+
+        Returns
+        -------
+        z : numpy.ndarray
+            Elevation of each point. Where the four cells around a point are not all
+            available, at the edge of the raster or next to nodata, the elevation of the
+            cell containing the point is used, as by point_query of rasterstats. NaN
+            outside the raster or in a nodata cell.
+
+        """
+        cols, rows = ~self.transform * (
+            np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+        #cell centres at whole numbers
+        rows = rows - 0.5
+        cols = cols - 0.5
+
+        r0 = np.floor(rows).astype(int)
+        c0 = np.floor(cols).astype(int)
+        fr = rows - r0
+        fc = cols - c0
+
+        top = self.read(r0, c0) * (1 - fc) + self.read(r0, c0 + 1) * fc
+        bottom = self.read(r0 + 1, c0) * (1 - fc) + self.read(r0 + 1, c0 + 1) * fc
+
+        z = top * (1 - fr) + bottom * fr
+
+        #fall back to the nearest cell where not all four cells are available
+        missing = np.isnan(z)
+        if missing.any():
+            nearest = self.read(np.floor(rows + 0.5), np.floor(cols + 0.5))
+            z = np.where(missing, nearest, z)
+
+        return z
+
+    def sample_line(self, start, end, num_samples):
+        """
+        Sample elevations at evenly spaced points along a straight line.
+
+        Parameters
+        ----------
+        start : tuple
+            Coordinates of the start of the line.
+        end : tuple
+            Coordinates of the end of the line.
+        num_samples : int
+            Number of points, including the start and end.
+
+        Returns
+        -------
+        z : numpy.ndarray
+            Elevation of each point.
+
+        """
+        t = np.linspace(0, 1, num_samples)
+
+        return self.sample(
+            start[0] + t * (end[0] - start[0]), start[1] + t * (end[1] - start[1])
+        )
+
+    def read_bounds(self, bounds):
+        """
+        Read the elevations of the cells within a bounding box.
+
+        Parameters
+        ----------
+        bounds : tuple
+            Left, bottom, right and top of the box, in the raster CRS.
+
+        Returns
+        -------
+        z : numpy.ndarray
+            Elevations, NaN outside the raster.
+        transform : affine.Affine
+            Transform of the cells read.
+
+        """
+        window = from_bounds(*bounds, transform=self.transform)
+
+        #every cell the box overlaps, allowing for rounding at the cell edges
+        row_off = math.floor(window.row_off + 1e-6)
+        col_off = math.floor(window.col_off + 1e-6)
+        row_end = math.ceil(window.row_off + window.height - 1e-6)
+        col_end = math.ceil(window.col_off + window.width - 1e-6)
+
+        window = Window(col_off, row_off, col_end - col_off, row_end - row_off)
+
+        rows = np.arange(row_off, row_end)
+        cols = np.arange(col_off, col_end)
+
+        z = self.read(rows[:, None], cols[None, :])
+
+        return z, window_transform(window, self.transform)
+
+
+class TileCache(DemSource):
+    """
+    A Digital Elevation Model read from a tile cache made by build_tile_cache.
+
+    Each tile is a fixed size .npy grid, opened as a read-only memory map the first time
+    it is needed, so only the pages of a tile holding sampled cells are read from disk,
+    and the sampled cells are then copied out of them. Processes sampling the same cache
+    share the pages of the tiles through the operating system, rather than each
+    decompressing the blocks of the source rasters. Points, lines and bounding boxes are
+    sampled as by DemSource.
+
+    Parameters
+    ----------
+    directory : str
+        Folder of the tile cache.
+
+    """
+    def __init__(self, directory):
+        self.path = directory
+
+        with open(os.path.join(directory, 'index.json')) as index_file:
+            index = json.load(index_file)
+
+        self.width = index['width']
+        self.height = index['height']
+        self.transform = rasterio.Affine(*index['transform'])
+        self.crs = index['crs']
+        self.nodata = index['nodata']
+
+        self.block_height = self.block_width = index['tile_size']
+
+        self._blocks = OrderedDict()
+        self._size = 0
+
+    def close(self):
+        self._blocks.clear()
+
+    def _block(self, block_row, block_col):
+        """
+        Return a tile of elevations, as a memory map of its file.
+
+        """
+        key = (block_row, block_col)
+
+        if key not in self._blocks:
+            self._blocks[key] = np.load(
+                os.path.join(self.path, '{}_{}.npy'.format(block_row, block_col)),
+                mmap_mode='r'
+            )
+
+        return self._blocks[key]
+
+
+def build_tile_cache(dem, directory, tile_size=3600):
+    """
+    Convert a Digital Elevation Model (e.g. a vrt mosaic) into a tile cache, of fixed size
+    uncompressed .npy grids and an index, for sampling through TileCache.
+
+    The conversion is only made once. The index records the path, modification time and
+    size of the source and of every file it reads (such as the tiles of a vrt), and the
+    tile size, and the cache is rebuilt if any of them no longer match. The cache is
+    built in a temporary folder beside the directory, which then replaces the directory,
+    so processes converting the same source at once never see, or delete, each other's
+    partial tiles.
+
+    Parameters
+    ----------
+    dem : str
+        Path to the available Digital Elevation Model as single raster file or vrt.
+    directory : str
+        Folder to write the tile cache to.
+    tile_size : int
+        Width and height of each tile in cells. Tiles at the edges are padded with the
+        nodata value.
+
+    Returns
+    -------
+    directory : str
+        Folder of the tile cache.
+
+    """
+    source = _source_stamp(dem)
+
+    if _is_current(directory, source, tile_size):
+        return directory
+
+    build = '{}.{}'.format(os.path.normpath(directory), uuid.uuid4().hex)
+    os.makedirs(build)
+
+    try:
+        with rasterio.open(dem) as src:
+            nodata = src.nodata if src.nodata is not None else -9999
+
+            for block_row in range(math.ceil(src.height / tile_size)):
+                for block_col in range(math.ceil(src.width / tile_size)):
+                    window = Window(
+                        block_col * tile_size, block_row * tile_size, tile_size, tile_size
+                    )
+
+                    tile = np.lib.format.open_memmap(
+                        os.path.join(build, '{}_{}.npy'.format(block_row, block_col)),
+                        mode='w+', dtype=src.dtypes[0], shape=(tile_size, tile_size)
+                    )
+                    tile[:] = src.read(1, window=window, boundless=True, fill_value=nodata)
+                    tile.flush()
+                    del tile
+
+            index = {
+                'width': src.width,
+                'height': src.height,
+                'transform': list(src.transform)[:6],
+                'crs': src.crs.to_wkt(),
+                'nodata': nodata,
+                'tile_size': tile_size,
+                'source': source,
+            }
+
+        with open(os.path.join(build, 'index.json'), 'w') as index_file:
+            json.dump(index, index_file)
+
+        _replace_directory(build, os.path.normpath(directory), source, tile_size)
+
+    finally:
+        if os.path.exists(build):
+            shutil.rmtree(build)
+
+    return directory
+
+
+def _source_stamp(dem):
+    """
+    Path of a Digital Elevation Model, with the path, modification time and size of
+    every file read for it.
+
+    """
+    with rasterio.open(dem) as src:
+        files = set(os.path.abspath(path) for path in src.files)
+
+    files.add(os.path.abspath(dem))
+
+    return {
+        'path': os.path.abspath(dem),
+        'files': [
+            [path, os.path.getmtime(path), os.path.getsize(path)]
+            for path in sorted(files)
+        ],
+    }
+
+
+def _is_current(directory, source, tile_size):
+    """
+    Whether a tile cache exists for the source, with the tile size.
+
+    """
+    try:
+        with open(os.path.join(directory, 'index.json')) as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return False
+
+    return index.get('source') == source and index.get('tile_size') == tile_size
+
+
+def _replace_directory(build, directory, source, tile_size):
+    """
+    Move a newly built tile cache into place, moving aside (and then removing) any
+    stale cache there.
+
+    """
+    while True:
+        try:
+            os.replace(build, directory)
+            return
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+        #another process may have put a current cache in place meanwhile
+        if _is_current(directory, source, tile_size):
+            return
+
+        stale = build + '.stale'
+        try:
+            os.replace(directory, stale)
+        except FileNotFoundError:
+            continue
+
+        shutil.rmtree(stale, ignore_errors=True)
 
 
 def terrain_area(dem, lon, lat, cell_range):
@@ -31,8 +447,9 @@ def terrain_area(dem, lon, lat, cell_range):
 
     Parameters
     ----------
-    dem : str
-        Path to the available Digital Elevation Model as single raster file or vrt.
+    dem : str or DemSource
+        Path to the available Digital Elevation Model as single raster file or vrt, or
+        an open DemSource (or TileCache).
     lon : float
         Longitude of cell point
     lat : float
@@ -49,10 +466,18 @@ def terrain_area(dem, lon, lat, cell_range):
     # Buffer around cell point
     cell_area = geodesic_point_buffer(lon, lat, cell_range)
 
+    if isinstance(dem, DemSource):
+        # Read the cells around the buffer from the cached blocks
+        raster, affine = dem.read_bounds(cell_area.bounds)
+        raster = np.where(np.isnan(raster), -9999, raster)
+    else:
+        raster, affine = dem, None
+
     # Calculate raster stats
     stats = next(gen_zonal_stats(
         [cell_area],
-        dem,
+        raster,
+        affine=affine,
         add_stats={
             'interdecile_range': interdecile_range
         },
@@ -64,6 +489,83 @@ def terrain_area(dem, lon, lat, cell_range):
     return id_range
 
 
+def terrain_area_grid(dem, bounds, cell_range, samples=400):
+    """
+    This module finds the irregular terrain parameter for every cell
+    of the Digital Elevation Model within a bounding box, for area
+    mode runs over many candidate sites.
+
+    Cells are sized in meters at the latitude of the centre of the box.
+
+    Parameters
+    ----------
+    dem : str or DemSource
+        Path to the available Digital Elevation Model as single raster file or vrt, or
+        an open DemSource (or TileCache).
+    bounds : tuple
+        Longitude and latitude of the left, bottom, right and top of the box.
+    cell_range : int
+        Radius of cell area in meters.
+    samples : int
+        Approximate number of elevations used for each cell (see dh_grid).
+
+    Returns
+    -------
+    dh : numpy.ndarray
+        The terrain irregularity parameter of each cell.
+    transform : affine.Affine
+        Transform of the grid, for looking up sites with lookup_grid.
+
+    """
+    if not isinstance(dem, DemSource):
+        with DemSource(dem) as source:
+            return terrain_area_grid(source, bounds, cell_range, samples)
+
+    # Pad the box by the cell range so the cells at its edges see their whole area
+    lat = 0.5 * (bounds[1] + bounds[3])
+    pad_lat = cell_range / 111320
+    pad_lon = pad_lat / math.cos(math.radians(lat))
+
+    elevation, transform = dem.read_bounds((
+        bounds[0] - pad_lon, bounds[1] - pad_lat, bounds[2] + pad_lon, bounds[3] + pad_lat
+    ))
+
+    cellsize = (
+        abs(transform.e) * 111320,
+        abs(transform.a) * 111320 * math.cos(math.radians(lat)),
+    )
+
+    dh = dh_grid(elevation, cell_range, cellsize, samples)
+
+    return dh, transform
+
+
+def lookup_grid(grid, transform, lon, lat):
+    """
+    Look up the values of a grid at sites.
+
+    Parameters
+    ----------
+    grid : numpy.ndarray
+        Grid of values, such as from terrain_area_grid.
+    transform : affine.Affine
+        Transform of the grid.
+    lon : array_like
+        Longitude of each site.
+    lat : array_like
+        Latitude of each site.
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Value of the grid cell containing each site.
+
+    """
+    cols, rows = ~transform * (np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+
+    return grid[np.floor(rows).astype(int), np.floor(cols).astype(int)]
+
+
 def geodesic_point_buffer(lon, lat, distance_m):
     """
     Calculate a buffer a specified number of metres around a lat/lon point.
@@ -82,19 +584,73 @@ def geodesic_point_buffer(lon, lat, distance_m):
     buffer : Shapely object
         Buffered point.
 
+    """
+    return geodesic_point_buffers([lon], [lat], distance_m)[0]
+
+
+def geodesic_point_buffers(lons, lats, distance_m):
+    """
+    Calculate buffers a specified number of metres around many lat/lon points.
+
+    The vertices of a buffer around the origin are found once, and moved to each point
+    with the transformer of its azimuthal equidistant projection, as arrays. The
+    transformers are kept in a cache, keyed on the point, so repeated sites are only
+    set up once.
+
+    Parameters
+    ----------
+    lons : list
+        Longitude of each point.
+    lats : list
+        Latitude of each point.
+    distance_m : int or list
+        Distance in meters, for all points or for each point.
+
+    Returns
+    -------
+    buffers : list of Shapely objects
+        Buffered points.
+
+    """
+    distance_m = np.broadcast_to(np.asarray(distance_m, dtype=float), (len(lons),))
+
+    # Buffer origin by a unit distance
+    x, y = np.array(Point(0, 0).buffer(1).exterior.coords).T
+
+    buffers = []
+    for lon, lat, distance in zip(lons, lats, distance_m):
+        transformer = aeqd_transformer(float(lon), float(lat))
+        buffers.append(Polygon(np.column_stack(
+            transformer.transform(x * distance, y * distance)
+        )))
+
+    return buffers
+
+
+@lru_cache(maxsize=4096)
+def aeqd_transformer(lon, lat):
+    """
+    Transformer from the azimuthal equidistant projection around a
+    lat/lon point to WGS84 / EPSG:4326.
+
+    Parameters
+    ----------
+    lon : float
+        Longitude.
+    lat :  float
+        Latitude.
+
+    Returns
+    -------
+    transformer : pyproj.Transformer
+        The transformer, shared by every call for the same point.
+
     """
     # Azimuthal equidistant projection around lat/lon point
     aeqd = '+proj=aeqd +lat_0={lat} +lon_0={lon} +x_0=0 +y_0=0'
     crs = aeqd.format(lat=lat, lon=lon)
 
-    # To be transformed to WGS84 / EPSG:4326
-    transformer = pyproj.Transformer.from_crs(crs, "epsg:4326", always_xy=True)
-
-    # Buffer origin by distance in metres
-    buf = Point(0, 0).buffer(distance_m)
-
-    # Return transformed
-    return transform(transformer.transform, buf)
+    return pyproj.Transformer.from_crs(crs, "epsg:4326", always_xy=True)
 
 
 def interdecile_range(x):
@@ -104,7 +660,8 @@ def interdecile_range(x):
     Parameters
     ----------
     x : list
-        Terrain profile values.
+        Terrain profile values, or a masked array of which only the values not masked
+        (e.g. inside the zone of zonal statistics) are used.
 
     Returns
     -------
@@ -112,7 +669,8 @@ def interdecile_range(x):
         The terrain irregularity parameter.
 
     """
-    q90, q10 = np.percentile(x, [90, 10])
+    # numpy.percentile ignores the mask of a masked array
+    q90, q10 = np.percentile(np.ma.compressed(x), [90, 10])
 
     interdecile_range = int(round(q90 - q10, 0))
 
@@ -128,55 +686,75 @@ def all_data(x):
     return data[data > 0]
 
 
-def terrain_p2p(dem, line):
+def terrain_p2p(dem, line, return_points=True):
     """
     This module takes a set of point coordinates and returns
     the surface profile.
 
+    The profile is sampled at evenly spaced points along the geodesic
+    between the two ends of the line, from the transmitter to the
+    receiver inclusive.
+
     Parameters
     ----------
-    dem_folder : string
-        Folder path to the available Digital Elevation Model tiles.
+    dem : str or DemSource
+        Path to the available Digital Elevation Model as single raster file or vrt, or
+        an open DemSource (or TileCache).
     line : dict
         Geojson linestring. Must be in WGS84 / EPSG: 4326
-    current_crs : string
-        The current coordinate reference system.
+    return_points : bool
+        Whether to build the geojson sampling points.
 
     Returns
     -------
-    surface_profile :list
+    surface_profile : numpy.ndarray
         Contains the surface profile measurements in meters.
     distance_km : float
         Distance in kilometers between the antenna and receiver.
     points : list of dicts
-        Location of geojson sampling points.
+        Location of geojson sampling points, or None if not requested.
 
     """
-    line_geom = LineString(line['geometry']['coordinates'])
+    coordinates = line['geometry']['coordinates']
+    lon1, lat1 = coordinates[0]
+    lon2, lat2 = coordinates[-1]
 
     # Geographic distance
     geod = pyproj.Geod(ellps="WGS84")
-    distance_m = geod.geometry_length(line_geom)
+    azimuth, back_azimuth, distance_m = geod.inv(lon1, lat1, lon2, lat2)
     distance_km = distance_m / 1e3
 
-    # Interpolate along line to get sampling points
+    # Sampling points along the geodesic
     num_samples = determine_num_samples(distance_m)
-    steps = np.interp(range(num_samples), [0,num_samples], [0, line_geom.length])
-    point_geoms = [line_geom.interpolate(currentdistance) for currentdistance in steps]
+    steps = np.linspace(0, distance_m, num_samples)
+    lons, lats, back_azimuths = geod.fwd(
+        np.full(num_samples, lon1), np.full(num_samples, lat1),
+        np.full(num_samples, azimuth), steps
+    )
 
     # Sample elevation profile
-    surface_profile = point_query(point_geoms, dem)
+    if isinstance(dem, DemSource):
+        surface_profile = dem.sample(lons, lats)
+    else:
+        with DemSource(dem) as source:
+            surface_profile = source.sample(lons, lats)
+
+    if not return_points:
+        return surface_profile, distance_km, None
 
     # Put together point features with raster values
     points = [
         {
             'type': 'Feature',
-            'geometry': mapping(point),
+            'geometry': {
+                'type': 'Point',
+                'coordinates': (float(lon), float(lat)),
+            },
             'properties': {
                 'elevation': float(z),
             }
         }
-        for point, z in zip(point_geoms, surface_profile)
+        for lon, lat, z in zip(lons, lats, surface_profile)
     ]
     return surface_profile, distance_km, points
 
@@ -44,6 +44,8 @@ setup(
     keywords=[
         'Longley-Rice', 'propagation model', 'irregular terrain model'
     ],
+    #multiprocessing.shared_memory, used by the batch runner, needs Python 3.8
+    python_requires='>=3.8',
     setup_requires=[
         'setuptools_scm'
     ],
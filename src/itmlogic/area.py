@@ -0,0 +1,433 @@
+import itertools
+import math
+import numpy as np
+
+from itmlogic.preparatory_subroutines.qlra import qlra
+from itmlogic.lrprop import lrprop_vec
+from itmlogic.statistics.avar import avar_vec
+
+def area_loss(prop, kst, d, zzt=0, zzl=0, zzc=0):
+    """
+    Area prediction of the loss over a range of distances, in a single vectorized call.
+
+    The area mode parameters are set up once by qlra for the siting criteria, and the
+    reference attenuation and its quantiles are then found for every distance at once by
+    lrprop_vec and avar_vec. The other parameters in prop are set as for qlra.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains all input propagation parameters.
+    kst : list
+        Siting criteria for the transmitter and receiver (0=random, 1= "with care",
+        2= "with great care").
+    d : array_like
+        Distances in meters.
+    zzt : array_like
+        Standard normal deviates corresponding to user defined time quantiles.
+    zzl : array_like
+        Standard normal deviates corresponding to user defined location quantiles.
+    zzc : array_like
+        Standard normal deviates corresponding to user defined confidence quantiles.
+
+    Returns
+    -------
+    loss : numpy.ndarray
+        Propagation loss (dB), free space loss plus the attenuation relative to free space,
+        at each distance for each quantile. The distances are the last axis, with the
+        deviates broadcast against them as in avar_vec.
+    prop : dict
+        Contains all input and output propagation parameters.
+
+    """
+    d = np.asarray(d, dtype=float)
+
+    prop = qlra(kst, prop)
+
+    aref, prop = lrprop_vec(d, prop)
+
+    avar1, prop = avar_vec(zzt, zzl, zzc, prop, dist=d, aref=aref)
+
+    #free space loss
+    fs = 8.685890 * np.log(2 * prop['wn'] * d)
+
+    return fs + avar1, prop
+
+
+def area_distances(d0, d1, ds1, d2=0, ds2=0):
+    """
+    Distances of the fine grid in range, and of the coarser grid beyond it, as used by
+    the area prediction mode runner.
+
+    Parameters
+    ----------
+    d0 : float
+        Initial distance (km).
+    d1 : float
+        Maximum distance of the fine grid (km).
+    ds1 : float
+        Increment of the fine grid (km).
+    d2 : float
+        Maximum distance of the coarse grid (km).
+    ds2 : float
+        Increment of the coarse grid (km).
+
+    Returns
+    -------
+    d : numpy.ndarray
+        Distances (km).
+
+    """
+    if d0 <= 0:
+        d0 = ds1
+
+    if d0 <= 0:
+        d0 = 2
+
+    if d1 <= d0 or ds1 <= 0:
+        nd = 1
+        d1 = d0
+    else:
+        nd = math.floor((d1 - d0) / ds1 + 1.75)
+        d1 = d0 + (nd - 1) * ds1
+
+    fine = d0 + np.arange(nd) * ds1
+
+    if d2 <= d1 or ds2 <= 0:
+        return fine
+
+    ndc = math.floor((d2 - d1) / ds2 + 0.75)
+    coarse = d1 + np.arange(1, ndc + 1) * ds2
+
+    return np.concatenate((fine, coarse))
+
+
+def area_prop(prop, fmhz, hg, dh, ens):
+    """
+    Sets up the parameters of an area prediction for a frequency, pair of antenna heights,
+    terrain irregularity and surface refractivity, as in the area prediction mode runner.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains the other input propagation parameters (eps, sgm, ipol, gma, klimx and
+        mdvarx).
+    fmhz : float
+        Frequency (MHz).
+    hg : list
+        Heights of transmitter and receiver off ground (meters).
+    dh : float
+        Terrain irregularity parameter (meters).
+    ens : float
+        Surface refractivity (N-units).
+
+    Returns
+    -------
+    prop : dict
+        Contains all input propagation parameters, ready for area_loss.
+
+    """
+    prop = dict(prop)
+
+    prop['fmhz'] = fmhz
+    prop['hg'] = [hg[0], hg[1]]
+    prop['dh'] = dh
+    prop['ens'] = ens
+
+    prop['kwx'] = 0
+    prop['lvar'] = 0
+    prop['wn'] = fmhz / 47.7
+    prop['gme'] = prop['gma'] * (1 - 0.04665 * math.exp(ens / 179.3))
+
+    zq = complex(prop['eps'], 376.62 * prop['sgm'] / prop['wn'])
+    prop['zgnd'] = math.sqrt(zq.real - 1)
+
+    if prop['ipol'] != 0:
+        prop['zgnd'] = prop['zgnd'] / zq
+
+    return prop
+
+
+class AreaTable:
+    """
+    Precomputed area prediction loss on a grid of frequency, antenna heights, terrain
+    irregularity, surface refractivity and distance, for answers by interpolation rather
+    than running the model.
+
+    The loss is found by area_loss for every point of the grid, for one set of quantiles
+    and siting criteria. Queries interpolate multilinearly between the grid points, with
+    frequency and distance on a log scale, and are clipped to the range of the grid. The
+    error of the interpolation against area_loss is measured when the table is built, at
+    random points within the grid, and kept as error.
+
+    Parameters
+    ----------
+    axes : dict
+        Grid values of each parameter, in AXES order.
+    loss : numpy.ndarray
+        Propagation loss (dB) at each point of the grid.
+    error : float
+        Largest difference (dB) found between the interpolated and the exact loss.
+
+    """
+    AXES = ('fmhz', 'hg0', 'hg1', 'dh', 'ens', 'd')
+
+    LOG_AXES = ('fmhz', 'd')
+
+    def __init__(self, axes, loss, error=np.nan):
+        self.axes = {name: np.asarray(axes[name], dtype=float) for name in self.AXES}
+        self.loss = np.asarray(loss, dtype=float)
+        self.error = float(error)
+
+        self._grid = [
+            np.log(self.axes[name]) if name in self.LOG_AXES else self.axes[name]
+            for name in self.AXES
+        ]
+
+    @classmethod
+    def build(cls, prop, kst, axes, zzt=0, zzl=0, zzc=0, checks=200, seed=0):
+        """
+        Computes the table over a grid of parameters.
+
+        Parameters
+        ----------
+        prop : dict
+            Contains the other input propagation parameters (see area_prop).
+        kst : list
+            Siting criteria for the transmitter and receiver.
+        axes : dict
+            Grid values of each parameter in AXES, with distances in meters.
+        zzt : float
+            Standard normal deviate corresponding to the user defined time quantile.
+        zzl : float
+            Standard normal deviate corresponding to the user defined location quantile.
+        zzc : float
+            Standard normal deviate corresponding to the user defined confidence quantile.
+        checks : int
+            Number of random points at which to measure the interpolation error.
+        seed : int
+            Seed for the random points.
+
+        Returns
+        -------
+        table : AreaTable
+            The table.
+
+        """
+        d = np.asarray(axes['d'], dtype=float)
+        shape = tuple(len(axes[name]) for name in cls.AXES)
+
+        loss = np.empty(shape)
+
+        for index in itertools.product(*[range(n) for n in shape[:-1]]):
+            fmhz, hg0, hg1, dh, ens = [
+                axes[name][i] for name, i in zip(cls.AXES, index)
+            ]
+
+            link = area_prop(prop, fmhz, [hg0, hg1], dh, ens)
+            loss[index], link = area_loss(link, kst, d, zzt, zzl, zzc)
+
+        table = cls(axes, loss)
+
+        #measure the interpolation error against the model between the grid points
+        rng = np.random.default_rng(seed)
+        error = 0
+
+        for _ in range(checks):
+            point = {}
+            for name, grid in zip(cls.AXES, table._grid):
+                value = rng.uniform(grid[0], grid[-1])
+                point[name] = np.exp(value) if name in cls.LOG_AXES else value
+
+            link = area_prop(
+                prop, point['fmhz'], [point['hg0'], point['hg1']], point['dh'],
+                point['ens']
+            )
+            exact, link = area_loss(link, kst, [point['d']], zzt, zzl, zzc)
+
+            error = max(error, abs(table.query(**point) - exact[0]))
+
+        table.error = error
+
+        return table
+
+    def query(self, fmhz, hg0, hg1, dh, ens, d):
+        """
+        Interpolates the loss, for a single point or arrays of points broadcast together.
+
+        Parameters
+        ----------
+        fmhz : array_like
+            Frequency (MHz).
+        hg0 : array_like
+            Height of the transmitter off ground (meters).
+        hg1 : array_like
+            Height of the receiver off ground (meters).
+        dh : array_like
+            Terrain irregularity parameter (meters).
+        ens : array_like
+            Surface refractivity (N-units).
+        d : array_like
+            Distance (meters).
+
+        Returns
+        -------
+        loss : float or numpy.ndarray
+            Propagation loss (dB).
+
+        """
+        values = np.broadcast_arrays(*[
+            np.asarray(value, dtype=float) for value in (fmhz, hg0, hg1, dh, ens, d)
+        ])
+
+        shape = values[0].shape
+        count = len(self.AXES)
+
+        corners = []
+        weights = []
+
+        for axis, (name, grid, value) in enumerate(zip(self.AXES, self._grid, values)):
+            if name in self.LOG_AXES:
+                value = np.log(value)
+
+            value = np.clip(value, grid[0], grid[-1]).ravel()
+
+            if len(grid) == 1:
+                i = np.zeros(value.shape, dtype=int)
+                t = np.zeros(value.shape)
+            else:
+                i = np.searchsorted(grid, value, side='right') - 1
+                i = np.clip(i, 0, len(grid) - 2)
+                t = (value - grid[i]) / (grid[i + 1] - grid[i])
+
+            #the two grid points either side, along an axis of their own
+            corner = np.stack([i, np.minimum(i + 1, len(grid) - 1)])
+            weight = np.stack([1 - t, t])
+
+            axes_shape = [1] * count + [value.size]
+            axes_shape[axis] = 2
+
+            corners.append(corner.reshape(axes_shape))
+            weights.append(weight)
+
+        #gather the corners of the cell around each point, and weight them an axis at a time
+        loss = self.loss[tuple(corners)]
+
+        for weight in weights:
+            weight = weight.reshape((2,) + (1,) * (loss.ndim - 2) + (-1,))
+            loss = (loss * weight).sum(axis=0)
+
+        loss = loss.reshape(shape)
+
+        if loss.ndim == 0:
+            return float(loss)
+
+        return loss
+
+    def save(self, path):
+        """
+        Writes the table to a compressed .npz file.
+
+        """
+        np.savez_compressed(path, loss=self.loss, error=self.error, **self.axes)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a table written by save.
+
+        """
+        with np.load(path) as data:
+            axes = {name: data[name] for name in cls.AXES}
+            return cls(axes, data['loss'], data['error'])
+
+
+def dh_grid(dem, radius, cellsize=1, samples=400, chunk_size=2**22):
+    """
+    Terrain irregularity parameter (delta h) for every cell of an elevation grid, as the
+    interdecile range of the elevations within a radius of each cell.
+
+    The elevations around every cell are read through a fixed stencil of offsets within
+    the radius, moved across the grid a block of rows at a time, so the whole grid is
+    found in one pass. To bound the work per cell, the stencil keeps every stride-th
+    row and column of the disc, with the stride chosen to leave about samples offsets,
+    so the deciles are estimated from a regular sample of the area (a stride of one, for
+    a small radius or a large number of samples, uses every cell and gives the same
+    result as numpy.percentile over the disc). Cells outside the grid and NaN elevations
+    are left out.
+
+    Parameters
+    ----------
+    dem : numpy.ndarray
+        Elevations (meters) on a regular grid, indexed by row and column, with NaN where
+        there is no data.
+    radius : float
+        Radius of the area around each cell (meters).
+    cellsize : float or tuple
+        Height and width of a grid cell (meters), or one value for square cells.
+    samples : int
+        Approximate number of elevations used for each cell.
+    chunk_size : int
+        Number of elevations gathered at once, bounding the memory used.
+
+    Returns
+    -------
+    dh : numpy.ndarray
+        Interdecile range of elevations (meters) around each cell, NaN where there is no
+        data within the radius.
+
+    """
+    dem = np.asarray(dem, dtype=float)
+    height, width = dem.shape
+
+    cy, cx = np.broadcast_to(np.asarray(cellsize, dtype=float), (2,))
+    ry = int(radius // cy)
+    rx = int(radius // cx)
+
+    stride = max(1, int(np.sqrt(np.pi * (ry + 0.5) * (rx + 0.5) / samples)))
+
+    dy, dx = np.meshgrid(
+        np.arange(-(ry // stride), ry // stride + 1) * stride,
+        np.arange(-(rx // stride), rx // stride + 1) * stride,
+        indexing='ij'
+        )
+    inside = (dy * cy)**2 + (dx * cx)**2 <= radius**2
+    offsets = list(zip(dy[inside], dx[inside]))
+
+    padded = np.pad(dem, ((ry, ry), (rx, rx)), constant_values=np.nan)
+
+    dh = np.empty(dem.shape)
+    rows = max(1, chunk_size // (width * len(offsets)))
+
+    for start in range(0, height, rows):
+        stop = min(start + rows, height)
+
+        window = np.stack([
+            padded[ry + i + start:ry + i + stop, rx + j:rx + j + width]
+            for i, j in offsets
+            ], axis=-1)
+
+        #NaNs are sorted to the end, after the n elevations
+        window.sort(axis=-1)
+        n = np.count_nonzero(~np.isnan(window), axis=-1)
+
+        dh[start:stop] = _quantile(window, n, 0.9) - _quantile(window, n, 0.1)
+
+    return dh
+
+
+def _quantile(values, n, q):
+    """
+    Quantile of the first n values along the last axis of a sorted array, interpolated
+    linearly between the closest ranks as by numpy.percentile.
+
+    """
+    position = q * np.maximum(n - 1, 0)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, np.maximum(n - 1, 0))
+    fraction = position - lower
+
+    below = np.take_along_axis(values, lower[..., None], axis=-1)[..., 0]
+    above = np.take_along_axis(values, upper[..., None], axis=-1)[..., 0]
+
+    return below + (above - below) * fraction
@@ -0,0 +1,212 @@
+import collections
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl_batch, stack_profiles
+from itmlogic.statistics.avar import avar_vec
+
+def predict_links(links, prop, zzt=0, zzl=0, zzc=0, workers=None, chunk_size=1024,
+    progress=False, total=None):
+    """
+    Point-to-point prediction of many links, in parallel over a pool of processes.
+
+    The links are taken from the iterable a chunk at a time. The terrain profiles of each
+    chunk are stacked (see stack_profiles) into a block of shared memory, which the worker
+    evaluating the chunk reads in place, rather than receiving the profiles pickled. Each
+    worker runs qlrpfl_batch and avar_vec over its chunk. Results are yielded in the order
+    of the links, as each chunk completes, with at most two chunks per worker in flight,
+    so memory use does not grow with the number of links.
+
+    Parameters
+    ----------
+    links : iterable of dicts
+        Parameters of each link, with the terrain profile in 'pfl' laid out as for qlrpfl.
+        Any other parameters (e.g. hg, wn or zgnd) override those in prop for that link,
+        and links need not all override the same ones.
+    prop : dict
+        Contains the input propagation parameters shared by every link, set as for qlrpfl.
+    zzt : array_like
+        Standard normal deviates corresponding to user defined time quantiles.
+    zzl : array_like
+        Standard normal deviates corresponding to user defined location quantiles.
+    zzc : array_like
+        Standard normal deviates corresponding to user defined confidence quantiles.
+    workers : int
+        Number of processes. Defaults to the number of processors. With one worker, the
+        links are evaluated in this process.
+    chunk_size : int
+        Number of links evaluated by each task.
+    progress : bool
+        Whether to report progress with a tqdm progress bar (tqdm must be installed).
+    total : int
+        Number of links, for the progress bar, if links has no len.
+
+    Yields
+    ------
+    loss : float or numpy.ndarray
+        Propagation loss (dB) of each link, free space loss plus the attenuation relative
+        to free space, for each quantile (with the deviates broadcast together).
+
+    """
+    bar = None
+    if progress:
+        try:
+            from tqdm import tqdm
+        except ImportError:
+            raise ImportError('progress reporting requires tqdm to be installed')
+
+        if total is None and hasattr(links, '__len__'):
+            total = len(links)
+        bar = tqdm(total=total, unit='link')
+
+    chunks = _chunks(links, chunk_size, prop)
+    pending = collections.deque()
+
+    try:
+        if workers == 1:
+            for pfl, params in chunks:
+                yield from _report(_predict(pfl, params, prop, zzt, zzl, zzc), bar)
+            return
+
+        workers = workers or os.cpu_count()
+
+        with ProcessPoolExecutor(workers) as executor:
+            depth = 2 * workers
+
+            try:
+                for pfl, params in chunks:
+                    block = _share(pfl)
+                    pending.append((block, executor.submit(
+                        _predict_shared, block.name, pfl.shape, params, prop, zzt, zzl,
+                        zzc
+                        )))
+
+                    if len(pending) >= depth:
+                        yield from _report(_collect(pending), bar)
+
+                while pending:
+                    yield from _report(_collect(pending), bar)
+
+            finally:
+                #cancel the queued chunks, so leaving the pool only waits for the
+                #running ones, if the results were not all read
+                for block, future in pending:
+                    future.cancel()
+
+    finally:
+        #free the chunks still in flight, once no worker can be reading them
+        for block, future in pending:
+            block.close()
+            block.unlink()
+
+        if bar is not None:
+            bar.close()
+
+
+def _chunks(links, chunk_size, prop):
+    """
+    Groups the links into chunks, returning the stacked profiles and the other
+    parameters of each chunk, with an element per link for each parameter. Parameters
+    given by only some of the links in a chunk are taken from prop for the others.
+
+    """
+    links = iter(links)
+
+    while True:
+        chunk = list(itertools.islice(links, chunk_size))
+        if not chunk:
+            return
+
+        pfl = stack_profiles([link['pfl'] for link in chunk])
+
+        keys = set().union(*chunk) - {'pfl'}
+        params = {
+            key: np.array([link[key] if key in link else prop[key] for link in chunk])
+            for key in keys
+            }
+
+        if 'hg' in params:
+            params['hg'] = params['hg'].T
+
+        yield pfl, params
+
+
+def _share(pfl):
+    """
+    Copies the profiles into a new block of shared memory.
+
+    """
+    block = shared_memory.SharedMemory(create=True, size=pfl.nbytes)
+    np.ndarray(pfl.shape, buffer=block.buf)[:] = pfl
+
+    return block
+
+
+def _collect(pending):
+    """
+    Waits for the results of the oldest chunk in flight, and frees its shared memory.
+
+    """
+    block, future = pending[0]
+
+    try:
+        return future.result()
+    finally:
+        pending.popleft()
+        block.close()
+        block.unlink()
+
+
+def _predict_shared(name, shape, params, prop, zzt, zzl, zzc):
+    """
+    Evaluates a chunk of links, reading the profiles from shared memory.
+
+    """
+    block = shared_memory.SharedMemory(name=name)
+
+    try:
+        pfl = np.ndarray(shape, buffer=block.buf)
+        loss = _predict(pfl, params, prop, zzt, zzl, zzc)
+        del pfl
+    finally:
+        block.close()
+
+    return loss
+
+
+def _predict(pfl, params, prop, zzt, zzl, zzc):
+    """
+    Evaluates a chunk of links, returning the loss with the links as the last axis.
+
+    """
+    link = dict(prop)
+    link.update(params)
+    link['pfl'] = pfl
+
+    link = qlrpfl_batch(link)
+
+    #the links are the last axis, after those of the deviates
+    zzt, zzl, zzc = [np.asarray(z, dtype=float)[..., None] for z in (zzt, zzl, zzc)]
+
+    avar1, link = avar_vec(zzt, zzl, zzc, link)
+
+    #free space loss
+    fs = 8.685890 * np.log(2 * link['wn'] * link['dist'])
+
+    return fs + avar1
+
+
+def _report(loss, bar):
+    """
+    Yields the loss of each link of a chunk, updating the progress bar.
+
+    """
+    if bar is not None:
+        bar.update(loss.shape[-1])
+
+    for i in range(loss.shape[-1]):
+        yield loss[..., i] if loss.ndim > 1 else float(loss[i])
@@ -0,0 +1,294 @@
+import numpy as np
+
+from itmlogic.preparatory_subroutines.hzns import hzns_ray
+from itmlogic.preparatory_subroutines.profile_index import ProfileIndex
+from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl_batch
+from itmlogic.statistics.avar import avar_vec
+
+def sample_bilinear(dem, rows, cols):
+    """
+    Samples a grid of elevations at fractional pixel positions by bilinear interpolation.
+
+    Positions outside the grid take the value of the nearest edge.
+
+    Parameters
+    ----------
+    dem : numpy.ndarray
+        Elevations (meters) on a regular grid, indexed by row and column.
+    rows : array_like
+        Row positions, with pixel centres at whole numbers.
+    cols : array_like
+        Column positions, with pixel centres at whole numbers.
+
+    Returns
+    -------
+    z : numpy.ndarray
+        Interpolated elevations, with the shape of rows and cols broadcast together.
+
+    """
+    dem = np.asarray(dem, dtype=float)
+
+    rows = np.clip(np.asarray(rows, dtype=float), 0, dem.shape[0] - 1)
+    cols = np.clip(np.asarray(cols, dtype=float), 0, dem.shape[1] - 1)
+
+    r0 = np.minimum(np.floor(rows).astype(int), dem.shape[0] - 2).clip(0)
+    c0 = np.minimum(np.floor(cols).astype(int), dem.shape[1] - 2).clip(0)
+    r1 = np.minimum(r0 + 1, dem.shape[0] - 1)
+    c1 = np.minimum(c0 + 1, dem.shape[1] - 1)
+
+    fr = rows - r0
+    fc = cols - c0
+
+    top = dem[r0, c0] * (1 - fc) + dem[r0, c1] * fc
+    bottom = dem[r1, c0] * (1 - fc) + dem[r1, c1] * fc
+
+    return top * (1 - fr) + bottom * fr
+
+
+def line_profiles(dem, cellsize, tx, rx, spacing=None):
+    """
+    Extracts straight line terrain profiles from a transmitter to many receivers.
+
+    Each profile is sampled at equal intervals of about spacing along the line, and the
+    profiles are stacked as by stack_profiles, for use with qlrpfl_batch.
+
+    Parameters
+    ----------
+    dem : numpy.ndarray
+        Elevations (meters) on a regular grid of square cells, indexed by row and column.
+    cellsize : float
+        Width of a grid cell (meters).
+    tx : tuple
+        Row and column position of the transmitter.
+    rx : numpy.ndarray
+        Row and column positions of the receivers, with shape (2, N).
+    spacing : float
+        Distance between profile points (meters). Defaults to cellsize.
+
+    Returns
+    -------
+    pfl : numpy.ndarray
+        Terrain profiles in meters, one per receiver.
+
+    """
+    if spacing is None:
+        spacing = cellsize
+
+    rx = np.asarray(rx, dtype=float).reshape(2, -1)
+
+    delta = rx - np.asarray(tx, dtype=float).reshape(2, 1)
+    dist = np.hypot(delta[0], delta[1]) * cellsize
+
+    intervals = np.maximum(np.ceil(dist / spacing), 1).astype(int)
+
+    #points beyond the end of a shorter profile repeat its last elevation
+    t = np.minimum(np.arange(intervals.max() + 1) / intervals[:, None], 1)
+
+    z = sample_bilinear(
+        dem, tx[0] + t * delta[0][:, None], tx[1] + t * delta[1][:, None]
+        )
+
+    pfl = np.empty((len(intervals), z.shape[1] + 2))
+    pfl[:, 0] = intervals
+    pfl[:, 1] = dist / intervals
+    pfl[:, 2:] = z
+
+    return pfl
+
+
+def coverage_map(dem, tx, radius, resolution, prop, cellsize=None, zzt=0, zzl=0, zzc=0,
+    chunk_size=4096):
+    """
+    Point-to-point prediction of loss from one transmitter to every receiver location on a
+    grid within a radius.
+
+    The grid of receivers has a spacing of resolution and is centred on the transmitter.
+    The terrain profile to each receiver is read from the elevation grid by array indexing
+    (see line_profiles), and the links are evaluated in chunks by qlrpfl_batch and
+    avar_vec, so the elevation grid is only read once. The other parameters in prop are
+    set as for qlrpfl, with prop['hg'] holding the heights of the transmitter and of every
+    receiver.
+
+    Parameters
+    ----------
+    dem : numpy.ndarray
+        Elevations (meters) on a regular grid of square cells, indexed by row and column,
+        with rows increasing to the south.
+    tx : tuple
+        Row and column position of the transmitter on the elevation grid.
+    radius : float
+        Radius of the coverage area (meters).
+    resolution : float
+        Spacing of the receiver grid (meters).
+    prop : dict
+        Contains all input propagation parameters.
+    cellsize : float
+        Width of an elevation grid cell (meters). Defaults to resolution.
+    zzt : float
+        Standard normal deviate corresponding to the user defined time quantile.
+    zzl : float
+        Standard normal deviate corresponding to the user defined location quantile.
+    zzc : float
+        Standard normal deviate corresponding to the user defined confidence quantile.
+    chunk_size : int
+        Number of links evaluated at once, bounding the memory used by the profiles.
+
+    Returns
+    -------
+    loss : numpy.ndarray
+        Propagation loss (dB), free space loss plus the attenuation relative to free space,
+        on a square grid of receivers with the transmitter at the centre cell. Cells
+        outside the radius, and the transmitter cell, are NaN.
+
+    """
+    if cellsize is None:
+        cellsize = resolution
+
+    half = int(radius // resolution)
+    offset = np.arange(-half, half + 1) * resolution
+
+    down, across = np.meshgrid(offset, offset, indexing='ij')
+    inside = np.hypot(down, across) <= radius
+    inside[half, half] = False
+
+    rx = np.array([
+        tx[0] + down[inside] / cellsize,
+        tx[1] + across[inside] / cellsize,
+        ])
+
+    values = np.empty(rx.shape[1])
+
+    for start in range(0, rx.shape[1], chunk_size):
+        stop = start + chunk_size
+
+        link = dict(prop)
+        link['pfl'] = line_profiles(dem, cellsize, tx, rx[:, start:stop])
+
+        link = qlrpfl_batch(link)
+
+        avar1, link = avar_vec(zzt, zzl, zzc, link)
+
+        #free space loss
+        fs = 8.685890 * np.log(2 * link['wn'] * link['dist'])
+
+        values[start:stop] = fs + avar1
+
+    loss = np.full(inside.shape, np.nan)
+    loss[inside] = values
+
+    return loss
+
+
+def ray_elevations(dem, cellsize, tx, azimuths, intervals, xi):
+    """
+    Samples the elevations along rays from the transmitter, one per azimuth.
+
+    Parameters
+    ----------
+    dem : numpy.ndarray
+        Elevations (meters) on a regular grid of square cells, indexed by row and column,
+        with rows increasing to the south.
+    cellsize : float
+        Width of a grid cell (meters).
+    tx : tuple
+        Row and column position of the transmitter.
+    azimuths : array_like
+        Bearing of each ray, in degrees clockwise from north.
+    intervals : int
+        Number of intervals along each ray.
+    xi : float
+        Spacing of the elevations along each ray (meters).
+
+    Returns
+    -------
+    z : numpy.ndarray
+        Elevations (meters), one ray per row, starting at the transmitter.
+
+    """
+    bearing = np.radians(np.asarray(azimuths, dtype=float))[:, None]
+    steps = np.arange(intervals + 1) * xi / cellsize
+
+    return sample_bilinear(
+        dem, tx[0] - np.cos(bearing) * steps, tx[1] + np.sin(bearing) * steps
+        )
+
+
+def radial_coverage(dem, tx, radius, resolution, prop, azimuths=360, cellsize=None,
+    zzt=0, zzl=0, zzc=0):
+    """
+    Point-to-point prediction of loss from one transmitter to receivers at every point
+    along rays within a radius (radial-sweep coverage).
+
+    Receivers along the same azimuth share the start of their terrain profiles, so each ray
+    is sampled once, out to the radius, and every receiver along it is evaluated from that
+    one set of elevations, held in a ProfileIndex rather than copied per receiver. The
+    horizons of the receivers are found by hzns_ray as the ray extends, in place of
+    hzns_batch on each profile. The other parameters in prop are set as for qlrpfl, with
+    prop['hg'] holding the heights of the transmitter and of every receiver.
+
+    Parameters
+    ----------
+    dem : numpy.ndarray
+        Elevations (meters) on a regular grid of square cells, indexed by row and column,
+        with rows increasing to the south.
+    tx : tuple
+        Row and column position of the transmitter on the elevation grid.
+    radius : float
+        Radius of the coverage area (meters).
+    resolution : float
+        Spacing of the receivers along each ray (meters), rounded down so that the last
+        receiver is at the radius.
+    prop : dict
+        Contains all input propagation parameters.
+    azimuths : int or array_like
+        Number of rays, evenly spaced from north, or the bearing of each ray in degrees
+        clockwise from north.
+    cellsize : float
+        Width of an elevation grid cell (meters). Defaults to resolution.
+    zzt : float
+        Standard normal deviate corresponding to the user defined time quantile.
+    zzl : float
+        Standard normal deviate corresponding to the user defined location quantile.
+    zzc : float
+        Standard normal deviate corresponding to the user defined confidence quantile.
+
+    Returns
+    -------
+    loss : numpy.ndarray
+        Propagation loss (dB), free space loss plus the attenuation relative to free space,
+        with a row per ray and a column per receiver.
+    distance : numpy.ndarray
+        Distance of each receiver from the transmitter (meters).
+
+    """
+    if cellsize is None:
+        cellsize = resolution
+
+    if np.ndim(azimuths) == 0:
+        azimuths = np.arange(azimuths) * 360 / azimuths
+
+    intervals = int(np.ceil(radius / resolution))
+    xi = radius / intervals
+
+    rays = ray_elevations(dem, cellsize, tx, azimuths, intervals, xi)
+
+    #every profile is the start of the same ray, with its own number of intervals
+    receivers = np.arange(1, intervals + 1)
+
+    loss = np.empty((len(rays), intervals))
+
+    for row, z in enumerate(rays):
+        link = dict(prop)
+        link['pfl'] = ProfileIndex(np.concatenate(([intervals, xi], z)))
+
+        horizons = hzns_ray(z, xi, prop['hg'], prop['gme'])
+        link = qlrpfl_batch(link, horizons=horizons, intervals=receivers)
+
+        avar1, link = avar_vec(zzt, zzl, zzc, link)
+
+        #free space loss
+        fs = 8.685890 * np.log(2 * link['wn'] * link['dist'])
+
+        loss[row] = fs + avar1
+
+    return loss, np.arange(1, intervals + 1) * xi
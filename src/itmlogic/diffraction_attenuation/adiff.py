@@ -1,8 +1,8 @@
 import math
 import numpy as np
 
-from itmlogic.diffraction_attenuation.aknfe import aknfe
-from itmlogic.diffraction_attenuation.fht import fht
+from itmlogic.diffraction_attenuation.aknfe import aknfe, aknfe_vec
+from itmlogic.diffraction_attenuation.fht import fht, fht_vec
 
 def adiff(d, prop):
     """
@@ -100,3 +100,96 @@ def adiff(d, prop):
         adiff1 = ar * wd + (1 - wd) * adiff1 + prop['afo']
 
     return adiff1, prop
+
+
+def adiff_vec(d, prop):
+    """
+    Vectorized form of adiff, in which d and the propagation parameters may be arrays, such
+    as when prop holds the parameters of many links (see lrprop_batch). A call with a
+    scalar d = 0 sets up initial constants for every link.
+
+    Parameters
+    ----------
+    d : array_like
+        Distance in meters.
+    prop : dict
+        Contains all input propagation parameters
+
+    Returns
+    -------
+    adiff1 : numpy.ndarray
+        Returns the estimated diffraction attenuation.
+    prop : dict
+        Contains all input and output propagation parameters.
+
+    """
+    third = 1 / 3
+
+    if np.ndim(d) == 0 and d == 0:
+        q = prop['hg'][0] * prop['hg'][1]
+
+        prop['qk'] = prop['he'][0] * prop['he'][1] - q
+
+        if prop['mdp'] < 0:
+            q = q + 10
+
+        prop['wd1'] = np.sqrt(1 + prop['qk'] / q)
+        prop['xd1'] = prop['dla'] + prop['tha'] / prop['gme']
+
+        q = (1 - 0.8 * np.exp(-prop['dlsa'] / 50e3)) * prop['dh']
+        q = 0.78 * q * np.exp(-(q / 16) ** 0.25)
+
+        prop['afo'] = (
+            np.minimum(15, 2.171 * np.log(1 + 4.77e-4 * prop['hg'][0]
+            * prop['hg'][1] * prop['wn'] * q))
+            )
+
+        prop['qk'] = 1 / np.abs(prop['zgnd'])
+        prop['aht'] = 20
+        prop['xht'] = 0
+
+        for j in range(0, 2):
+            a = 0.5 * prop['dl'][j] ** 2 / prop['he'][j]
+            wa = (a * prop['wn']) ** third
+            pk = prop['qk'] / wa
+
+            q = (1.607 - pk) * 151.0 * wa * prop['dl'][j] / a
+
+            prop['xht'] = prop['xht'] + q
+            prop['aht'] = prop['aht'] + fht_vec(q, pk)
+
+        adiff1 = np.zeros(np.shape(prop['dla']))
+
+    else:
+        d = np.asarray(d, dtype=float)
+
+        th = prop['tha'] + d * prop['gme']
+
+        ds = d - prop['dla']
+
+        q = 0.0795775 * prop['wn'] * ds * th**2
+
+        adiff1 = aknfe_vec(q * prop['dl'][0] /
+            (ds + prop['dl'][0])) + aknfe_vec(q * prop['dl'][1] /
+            (ds + prop['dl'][1]))
+
+        a = ds / th
+        wa = (a * prop['wn']) ** third
+
+        pk = prop['qk'] / wa
+
+        q = (1.607 - pk) * 151.0 * wa * th + prop['xht']
+
+        ar = 0.05751 * q - 4.343 * np.log(q) - prop['aht']
+
+        q = (
+            (prop['wd1'] + prop['xd1'] / d) *
+            np.minimum(((1 - 0.8 * np.exp(-d / 50e3)) *
+            prop['dh'] * prop['wn']), 6283.2)
+            )
+
+        wd = 25.1 / (25.1 + np.sqrt(q))
+
+        adiff1 = ar * wd + (1 - wd) * adiff1 + prop['afo']
+
+    return adiff1, prop
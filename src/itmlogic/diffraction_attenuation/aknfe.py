@@ -28,3 +28,34 @@ def aknfe(v2):
         aknfe1 = 12.953 + 4.343 * np.log(v2)
 
     return aknfe1
+
+
+def aknfe_vec(v2):
+    """
+    Vectorized form of aknfe, returning the attenuation due to a single knife edge for an
+    array of input arguments.
+
+    Parameters
+    ----------
+    v2 : array_like
+        Input for computing knife edge diffraction.
+
+    Returns
+    -------
+    aknfe1 : numpy.ndarray
+        Attenuation due to a single knife edge.
+
+    """
+    v2 = np.asarray(v2, dtype=float)
+
+    #as in aknfe, avoid taking the square root of v2 <= 0
+    v2_small = np.where(v2 <= 0, 0.00001, v2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aknfe1 = np.where(
+            v2 < 5.76,
+            6.02 + 9.11 * np.sqrt(v2_small) - 1.27 * v2_small,
+            12.953 + 4.343 * np.log(v2)
+            )
+
+    return aknfe1
@@ -42,3 +42,43 @@ def fht(x,pk):
             fht1 = (1 - w) * fht1 + w * (17.372 * np.log(x) - 117)
 
     return fht1
+
+
+def fht_vec(x, pk):
+    """
+    Vectorized form of fht, returning the height gain for arrays of the "x" and "K"
+    parameters of equations (4.20) and (6.2)-(6.7) of "The ITS Irregular Terrain Model,
+    version 1.2.2: The Algorithm".
+
+    Parameters
+    ----------
+    x : array_like
+        x parameter.
+    pk : array_like
+        k parameter.
+
+    Returns
+    -------
+    fht1 : numpy.ndarray
+        Estimated diffractive attenuation.
+
+    """
+    x = np.asarray(x, dtype=float)
+    pk = np.asarray(pk, dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        w = -np.log(pk)
+
+        near = np.where(
+            (pk < 1e-5) | ((x * w**3) > 5495),
+            np.where(x > 1, 17.372 * np.log(x) - 117, -117),
+            2.5e-5 * x**2 / pk - 8.686 * w - 15
+            )
+
+        far = 0.05751 * x - 4.343 * np.log(x)
+        w = 0.0134 * x * np.exp(-0.005 * x)
+        far = np.where(x < 2000, (1 - w) * far + w * (17.372 * np.log(x) - 117), far)
+
+    fht1 = np.where(x < 200, near, far)
+
+    return fht1
@@ -0,0 +1,358 @@
+import math
+import numpy as np
+
+from itmlogic.preparatory_subroutines.profile_index import ProfileIndex
+from itmlogic.preparatory_subroutines.qlra import qlra
+from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl, qlrpfl_batch
+from itmlogic.lrprop import lrprop_vec
+from itmlogic.statistics.avar import avar_vec
+
+def area_range(prop, kst, loss, zzt=0, zzl=0, zzc=0, d_min=1e3, d_max=2000e3, tol=1,
+    samples=16):
+    """
+    Area prediction of the distance at which the loss first reaches a target, e.g. the
+    range at which the loss exceeds 140 dB at 90% reliability.
+
+    The reference attenuation of lrprop is piecewise in distance, with line-of-sight
+    (ael + ak1 * d + ak2 * log(d)), diffraction (aed + emd * d) and scatter (aes + ems * d)
+    regions, and the curv terms of avar change form at dexa. The loss is smooth between
+    these breakpoints, so it is evaluated at the breakpoints and at a few points within
+    each region, in one vectorized call, to bracket the first crossing of the target in a
+    single region. The crossing is then found by the secant method (Illinois variant),
+    falling back to bisection whenever two steps fail to halve the bracket, with every
+    quantile solved together in one call per iteration. A handful of calls usually
+    suffices. The other parameters in prop are set as for qlra.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains all input propagation parameters.
+    kst : list
+        Siting criteria for the transmitter and receiver (0=random, 1= "with care",
+        2= "with great care").
+    loss : array_like
+        Target propagation loss (dB), broadcast against the deviates.
+    zzt : array_like
+        Standard normal deviates corresponding to user defined time quantiles.
+    zzl : array_like
+        Standard normal deviates corresponding to user defined location quantiles.
+    zzc : array_like
+        Standard normal deviates corresponding to user defined confidence quantiles.
+    d_min : float
+        Shortest distance searched (meters).
+    d_max : float
+        Longest distance searched (meters).
+    tol : float
+        Tolerance of the distance (meters).
+    samples : int
+        Number of points within each region in the initial scan.
+
+    Returns
+    -------
+    distance : float or numpy.ndarray
+        Shortest distance (meters) at which the loss reaches the target, for each
+        quantile. This is d_min if the target is already reached there, and NaN if it is
+        not reached by d_max.
+    evaluations : int
+        Number of vectorized model evaluations used.
+
+    """
+    prop = qlra(kst, prop)
+
+    def evaluate(d, zzt, zzl, zzc):
+        aref, link = lrprop_vec(d, prop)
+        avar1, link = avar_vec(zzt, zzl, zzc, link, dist=d, aref=aref)
+        return 8.685890 * np.log(2 * link['wn'] * d) + avar1
+
+    #sets up the coefficients and breakpoints of every region
+    evaluate(np.array([d_min, d_max]), 0, 0, 0)
+
+    breakpoints = [d_min, d_max, prop['dlsa'], prop['dexa']]
+    if prop['wscat'] != 0:
+        breakpoints.append(prop['dx'])
+
+    breakpoints = np.unique(np.clip(breakpoints, d_min, d_max))
+
+    grid = np.unique(np.concatenate([
+        np.geomspace(start, end, samples + 2)
+        for start, end in zip(breakpoints[:-1], breakpoints[1:])
+        ]))
+
+    distance, evaluations = _solve(evaluate, grid, loss, (zzt, zzl, zzc), tol)
+
+    return distance, evaluations + 1
+
+
+def p2p_range(prop, loss, zzt=0, zzl=0, zzc=0, d_min=1e3, samples=16):
+    """
+    Point-to-point prediction of the distance along a terrain profile at which the loss
+    first reaches a target, with the receiver moved along the profile from the
+    transmitter.
+
+    The path to each candidate receiver point is the profile truncated there, and the
+    truncated profiles evaluated together share the one profile, indexed once (see
+    ProfileIndex) and passed to qlrpfl_batch with the number of intervals to each point,
+    rather than copied per point. The profile is scanned at a few points in one call to
+    qlrpfl_batch to bracket the first crossing of the target, which is then found to the
+    nearest profile point as in area_range. The loss along real terrain need not
+    increase steadily, so a crossing which falls back below the target between two scan
+    points is not seen; more samples narrow the gaps, and samples equal to the number of
+    intervals evaluates every point. The other parameters in prop are set as for qlrpfl.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains all input propagation parameters, with the whole terrain profile in pfl.
+    loss : array_like
+        Target propagation loss (dB), broadcast against the deviates.
+    zzt : array_like
+        Standard normal deviates corresponding to user defined time quantiles.
+    zzl : array_like
+        Standard normal deviates corresponding to user defined location quantiles.
+    zzc : array_like
+        Standard normal deviates corresponding to user defined confidence quantiles.
+    d_min : float
+        Shortest distance searched (meters).
+    samples : int
+        Number of points in the initial scan.
+
+    Returns
+    -------
+    distance : float or numpy.ndarray
+        Distance (meters) of the first profile point at which the loss reaches the target,
+        for each quantile. This is the first point searched if the target is already
+        reached there, and NaN if it is not reached by the end of the profile.
+    evaluations : int
+        Number of vectorized model evaluations used.
+
+    """
+    pfl = prop['pfl']
+    if not isinstance(pfl, ProfileIndex):
+        pfl = ProfileIndex(pfl)
+
+    xi = pfl.xi
+    n = pfl.np
+
+    def evaluate(k, zzt, zzl, zzc):
+        link = dict(prop)
+        link['pfl'] = pfl
+
+        link = qlrpfl_batch(link, intervals=k.ravel())
+        avar1, link = avar_vec(zzt, zzl, zzc, link)
+
+        return (8.685890 * np.log(2 * link['wn'] * link['dist']) + avar1).reshape(
+            avar1.shape[:-1] + k.shape)
+
+    k_min = min(max(2, math.ceil(d_min / xi)), n)
+    grid = np.unique(np.linspace(k_min, n, samples + 1).round())
+
+    k, evaluations = _solve(evaluate, grid, loss, (zzt, zzl, zzc), 1, integer=True)
+
+    return k * xi, evaluations
+
+
+def minimum_height(prop, loss, zzt=0, zzl=0, zzc=0, terminal=0, h_min=1, h_max=1000,
+    tol=0.1, samples=8):
+    """
+    Point-to-point prediction of the minimum antenna height of one terminal at which the
+    loss meets a budget, at given quantiles (e.g. reliability and confidence levels).
+
+    The loss is taken to fall as the antenna is raised, so the target is bracketed by a
+    scan of a few heights, spaced geometrically between h_min and h_max, in one call to
+    qlrpfl_batch, and the height is then found within the bracket as in area_range. The
+    terrain is indexed once (see ProfileIndex) and shared by every evaluation, rather
+    than each height being run in turn as in scripts/pimter.py. The other parameters in
+    prop are set as for qlrpfl.
+
+    prop['pfl'] may also hold the profiles of many sites, one per row as made by
+    stack_profiles, which are then solved together, with the sites as the last axis of
+    the results. The height of the other terminal may then be given for each site.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains all input propagation parameters. The height of the terminal being
+        solved for in hg is ignored.
+    loss : array_like
+        Greatest propagation loss (dB) allowed, broadcast against the deviates.
+    zzt : array_like
+        Standard normal deviates corresponding to user defined time quantiles.
+    zzl : array_like
+        Standard normal deviates corresponding to user defined location quantiles.
+    zzc : array_like
+        Standard normal deviates corresponding to user defined confidence quantiles.
+    terminal : int
+        Terminal whose height is found (0=transmitter, 1=receiver).
+    h_min : float
+        Lowest height searched (meters).
+    h_max : float
+        Highest height searched (meters).
+    tol : float
+        Tolerance of the height (meters).
+    samples : int
+        Number of heights in the initial scan.
+
+    Returns
+    -------
+    height : float or numpy.ndarray
+        Minimum height (meters) at which the loss is no more than the budget, for each
+        quantile. This is h_min if the budget is already met there, and NaN if it is not
+        met by h_max.
+    evaluations : int
+        Number of vectorized model evaluations used.
+
+    """
+    pfl = prop['pfl']
+
+    if np.ndim(pfl) == 2:
+        pfl = np.asarray(pfl, dtype=float)
+        site = np.arange(pfl.shape[0])
+    else:
+        if not isinstance(pfl, ProfileIndex):
+            pfl = ProfileIndex(pfl)
+        site = np.zeros((), dtype=int)
+
+    other = np.asarray(prop['hg'][1 - terminal], dtype=float)
+
+    def evaluate(h, zzt, zzl, zzc, site):
+        h, zzt, zzl, zzc, site = np.broadcast_arrays(h, zzt, zzl, zzc, site)
+        site = site.ravel()
+
+        hg = [None, None]
+        hg[terminal] = h.ravel()
+        hg[1 - terminal] = other[site] if other.ndim else np.full(site.shape, other)
+
+        link = dict(prop)
+        link['hg'] = np.array(hg)
+
+        #a single profile is shared by every link, and stacked profiles taken by site
+        link['pfl'] = pfl[site] if isinstance(pfl, np.ndarray) else pfl
+
+        link = qlrpfl_batch(link)
+        avar1, link = avar_vec(zzt.ravel(), zzl.ravel(), zzc.ravel(), link)
+
+        fs = 8.685890 * np.log(2 * link['wn'] * link['dist'])
+
+        #negated, so the budget is met where the target is reached
+        return -(fs + avar1).reshape(h.shape)
+
+    grid = np.geomspace(h_min, h_max, samples)
+
+    height, evaluations = _solve(
+        evaluate, grid, -np.asarray(loss, dtype=float), (zzt, zzl, zzc, site), tol)
+
+    return height, evaluations
+
+
+def required_eirp(prop, sensitivity, zzt=0, zzl=0, zzc=0, gain=0):
+    """
+    Point-to-point prediction of the effective isotropic radiated power needed for the
+    received signal to reach the sensitivity of the receiver, at given quantiles.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains all input propagation parameters, set as for qlrpfl.
+    sensitivity : float
+        Sensitivity of the receiver (dBm).
+    zzt : array_like
+        Standard normal deviates corresponding to user defined time quantiles.
+    zzl : array_like
+        Standard normal deviates corresponding to user defined location quantiles.
+    zzc : array_like
+        Standard normal deviates corresponding to user defined confidence quantiles.
+    gain : float
+        Gain of the receiving antenna (dBi).
+
+    Returns
+    -------
+    eirp : float or numpy.ndarray
+        Effective isotropic radiated power (dBm), for each quantile.
+
+    """
+    prop = qlrpfl(prop)
+
+    avar1, prop = avar_vec(zzt, zzl, zzc, prop)
+
+    fs = 8.685890 * np.log(2 * prop['wn'] * prop['dist'])
+
+    return sensitivity + fs + avar1 - gain
+
+
+def _solve(evaluate, grid, loss, args, tol, integer=False):
+    """
+    Finds the first point at which the loss reaches the target for each element of the
+    targets broadcast against the other arguments (e.g. the deviates), by a scan of the
+    grid followed by a safeguarded secant search within the bracket found.
+
+    """
+    loss, *args = np.broadcast_arrays(*[np.asarray(x) for x in (loss,) + tuple(args)])
+    shape = loss.shape
+
+    loss = loss.ravel().astype(float)
+    args = [x.ravel() for x in args]
+
+    excess = evaluate(grid, *[x[:, None] for x in args]) - loss[:, None]
+    evaluations = 1
+
+    reached = excess >= 0
+    first = np.argmax(reached, axis=1)
+    rows = np.arange(len(loss))
+
+    found = reached.any(axis=1)
+    bracketed = found & (first > 0)
+
+    a = grid[np.maximum(first - 1, 0)]
+    b = grid[first]
+    fa = excess[rows, np.maximum(first - 1, 0)]
+    fb = excess[rows, first]
+
+    bisect = np.zeros(len(loss), dtype=bool)
+    side = np.zeros(len(loss), dtype=int)
+    previous = b - a
+
+    while True:
+        active = bracketed & (b - a > tol)
+        if not active.any():
+            break
+
+        width = b[active] - a[active]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            c = a[active] - fa[active] * width / (fb[active] - fa[active])
+        c = np.where(bisect[active] | ~np.isfinite(c), 0.5 * (a[active] + b[active]), c)
+
+        #step at least half the tolerance inside the bracket, so both ends close in
+        if integer:
+            c = np.clip(np.round(c), a[active] + 1, b[active] - 1)
+        else:
+            c = np.clip(c, a[active] + 0.5 * tol, b[active] - 0.5 * tol)
+
+        fc = evaluate(c, *[x[active] for x in args]) - loss[active]
+        evaluations += 1
+
+        above = fc >= 0
+
+        index = np.flatnonzero(active)
+        b[index[above]] = c[above]
+        fb[index[above]] = fc[above]
+        a[index[~above]] = c[~above]
+        fa[index[~above]] = fc[~above]
+
+        #halve the value kept at an end which has not moved for two steps (Illinois)
+        moved = np.where(above, 1, -1)
+        stuck = moved == side[index]
+        fa[index[stuck & above]] *= 0.5
+        fb[index[stuck & ~above]] *= 0.5
+        side[index] = moved
+
+        #bisect if the last two steps together did not halve the bracket
+        bisect[index] = b[index] - a[index] > 0.5 * previous[index]
+        previous[index] = width
+
+    distance = np.where(found, b, np.nan).reshape(shape)
+
+    if distance.ndim == 0:
+        return float(distance), evaluations
+
+    return distance, evaluations
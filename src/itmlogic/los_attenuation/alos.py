@@ -53,3 +53,56 @@ def alos(d, prop):
         )
 
     return alos1
+
+
+def alos_vec(d, prop):
+    """
+    Vectorized form of alos, in which d and the propagation parameters may be arrays, such
+    as when prop holds the parameters of many links (see lrprop_batch).
+
+    Parameters
+    ----------
+    d : array_like
+        Distance in meters.
+    prop : dict
+        Contains all input propagation parameters
+
+    Returns
+    -------
+    alos : numpy.ndarray
+        The estimated line-of-sight attenuation.
+
+    """
+    d = np.asarray(d, dtype=float)
+
+    q = (1 - 0.8 * np.exp(-d / 50e3)) * prop['dh']
+
+    s = 0.78 * q * np.exp(-(q / 16)**0.25)
+
+    q = prop['he'][0] + prop['he'][1]
+
+    sps = q / np.sqrt(d**2 + q**2)
+
+    r = (
+        (sps - prop['zgnd']) /
+        (sps + prop['zgnd']) *
+        np.exp(-np.minimum(10, prop['wn'] * s * sps))
+        )
+
+    q = np.abs(r)**2
+
+    r = np.where((q < 0.25) | (q < sps), r * np.sqrt(sps / q), r)
+
+    alos1  = prop['emd'] * d + prop['aed']
+
+    q = prop['wn'] * prop['he'][0] * prop['he'][1] * 2 / d
+
+    q = np.where(q > 1.57, 3.14 - 2.4649 / q, q)
+
+    alos1 = (
+        (-4.343 *
+        np.log(np.abs(np.cos(q) - 1j * np.sin(q) + r)**2)- alos1) *
+        prop['wis'] + alos1
+        )
+
+    return alos1
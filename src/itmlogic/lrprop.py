@@ -1,9 +1,21 @@
 import math
+from functools import lru_cache
 import numpy as np
 
-from itmlogic.diffraction_attenuation.adiff import adiff
-from itmlogic.los_attenuation.alos import alos
-from itmlogic.scatter_attenuation.ascat import ascat
+from itmlogic.diffraction_attenuation.adiff import adiff, adiff_vec
+from itmlogic.los_attenuation.alos import alos, alos_vec
+from itmlogic.scatter_attenuation.ascat import ascat, ascat_vec
+
+#number of distinct links whose setup and coefficients are kept
+CACHE_SIZE = 4096
+
+#fields set by the setup, line-of-sight and scatter blocks, as kept in the caches
+SETUP_FIELDS = (
+    'dls', 'dlsa', 'dla', 'tha', 'kwx', 'dmin', 'qk', 'wd1', 'xd1', 'afo', 'aht', 'xht',
+    'xae', 'emd', 'aed', 'wis',
+    )
+LOS_FIELDS = ('ak1', 'ak2', 'ael')
+SCATTER_FIELDS = ('ad', 'rr', 'etq', 'h0s', 'ascat1', 'ems', 'dx', 'aes')
 
 def lrprop(d, prop):
     """
@@ -15,6 +27,9 @@ def lrprop(d, prop):
     are continuing the area mode. The assumption is that when one uses the area mode, one will
     want a sequence of results for varying distances.
 
+    The setup and the line-of-sight and scatter coefficients are pure functions of the
+    link parameters, and are kept in least recently used caches (of CACHE_SIZE links each),
+    so links sharing the same geometry are only set up once.
 
     Parameters
     ----------
@@ -30,187 +45,742 @@ def lrprop(d, prop):
         attenuation (aref).
 
     """
-    third = 1 / 3
-
     if prop['mdp'] != 0:
+        prop = _lrprop_setup_cached(prop)
 
-        prop['dls'] = []
+    if prop['mdp'] >= 0:
+        prop['mdp'] = 0
+        prop['dist'] = d
 
-        for entry in prop['he']:
-            prop['dls'].append(math.sqrt(2 * entry / prop['gme']))
+    if prop['dist'] > 0:
+        if prop['dist'] > 1000e3:
+            prop['kwx'] = max(prop['kwx'], 1)
+        if prop['dist'] < prop['dmin']:
+            prop['kwx'] = max(prop['kwx'], 3)
+        if prop['dist'] < 1e3 or prop['dist'] > 2000e3:
+            prop['kwx'] = 4
 
-        prop['dlsa']  = prop['dls'][0] + prop['dls'][1]
+    if prop['dist'] < prop['dlsa']:
+        if prop['wlos'] == 0:
+            prop = _los_coefficients_cached(prop)
 
-        prop['dla'] = prop['dl'][0] + prop['dl'][1]
+        #the line-of-sight coefficients are found once, but aref at every distance
+        if prop['dist'] > 0:
+            prop['aref'] = (
+                prop['ael'] + prop['ak1'] *
+                prop['dist'] + prop['ak2'] * np.log(prop['dist'])
+                )
 
-        prop['tha'] = (
-            max(prop['the'][0] + prop['the'][1],
-            -prop['dla'] * prop['gme'])
-            )
+    if prop['dist'] <= 0 or prop['dist'] >= prop['dlsa']:
 
-        prop['wlos'] = 0
-        prop['wscat'] = 0
+        if prop['wscat'] == 0:
+            prop = _scatter_coefficients_cached(prop)
 
-        if prop['wn'] < 0.838 or prop['wn'] > 210:
-            prop['kwx'] = max(prop['kwx'], 1)
+        if prop['dist'] > prop['dx']:
+            prop['aref'] = prop['aes'] + prop['ems'] * prop['dist']
+        else:
+            prop['aref'] = prop['aed'] + prop['emd'] * prop['dist']
 
-        if prop['hg'][0] < 1 or prop['hg'][0] > 1000:
-            prop['kwx'] = max(prop['kwx'], 1)
+    prop['aref'] = max(prop['aref'], 0)
 
-        if prop['hg'][1] < 1 or prop['hg'][1] > 1000:
-            prop['kwx'] = max(prop['kwx'], 1)
+    return prop
 
-        if (abs(prop['the'][0]) > 0.2 or
-            prop['dl'][0] < 0.1 * prop['dls'][0] or
-            prop['dl'][1] > 3 * prop['dls'][0]):
-            prop['kwx'] = max(prop['kwx'], 3)
 
-        if (abs(prop['the'][1]) > 0.2 or
-            prop['dl'][1] < 0.1 * prop['dls'][1] or
-            prop['dl'][1] > 3 * prop['dls'][1]):
-            prop['kwx'] = max(prop['kwx'], 3)
+def lrprop_vec(d, prop):
+    """
+    Vectorized form of lrprop which returns the reference attenuation (aref) for a 1-D
+    array of distances in a single call.
 
-        if (prop['ens'] < 250 or prop['ens'] > 400 or prop['gme'] < 75e-9 or
-            prop['gme'] > 250e-9 or prop['zgnd'].real < abs(prop['zgnd'].imag) or
-            prop['wn'] < 0.419 or prop['wn'] > 420):
-            prop['kwx'] = 4
+    The one-time setup (dls, emd, aed etc.) is shared with lrprop and carried out only when
+    mdp is non-zero. The line-of-sight (ael, ak1, ak2) and scatter (ems, aes, dx)
+    coefficients are computed once, only if any of the distances need them (see
+    LrpropCoefficients), and the three regions of Eqn 4.1 of "The ITS Irregular Terrain
+    Model, version 1.2.2: The Algorithm" are then evaluated with masks over the whole
+    array.
 
-        if prop['hg'][0] < 0.5 or prop['hg'][0] > 3000:
-            prop['kwx'] = 4
+    Parameters
+    ----------
+    d : array_like
+        Distances in meters.
+    prop : dict
+        Contains all input propagation parameters
 
-        if prop['hg'][1] < 0.5 or prop['hg'][1] > 3000:
+    Returns
+    -------
+    aref : numpy.ndarray
+        Reference attenuation at each of the distances.
+    prop : dict
+        Contains all input and output propagation parameters.
+
+    """
+    d = np.asarray(d, dtype=float)
+
+    coefficients = LrpropCoefficients(prop)
+    prop = coefficients.prop
+
+    if prop['mdp'] >= 0:
+        prop['mdp'] = 0
+
+    positive = d > 0
+
+    if positive.any():
+        dist = d[positive]
+        if (dist > 1000e3).any():
+            prop['kwx'] = max(prop['kwx'], 1)
+        if (dist < prop['dmin']).any():
+            prop['kwx'] = max(prop['kwx'], 3)
+        if ((dist < 1e3) | (dist > 2000e3)).any():
             prop['kwx'] = 4
 
-        prop['dmin'] = abs(prop['he'][0] - prop['he'][1]) / 0.2
+    aref = coefficients.aref(d)
 
-        q, prop = adiff(0, prop)
+    return aref, prop
 
-        prop['xae'] = (prop['wn'] * prop['gme']**2)**(-third)
 
-        d3 = max(prop['dlsa'], 1.3787 * prop['xae'] + prop['dla'])
-        d4 = d3 + 2.7574 * prop['xae']
-        a3, prop = adiff(d3, prop)
-        a4, prop = adiff(d4, prop)
+def lrprop_batch(d, prop):
+    """
+    Batch form of lrprop for many links at once, in which prop holds one array per
+    parameter (a struct of arrays), with an element for each link. Per-terminal parameters
+    (hg, he, dl, the) have shape (2, N), so prop['he'][0] still gives the transmitter side.
+    The control flags (mdp, lvar etc.) are shared by every link.
 
-        prop['emd'] = (a4 - a3) / (d4 - d3)
+    The setup, line-of-sight and scatter coefficients are computed for all links together,
+    the line-of-sight and scatter blocks only if any link needs them (see
+    LrpropCoefficients), and the reference attenuation (aref) of each link is then taken
+    from its region of Eqn 4.1 of "The ITS Irregular Terrain Model, version 1.2.2: The
+    Algorithm". The warning flag kwx is returned as an array.
 
-        prop['aed'] = a3 - prop['emd'] * d3
-        prop['wis'] = (
-            0.021 / (0.021 + prop['wn'] *
-            prop['dh'] / max(10e3, prop['dlsa']))
-            )
-        prop['ascat1'] = 0
+    Parameters
+    ----------
+    d : array_like
+        Distance of each link in meters.
+    prop : dict
+        Contains all input propagation parameters
+
+    Returns
+    -------
+    prop : dict
+        Contains all input and output propagation parameters, including the reference
+        attenuation (aref) of each link.
+
+    """
+    coefficients = LrpropCoefficients(prop, batch=True)
+    prop = coefficients.prop
 
     if prop['mdp'] >= 0:
         prop['mdp'] = 0
-        prop['dist'] = d
+        prop['dist'] = np.asarray(d, dtype=float)
 
-    if prop['dist'] > 0:
-        if prop['dist'] > 1000e3:
-            prop['kwx'] = max(prop['kwx'], 1)
-        if prop['dist'] < prop['dmin']:
-            prop['kwx'] = max(prop['kwx'], 3)
-        if prop['dist'] < 1e3 or prop['dist'] > 2000e3:
-            prop['kwx'] = 4
+    dist = np.asarray(prop['dist'], dtype=float)
+    kwx = prop['kwx']
 
-    if prop['dist'] < prop['dlsa']:
-        if prop['wlos'] == 0:
+    positive = dist > 0
+    kwx = np.where(positive & (dist > 1000e3), np.maximum(kwx, 1), kwx)
+    kwx = np.where(positive & (dist < prop['dmin']), np.maximum(kwx, 3), kwx)
+    kwx = np.where(positive & ((dist < 1e3) | (dist > 2000e3)), 4, kwx)
+    prop['kwx'] = kwx
+
+    prop['aref'] = coefficients.aref(dist)
+
+    return prop
+
+
+class LrpropCoefficients:
+    """
+    The coefficients of lrprop for a link, or for many links held as in lrprop_batch, with
+    the line-of-sight (ael, ak1, ak2) and scatter (ems, aes, dx) blocks each computed on
+    first demand.
+
+    The setup is carried out on creation when mdp is non-zero, as in lrprop. The
+    reference attenuation is then found with aref, which computes only the blocks needed
+    by the distances asked for, so a job which lies wholly within line of sight never sets
+    up the scatter coefficients. The blocks already held in prop (wlos, wscat) are not
+    computed again.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains all input propagation parameters.
+    batch : bool
+        Whether prop holds the parameters of many links, as in lrprop_batch.
 
-            d2 = prop['dlsa']
-            a2 = prop['aed'] + d2 * prop['emd']
-            d0 = 1.908 * prop['wn'] * prop['he'][0] * prop['he'][1]
+    Attributes
+    ----------
+    computed : list
+        Names of the blocks ('setup', 'los', 'scatter') computed by this object, in the
+        order they were computed.
 
-            if prop['aed'] >= 0:
-                d0 = min(d0, 0.5 * prop['dla'])
-                d1 = d0 + 0.25 * (prop['dla'] - d0)
+    """
+    def __init__(self, prop, batch=False):
+        self.prop = prop
+        self.batch = batch
+        self.computed = []
+
+        if prop['mdp'] != 0:
+            if batch:
+                self.prop = _lrprop_setup_batch(prop)
             else:
-                d1 = max(-prop['aed'] / prop['emd'], 0.25 * prop['dla'])
-
-            a1 = alos(d1, prop)
-
-            wq=0
-            if d0 < d1:
-                a0 = alos(d0, prop)
-                q = np.log(d2 / d0)
-                prop['ak2'] = (
-                    max(0,((d2 - d0) * (a1 - a0) - (d1 - d0) *
-                    (a2 - a0)) / ((d2 - d0) * np.log(d1 / d0) -
-                    (d1 - d0) * q))
-                    )
+                self.prop = _lrprop_setup_cached(prop)
+            self.computed.append('setup')
+
+    def los(self):
+        """
+        Returns prop holding the line-of-sight coefficients (ael, ak1, ak2), computing them
+        if they are not yet set.
+
+        """
+        if self.prop['wlos'] == 0:
+            if self.batch:
+                self.prop = _los_coefficients_batch(self.prop)
+            else:
+                self.prop = _los_coefficients_cached(self.prop)
+            self.computed.append('los')
 
-                wq = ((prop['aed'] >= 0) or (prop['ak2'] > 0))
+        return self.prop
 
-                if wq:
-                    prop['ak1'] = (a2 - a0 - prop['ak2'] * q) / (d2 - d0)
-                    if prop['ak1'] < 0:
-                        prop['ak1'] = 0
-                        prop['ak2'] = max(a2 - a0, 0) / q
-                        if prop['ak2'] == 0:
-                            prop['ak1'] = prop['emd']
+    def scatter(self):
+        """
+        Returns prop holding the scatter coefficients (ems, aes, dx), computing them if
+        they are not yet set.
 
-            if wq == 0:
-                prop['ak1'] = max(a2 - a1, 0) / (d2 - d1)
-                prop['ak2'] = 0
-                if prop['ak1'] == 0:
-                    prop['ak1'] = prop['emd']
+        """
+        if self.prop['wscat'] == 0:
+            if self.batch:
+                self.prop = _scatter_coefficients_batch(self.prop)
+            else:
+                self.prop = _scatter_coefficients_cached(self.prop)
+            self.computed.append('scatter')
 
-            prop['ael'] = a2 - prop['ak1'] * d2 - prop['ak2'] * np.log(d2)
-            prop['wlos'] = 1
+        return self.prop
 
-            if prop['dist'] > 0:
-                prop['aref'] = (
-                    prop['ael'] + prop['ak1'] *
-                    prop['dist'] + prop['ak2'] * np.log(prop['dist'])
-                    )
+    def aref(self, d):
+        """
+        Reference attenuation at each distance, from the region of Eqn 4.1 of "The ITS
+        Irregular Terrain Model, version 1.2.2: The Algorithm" it lies in.
 
-    if prop['dist'] <= 0 or prop['dist'] >= prop['dlsa']:
+        Parameters
+        ----------
+        d : array_like
+            Distances in meters, one per link in batch form.
 
-        if prop['wscat'] == 0:
-            prop['ad'] = prop['dl'][0] - prop['dl'][1]
-            prop['rr'] = prop['he'][1] / prop['he'][0]
-            if prop['ad'] < 0:
-                prop['ad'] = -prop['ad']
-                prop['rr'] = 1 / prop['rr']
-
-            prop['etq'] = (
-                (5.67e-6 * prop['ens'] - 2.32e-3) *
-                prop['ens'] + 0.031
-                )
+        Returns
+        -------
+        aref : numpy.ndarray
+            Reference attenuation at each of the distances.
 
-            prop['h0s'] = -15
+        """
+        d = np.asarray(d, dtype=float)
+        prop = self.prop
 
-            d5 = prop['dla'] + 200e3
-            d6 = d5 + 200e3
+        los = (d > 0) & (d < prop['dlsa'])
+        beyond = ~los
 
-            prop = ascat(d6, prop)
-            a6 = prop['ascat1']
-            prop = ascat(d5, prop)
-            a5 = prop['ascat1']
+        aref = np.zeros(los.shape)
 
-            if a5 < 1000:
-                prop['ems'] = (a6 - a5) / 200e3
-                prop['dx'] = (
-                    max([prop['dlsa'], prop['dla'] + 0.3 * prop['xae'] *
-                    np.log(47.7 * prop['wn']), (a5 - prop['aed'] -
-                    prop['ems'] * d5) / (prop['emd'] - prop['ems'])])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if los.any():
+                prop = self.los()
+                aref = np.where(
+                    los, prop['ael'] + prop['ak1'] * d + prop['ak2'] * np.log(d), aref
                     )
-                prop['aes'] = (
-                    (prop['emd'] - prop['ems']) *
-                    prop['dx'] + prop['aed']
+
+            if beyond.any():
+                prop = self.scatter()
+                aref = np.where(
+                    beyond & (d > prop['dx']), prop['aes'] + prop['ems'] * d,
+                    np.where(beyond, prop['aed'] + prop['emd'] * d, aref)
                     )
 
-            else:
-                prop['ems'] = prop['emd']
-                prop['aes'] = prop['aed']
-                prop['dx'] = 10e6
+        return np.maximum(aref, 0)
 
-            prop['wscat'] = 1
 
-        if prop['dist'] > prop['dx']:
-            prop['aref'] = prop['aes'] + prop['ems'] * prop['dist']
-        else:
-            prop['aref'] = prop['aed'] + prop['emd'] * prop['dist']
+def _lrprop_setup_cached(prop):
+    """
+    Carries out the setup for lrprop, taking the results from a least recently used cache
+    keyed on the inputs the setup depends on, so links sharing the same geometry (e.g.
+    the same tower type over flat terrain) are only set up once.
 
-    prop['aref'] = max(prop['aref'], 0)
+    """
+    values = _cached(
+        _setup_values,
+        _hashable(prop['he']), _hashable(prop['dl']), _hashable(prop['the']),
+        prop['dh'], prop['wn'], prop['gme'], prop['zgnd'], _hashable(prop['hg']),
+        prop['ens'], prop['mdp'] < 0
+        )
+
+    kwx = prop['kwx']
+
+    prop.update(zip(SETUP_FIELDS, values))
+    prop['dls'] = list(prop['dls'])
+    prop['kwx'] = max(kwx, prop['kwx'])
+    prop['wlos'] = 0
+    prop['wscat'] = 0
+    prop['ascat1'] = 0
+
+    return prop
+
+
+def _los_coefficients_cached(prop):
+    """
+    Computes the line-of-sight coefficients (ael, ak1, ak2), taking the results from a
+    least recently used cache keyed on the inputs they depend on.
+
+    """
+    values = _cached(
+        _los_values,
+        _hashable(prop['he']), prop['dh'], prop['wn'], prop['zgnd'], prop['dla'],
+        prop['dlsa'], prop['aed'], prop['emd'], prop['wis']
+        )
+
+    prop.update(zip(LOS_FIELDS, values))
+    prop['wlos'] = 1
+
+    return prop
+
+
+def _scatter_coefficients_cached(prop):
+    """
+    Computes the scatter coefficients (ems, aes, dx), taking the results from a least
+    recently used cache keyed on the inputs they depend on.
+
+    """
+    values = _cached(
+        _scatter_values,
+        _hashable(prop['he']), _hashable(prop['dl']), _hashable(prop['the']),
+        prop['ens'], prop['gme'], prop['wn'], prop['dla'], prop['dlsa'], prop['tha'],
+        prop['xae'], prop['aed'], prop['emd']
+        )
+
+    prop.update(zip(SCATTER_FIELDS, values))
+    prop['wscat'] = 1
+
+    return prop
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _setup_values(he, dl, the, dh, wn, gme, zgnd, hg, ens, p2p):
+    """
+    Pure form of _lrprop_setup, returning the values of SETUP_FIELDS, with kwx as the
+    warning level raised by the setup alone.
+
+    """
+    prop = {
+        'he': list(he), 'dl': list(dl), 'the': list(the), 'dh': dh, 'wn': wn,
+        'gme': gme, 'zgnd': zgnd, 'hg': list(hg), 'ens': ens, 'mdp': -1 if p2p else 1,
+        'kwx': 0,
+        }
+
+    prop = _lrprop_setup(prop)
+    prop['dls'] = tuple(prop['dls'])
+
+    return tuple(prop[field] for field in SETUP_FIELDS)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _los_values(he, dh, wn, zgnd, dla, dlsa, aed, emd, wis):
+    """
+    Pure form of _los_coefficients, returning the values of LOS_FIELDS.
+
+    """
+    prop = {
+        'he': list(he), 'dh': dh, 'wn': wn, 'zgnd': zgnd, 'dla': dla, 'dlsa': dlsa,
+        'aed': aed, 'emd': emd, 'wis': wis,
+        }
+
+    prop = _los_coefficients(prop)
+
+    return tuple(prop[field] for field in LOS_FIELDS)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _scatter_values(he, dl, the, ens, gme, wn, dla, dlsa, tha, xae, aed, emd):
+    """
+    Pure form of _scatter_coefficients, returning the values of SCATTER_FIELDS.
+
+    """
+    prop = {
+        'he': list(he), 'dl': list(dl), 'the': list(the), 'ens': ens, 'gme': gme,
+        'wn': wn, 'dla': dla, 'dlsa': dlsa, 'tha': tha, 'xae': xae, 'aed': aed,
+        'emd': emd, 'ascat1': 0,
+        }
+
+    prop = _scatter_coefficients(prop)
+
+    return tuple(prop[field] for field in SCATTER_FIELDS)
+
+
+def _hashable(values):
+    """
+    Converts the per-terminal values of a parameter to a tuple, for use as a cache key.
+
+    """
+    return tuple(values[j] for j in range(2))
+
+
+def _cached(function, *key):
+    """
+    Calls a cached function, bypassing the cache if the key cannot be hashed (e.g. when
+    a parameter is held as an array). The key is checked before the call, so errors
+    raised by the function itself are passed on.
+
+    """
+    try:
+        hash(key)
+    except TypeError:
+        return function.__wrapped__(*key)
+
+    return function(*key)
+
+
+def clear_lrprop_cache():
+    """
+    Clears the caches of the lrprop setup, line-of-sight and scatter coefficients.
+
+    """
+    for function in (_setup_values, _los_values, _scatter_values):
+        function.cache_clear()
+
+
+def _lrprop_setup(prop):
+    """
+    One-time setup for lrprop carried out when mdp is non-zero, covering the smooth earth
+    horizon distances, the validity checks and the diffraction coefficients (aed, emd).
+
+    """
+    third = 1 / 3
+
+    prop['dls'] = []
+
+    for entry in prop['he']:
+        prop['dls'].append(math.sqrt(2 * entry / prop['gme']))
+
+    prop['dlsa']  = prop['dls'][0] + prop['dls'][1]
+
+    prop['dla'] = prop['dl'][0] + prop['dl'][1]
+
+    prop['tha'] = (
+        max(prop['the'][0] + prop['the'][1],
+        -prop['dla'] * prop['gme'])
+        )
+
+    prop['wlos'] = 0
+    prop['wscat'] = 0
+
+    if prop['wn'] < 0.838 or prop['wn'] > 210:
+        prop['kwx'] = max(prop['kwx'], 1)
+
+    if prop['hg'][0] < 1 or prop['hg'][0] > 1000:
+        prop['kwx'] = max(prop['kwx'], 1)
+
+    if prop['hg'][1] < 1 or prop['hg'][1] > 1000:
+        prop['kwx'] = max(prop['kwx'], 1)
+
+    if (abs(prop['the'][0]) > 0.2 or
+        prop['dl'][0] < 0.1 * prop['dls'][0] or
+        prop['dl'][1] > 3 * prop['dls'][0]):
+        prop['kwx'] = max(prop['kwx'], 3)
+
+    if (abs(prop['the'][1]) > 0.2 or
+        prop['dl'][1] < 0.1 * prop['dls'][1] or
+        prop['dl'][1] > 3 * prop['dls'][1]):
+        prop['kwx'] = max(prop['kwx'], 3)
+
+    if (prop['ens'] < 250 or prop['ens'] > 400 or prop['gme'] < 75e-9 or
+        prop['gme'] > 250e-9 or prop['zgnd'].real < abs(prop['zgnd'].imag) or
+        prop['wn'] < 0.419 or prop['wn'] > 420):
+        prop['kwx'] = 4
+
+    if prop['hg'][0] < 0.5 or prop['hg'][0] > 3000:
+        prop['kwx'] = 4
+
+    if prop['hg'][1] < 0.5 or prop['hg'][1] > 3000:
+        prop['kwx'] = 4
+
+    prop['dmin'] = abs(prop['he'][0] - prop['he'][1]) / 0.2
+
+    q, prop = adiff(0, prop)
+
+    prop['xae'] = (prop['wn'] * prop['gme']**2)**(-third)
+
+    d3 = max(prop['dlsa'], 1.3787 * prop['xae'] + prop['dla'])
+    d4 = d3 + 2.7574 * prop['xae']
+    a3, prop = adiff(d3, prop)
+    a4, prop = adiff(d4, prop)
+
+    prop['emd'] = (a4 - a3) / (d4 - d3)
+
+    prop['aed'] = a3 - prop['emd'] * d3
+    prop['wis'] = (
+        0.021 / (0.021 + prop['wn'] *
+        prop['dh'] / max(10e3, prop['dlsa']))
+        )
+    prop['ascat1'] = 0
+
+    return prop
+
+
+def _los_coefficients(prop):
+    """
+    Computes the line-of-sight coefficients (ael, ak1, ak2) from two calls to alos.
+
+    """
+    d2 = prop['dlsa']
+    a2 = prop['aed'] + d2 * prop['emd']
+    d0 = 1.908 * prop['wn'] * prop['he'][0] * prop['he'][1]
+
+    if prop['aed'] >= 0:
+        d0 = min(d0, 0.5 * prop['dla'])
+        d1 = d0 + 0.25 * (prop['dla'] - d0)
+    else:
+        d1 = max(-prop['aed'] / prop['emd'], 0.25 * prop['dla'])
+
+    a1 = alos(d1, prop)
+
+    wq=0
+    if d0 < d1:
+        a0 = alos(d0, prop)
+        q = np.log(d2 / d0)
+        prop['ak2'] = (
+            max(0,((d2 - d0) * (a1 - a0) - (d1 - d0) *
+            (a2 - a0)) / ((d2 - d0) * np.log(d1 / d0) -
+            (d1 - d0) * q))
+            )
+
+        wq = ((prop['aed'] >= 0) or (prop['ak2'] > 0))
+
+        if wq:
+            prop['ak1'] = (a2 - a0 - prop['ak2'] * q) / (d2 - d0)
+            if prop['ak1'] < 0:
+                prop['ak1'] = 0
+                prop['ak2'] = max(a2 - a0, 0) / q
+                if prop['ak2'] == 0:
+                    prop['ak1'] = prop['emd']
+
+    if wq == 0:
+        prop['ak1'] = max(a2 - a1, 0) / (d2 - d1)
+        prop['ak2'] = 0
+        if prop['ak1'] == 0:
+            prop['ak1'] = prop['emd']
+
+    prop['ael'] = a2 - prop['ak1'] * d2 - prop['ak2'] * np.log(d2)
+    prop['wlos'] = 1
+
+    return prop
+
+
+def _scatter_coefficients(prop):
+    """
+    Computes the scatter coefficients (ems, aes, dx) from two calls to ascat at dla + 200 km
+    and dla + 400 km.
+
+    """
+    prop['ad'] = prop['dl'][0] - prop['dl'][1]
+    prop['rr'] = prop['he'][1] / prop['he'][0]
+    if prop['ad'] < 0:
+        prop['ad'] = -prop['ad']
+        prop['rr'] = 1 / prop['rr']
+
+    prop['etq'] = (
+        (5.67e-6 * prop['ens'] - 2.32e-3) *
+        prop['ens'] + 0.031
+        )
+
+    prop['h0s'] = -15
+
+    d5 = prop['dla'] + 200e3
+    d6 = d5 + 200e3
+
+    prop = ascat(d6, prop)
+    a6 = prop['ascat1']
+    prop = ascat(d5, prop)
+    a5 = prop['ascat1']
+
+    if a5 < 1000:
+        prop['ems'] = (a6 - a5) / 200e3
+        prop['dx'] = (
+            max([prop['dlsa'], prop['dla'] + 0.3 * prop['xae'] *
+            np.log(47.7 * prop['wn']), (a5 - prop['aed'] -
+            prop['ems'] * d5) / (prop['emd'] - prop['ems'])])
+            )
+        prop['aes'] = (
+            (prop['emd'] - prop['ems']) *
+            prop['dx'] + prop['aed']
+            )
+
+    else:
+        prop['ems'] = prop['emd']
+        prop['aes'] = prop['aed']
+        prop['dx'] = 10e6
+
+    prop['wscat'] = 1
+
+    return prop
+
+
+def _lrprop_setup_batch(prop):
+    """
+    Batch form of _lrprop_setup, for prop holding the parameters of many links.
+
+    """
+    third = 1 / 3
+
+    he = prop['he']
+    hg = prop['hg']
+    the = prop['the']
+    dl = prop['dl']
+
+    prop['dls'] = np.sqrt(2 * np.asarray(he, dtype=float) / prop['gme'])
+
+    prop['dlsa']  = prop['dls'][0] + prop['dls'][1]
+
+    prop['dla'] = dl[0] + dl[1]
+
+    prop['tha'] = np.maximum(the[0] + the[1], -prop['dla'] * prop['gme'])
+
+    prop['wlos'] = 0
+    prop['wscat'] = 0
+
+    kwx = np.asarray(prop['kwx'])
+
+    warn = (
+        (prop['wn'] < 0.838) | (prop['wn'] > 210) |
+        (hg[0] < 1) | (hg[0] > 1000) |
+        (hg[1] < 1) | (hg[1] > 1000)
+        )
+    kwx = np.where(warn, np.maximum(kwx, 1), kwx)
+
+    warn = (
+        (np.abs(the[0]) > 0.2) |
+        (dl[0] < 0.1 * prop['dls'][0]) |
+        (dl[1] > 3 * prop['dls'][0]) |
+        (np.abs(the[1]) > 0.2) |
+        (dl[1] < 0.1 * prop['dls'][1]) |
+        (dl[1] > 3 * prop['dls'][1])
+        )
+    kwx = np.where(warn, np.maximum(kwx, 3), kwx)
+
+    zgnd = np.asarray(prop['zgnd'])
+    invalid = (
+        (prop['ens'] < 250) | (prop['ens'] > 400) | (prop['gme'] < 75e-9) |
+        (prop['gme'] > 250e-9) | (zgnd.real < np.abs(zgnd.imag)) |
+        (prop['wn'] < 0.419) | (prop['wn'] > 420) |
+        (hg[0] < 0.5) | (hg[0] > 3000) |
+        (hg[1] < 0.5) | (hg[1] > 3000)
+        )
+    prop['kwx'] = np.where(invalid, 4, kwx)
+
+    prop['dmin'] = np.abs(he[0] - he[1]) / 0.2
+
+    q, prop = adiff_vec(0, prop)
+
+    prop['xae'] = (prop['wn'] * prop['gme']**2)**(-third)
+
+    d3 = np.maximum(prop['dlsa'], 1.3787 * prop['xae'] + prop['dla'])
+    d4 = d3 + 2.7574 * prop['xae']
+    a3, prop = adiff_vec(d3, prop)
+    a4, prop = adiff_vec(d4, prop)
+
+    prop['emd'] = (a4 - a3) / (d4 - d3)
+
+    prop['aed'] = a3 - prop['emd'] * d3
+    prop['wis'] = (
+        0.021 / (0.021 + prop['wn'] *
+        prop['dh'] / np.maximum(10e3, prop['dlsa']))
+        )
+    prop['ascat1'] = 0
+
+    return prop
+
+
+def _los_coefficients_batch(prop):
+    """
+    Batch form of _los_coefficients, for prop holding the parameters of many links.
+
+    """
+    d2 = prop['dlsa']
+    a2 = prop['aed'] + d2 * prop['emd']
+    d0 = 1.908 * prop['wn'] * prop['he'][0] * prop['he'][1]
+
+    positive = prop['aed'] >= 0
+
+    d0 = np.where(positive, np.minimum(d0, 0.5 * prop['dla']), d0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = np.where(
+            positive,
+            d0 + 0.25 * (prop['dla'] - d0),
+            np.maximum(-prop['aed'] / prop['emd'], 0.25 * prop['dla'])
+            )
+
+        a1 = alos_vec(d1, prop)
+        a0 = alos_vec(d0, prop)
+
+        q = np.log(d2 / d0)
+        ak2 = np.maximum(0, ((d2 - d0) * (a1 - a0) - (d1 - d0) *
+            (a2 - a0)) / ((d2 - d0) * np.log(d1 / d0) -
+            (d1 - d0) * q))
+
+        wq = (d0 < d1) & (positive | (ak2 > 0))
+
+        ak1 = (a2 - a0 - ak2 * q) / (d2 - d0)
+        negative = ak1 < 0
+        ak1 = np.where(negative, 0, ak1)
+        ak2 = np.where(negative, np.maximum(a2 - a0, 0) / q, ak2)
+        ak1 = np.where(negative & (ak2 == 0), prop['emd'], ak1)
+
+        ak1_fallback = np.maximum(a2 - a1, 0) / (d2 - d1)
+        ak1_fallback = np.where(ak1_fallback == 0, prop['emd'], ak1_fallback)
+
+    prop['ak1'] = np.where(wq, ak1, ak1_fallback)
+    prop['ak2'] = np.where(wq, ak2, 0)
+
+    prop['ael'] = a2 - prop['ak1'] * d2 - prop['ak2'] * np.log(d2)
+    prop['wlos'] = 1
+
+    return prop
+
+
+def _scatter_coefficients_batch(prop):
+    """
+    Batch form of _scatter_coefficients, for prop holding the parameters of many links.
+
+    """
+    ad = prop['dl'][0] - prop['dl'][1]
+    rr = prop['he'][1] / prop['he'][0]
+
+    prop['ad'] = np.abs(ad)
+    prop['rr'] = np.where(ad < 0, 1 / rr, rr)
+
+    prop['etq'] = (
+        (5.67e-6 * prop['ens'] - 2.32e-3) *
+        prop['ens'] + 0.031
+        )
+
+    prop['h0s'] = -15
+
+    d5 = prop['dla'] + 200e3
+    d6 = d5 + 200e3
+
+    prop = ascat_vec(d6, prop)
+    a6 = prop['ascat1']
+    prop = ascat_vec(d5, prop)
+    a5 = prop['ascat1']
+
+    valid = a5 < 1000
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ems = (a6 - a5) / 200e3
+        dx = np.maximum(
+            np.maximum(prop['dlsa'], prop['dla'] + 0.3 * prop['xae'] *
+            np.log(47.7 * prop['wn'])), (a5 - prop['aed'] -
+            ems * d5) / (prop['emd'] - ems)
+            )
+        aes = (prop['emd'] - ems) * dx + prop['aed']
+
+    prop['ems'] = np.where(valid, ems, prop['emd'])
+    prop['aes'] = np.where(valid, aes, prop['aed'])
+    prop['dx'] = np.where(valid, dx, 10e6)
+
+    prop['wscat'] = 1
 
     return prop
@@ -1,15 +1,18 @@
 import math
-from itmlogic.misc.qtile import qtile
-from itmlogic.preparatory_subroutines.zlsq1 import zlsq1
+import numpy
+from itmlogic.preparatory_subroutines.zlsq1 import zlsq1, zlsq1_batch
 
 def dlthx(pfl1, x1, x2):
     """
     Use the terrain profile pfl1 to find delta h, interdecile range of elevations between
     point x1 and point x2, as described in Section 48 by Hufford (see references/itm.pdf).
 
+    The profile is resampled at n points, detrended with a least squares line from zlsq1,
+    and both deciles are then selected with a single partition of the detrended samples.
+
     Parameters
     ----------
-    pfl1 : list
+    pfl1 : list or ProfileIndex
         Terrain profile.
     x1 : int
         Point 1
@@ -27,43 +30,166 @@ def dlthx(pfl1, x1, x2):
     xb = x2 / pfl1[1]
     dlthx1 = 0
 
-    s = []
-
     if (xb - xa) >= 2:
         ka  = int(0.1 * (xb - xa + 8))
         ka  = min(max(4, ka), 25)
         n   = 10 * ka - 5
         kb  = n - ka + 1
         sn  = n - 1
-        s.append(sn)
-        s.append(1)
         xb  = (xb - xa) / sn
-        k   = int(xa + 1)
-        xa  = xa - k
-
-        for j in range(1, n + 1):
 
-            while xa > 0 and k < np:
-                xa = xa - 1
-                k = k + 1
+        points, offsets = _sample_points([xa], [xb], [np], n)
+        points = points[0]
+        offsets = offsets[0]
 
-            if k+2 <= len(pfl1): #addition to avoid indexing beyond the length of a list
-                s.append(pfl1[k+2] + (pfl1[k+2] - pfl1[k + 1]) * xa)
-            else: #addition to avoid indexing beyond the length of a list
-                s.append(pfl1[len(pfl1) - 1] + (pfl1[len(pfl1) - 1] - pfl1[len(pfl1) - 2]) * xa)
+        z = numpy.asarray(pfl1, dtype=float)
 
-            xa = xa + xb
+        #avoid indexing beyond the end of the profile
+        upper = numpy.minimum(points + 2, len(z) - 1)
+        s = z[upper] + (z[upper] - z[upper - 1]) * offsets
 
-        xa, xb = zlsq1(s, 0, sn)
+        xa, xb = zlsq1(numpy.concatenate(([sn, 1], s)), 0, sn)
 
         xb = (xb - xa) / sn
 
-        for j in range(0, n):
-            s[j+2] = s[j + 2] - xa
-            xa = xa + xb
+        s = s - numpy.cumsum([xa] + [xb] * (n - 1))
 
-        dlthx1 = qtile(s[2:], ka-1) - qtile(s[2:], kb-1)
+        s = -numpy.partition(-s, (ka - 1, kb - 1))
+
+        dlthx1 = float(s[ka - 1] - s[kb - 1])
 
         dlthx1 = dlthx1 / (1 - 0.8 * math.exp(-(x2 - x1) / 50e3))
 
     return dlthx1
+
+
+def dlthx_batch(pfl, x1, x2, intervals=None):
+    """
+    Batch form of dlthx, finding delta h for each row of a 2-D array of terrain profiles
+    (in the layout made by stack_profiles) at once.
+
+    The n sample points of every profile are found together from running sums of the
+    sample spacing, the detrending uses zlsq1_batch, and the deciles are selected with a
+    partition of each group of rows sharing the same n. The results are identical to
+    dlthx, which finds its sample points the same way.
+
+    Parameters
+    ----------
+    pfl : numpy.ndarray
+        Terrain profiles, one per row.
+    x1 : array_like
+        Point 1 of each profile.
+    x2 : array_like
+        Point 2 of each profile.
+    intervals : array_like
+        Number of intervals of each profile, in place of the first column.
+
+    Returns
+    -------
+    dlthx1 : numpy.ndarray
+        Interdecile range of elevations of each profile.
+
+    """
+    pfl = numpy.asarray(pfl, dtype=float)
+    n_rows = pfl.shape[0]
+    rows = numpy.arange(n_rows)[:, None]
+
+    if intervals is None:
+        np = pfl[:, 0].astype(int)
+    else:
+        np = numpy.broadcast_to(numpy.asarray(intervals, dtype=int), (n_rows,))
+    z = pfl[:, 2:]
+
+    x1 = numpy.broadcast_to(numpy.asarray(x1, dtype=float), (n_rows,))
+    x2 = numpy.broadcast_to(numpy.asarray(x2, dtype=float), (n_rows,))
+
+    xa = x1 / pfl[:, 1]
+    xb = x2 / pfl[:, 1]
+
+    valid = (xb - xa) >= 2
+
+    ka = numpy.trunc(0.1 * (xb - xa + 8))
+    ka = numpy.where(valid, numpy.clip(ka, 4, 25), 4).astype(int)
+    n = 10 * ka - 5
+    kb = n - ka + 1
+    sn = n - 1
+
+    xb = (xb - xa) / sn
+
+    points, offsets = _sample_points(xa, xb, np, n.max(initial=0))
+
+    upper = numpy.clip(points, 1, z.shape[1] - 1)
+    samples = z[rows, upper] + (z[rows, upper] - z[rows, upper - 1]) * offsets
+
+    s = numpy.empty((n_rows, points.shape[1] + 2))
+    s[:, 0] = sn
+    s[:, 1] = 1
+    s[:, 2:] = samples
+
+    xa, xb = zlsq1_batch(s, 0, sn)
+
+    xb = (xb - xa) / sn
+
+    line = numpy.repeat(xb[:, None], points.shape[1], axis=1)
+    line[:, 0] = xa
+    s = samples - numpy.cumsum(line, axis=1)
+
+    j = numpy.arange(points.shape[1])[None, :]
+    s = numpy.where(j < n[:, None], -s, numpy.inf)
+
+    dlthx1 = numpy.zeros(n_rows)
+
+    for size in numpy.unique(ka[valid]):
+        group = valid & (ka == size)
+        deciles = numpy.partition(s[group], (size - 1, 9 * size - 5), axis=1)
+        dlthx1[group] = deciles[:, 9 * size - 5] - deciles[:, size - 1]
+
+    #math.exp rather than numpy.exp, which may differ from it in the last digit
+    scale = numpy.array([1 - 0.8 * math.exp(-(b - a) / 50e3) for a, b in zip(x1, x2)])
+
+    dlthx1 = dlthx1 / scale
+
+    return numpy.where(valid, dlthx1, 0)
+
+
+def _sample_points(xa, xb, np, width):
+    """
+    Points k, and offsets from them, at which dlthx interpolates its samples, for each
+    row of positions xa (in profile intervals) and sample spacings xb.
+
+    The loop of Section 48 steps the offset by xb for each sample, and advances k past it
+    up to the end of the profile (np). The offsets are found for every sample at once as
+    xa - k + j * xb, less the whole intervals advanced, with the product and sum kept
+    exact (Dekker's product and Knuth's sum). The running sums of the loop round at each
+    step, so the offsets, and delta h, are within rounding of the loop rather than
+    identical to it: they match wherever the running sums are exact (as on the profiles
+    of the tests), and can differ in the last bits elsewhere.
+
+    """
+    xa = numpy.asarray(xa, dtype=float)[:, None]
+    xb = numpy.asarray(xb, dtype=float)[:, None]
+    np = numpy.asarray(np)[:, None]
+
+    k = numpy.trunc(xa + 1)
+    r = xa - k
+    j = numpy.arange(width, dtype=float)[None, :]
+
+    #j * xb as p + pe exactly, splitting xb into halves of 26 bits
+    p = j * xb
+    c = 134217729.0 * xb
+    high = c - (c - xb)
+    pe = (j * high - p) + j * (xb - high)
+
+    #r + p as s + e exactly
+    s = p + r
+    b = s - p
+    e = (p - (s - b)) + (r - b)
+    f = e + pe
+
+    #whole intervals advanced past the offset s + f, up to the end of the profile
+    m = numpy.ceil(s)
+    offset = (s - m) + f
+    m = m + (offset > 0) - (offset <= -1)
+    m = numpy.clip(m, 0, numpy.maximum(np - k, 0))
+
+    return (k + m).astype(int), (s - m) + f
@@ -0,0 +1,218 @@
+import bisect
+import numpy as np
+
+class HorizonTracker:
+    """
+    Horizon parameters of a terrain profile which grows one sample at a time, as the
+    receiver moves outward along a ray (e.g. in a radial coverage sweep or when replaying
+    a drive test).
+
+    Each appended sample becomes the receiver, and the previous receiver an interior
+    point of the profile. The terrain angle seen from the transmitter does not depend on
+    where the profile ends, so the transmitter horizon is kept up to date from a running
+    maximum in constant time per sample.
+
+    Seen from the receiver, the terrain angle of a point is the slope to it from the
+    receiver once the earth curvature is taken out of the heights (z - qc * x**2), so the
+    receiver horizon is on the upper convex hull of the interior points in those
+    coordinates. The hull is kept as the samples arrive, in amortized constant time, and
+    the receiver horizon is found by a binary search of the hull, in time logarithmic in
+    the length of the profile. As in hzns, only points from the first one raising the
+    transmitter horizon are searched. Any point of the hull steeper from the receiver
+    than the transmitter is above the line between them, so it is at or after that first
+    point; the points from there are only scanned, in linear time, when rounding puts
+    the hull point just before it. The results agree with hzns to rounding.
+
+    Parameters
+    ----------
+    xi : float
+        Spacing of the samples (meters).
+    hg : list
+        Heights of transmitter and receiver off ground (meters).
+    gme : float
+        Effective earth curvature.
+    z : list
+        Initial elevations (meters), starting at the transmitter.
+
+    """
+    def __init__(self, xi, hg, gme, z=()):
+        self.xi = float(xi)
+        self.hg = hg
+        self.qc = 0.5 * gme
+
+        self.z = np.empty(64)
+        self.n = 0
+
+        #increasing terrain angles seen from the transmitter, and where they were seen
+        self._records = []
+        self._record_index = []
+
+        #upper convex hull of the interior points, with the curvature taken out
+        self._hull = []
+        self._hull_height = []
+
+        self._horizons = None
+
+        self.extend(z)
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def dist(self):
+        """
+        Distance from the transmitter to the receiver (meters).
+
+        """
+        return (self.n - 1) * self.xi
+
+    @property
+    def profile(self):
+        """
+        Terrain profile in meters, laid out as for qlrpfl.
+
+        """
+        return [self.n - 1, self.xi] + self.z[:self.n].tolist()
+
+    def append(self, z):
+        """
+        Extends the profile by one sample, which becomes the receiver.
+
+        Parameters
+        ----------
+        z : float
+            Elevation (meters).
+
+        """
+        if self.n == len(self.z):
+            self.z = np.concatenate((self.z, np.empty(len(self.z))))
+
+        self.z[self.n] = z
+        self.n += 1
+
+        #the previous receiver is now an interior point
+        if self.n >= 3:
+            i = self.n - 2
+            sa = i * self.xi
+            angle = (self.z[i] - self.z[0] - self.hg[0]) / sa - self.qc * sa
+
+            if not self._records or angle > self._records[-1]:
+                self._records.append(angle)
+                self._record_index.append(i)
+
+            height = self.z[i] - self.qc * sa * sa
+            hull = self._hull
+            heights = self._hull_height
+
+            #drop the points on or below the line from the one before them to the new one
+            while len(hull) >= 2 and (
+                    (heights[-1] - heights[-2]) * (i - hull[-2]) <=
+                    (height - heights[-2]) * (hull[-1] - hull[-2])):
+                hull.pop()
+                heights.pop()
+
+            hull.append(i)
+            heights.append(height)
+
+        self._horizons = None
+
+    def extend(self, z):
+        """
+        Extends the profile by each of a sequence of samples in turn.
+
+        Parameters
+        ----------
+        z : list
+            Elevations (meters).
+
+        """
+        for value in z:
+            self.append(value)
+
+    @property
+    def the(self):
+        """
+        Horizon take-off angles of the current profile, as returned by hzns.
+
+        """
+        return self._update()[0]
+
+    @property
+    def dl(self):
+        """
+        Horizon distances of the current profile, as returned by hzns.
+
+        """
+        return self._update()[1]
+
+    def _update(self):
+        if self._horizons is not None:
+            return self._horizons
+
+        if self.n < 2:
+            raise ValueError('HorizonTracker needs a transmitter and a receiver sample')
+
+        k = self.n - 1
+        dist = k * self.xi
+
+        za = self.z[0] + self.hg[0]
+        zb = self.z[k] + self.hg[1]
+        q = self.qc * dist
+
+        slope = (zb - za) / dist
+        the = {0: slope - q, 1: -slope - q}
+        dl = {0: dist, 1: dist}
+
+        if self._records and self._records[-1] > the[0]:
+            first = self._record_index[bisect.bisect_right(self._records, the[0])]
+
+            the[0] = self._records[-1]
+            dl[0] = self._record_index[-1] * self.xi
+
+            #receiver side, from the first point raising the transmitter horizon
+            column = self._steepest(k, zb)
+
+            if column < first:
+                sb = (k - np.arange(first, k)) * self.xi
+                angle = (self.z[first:k] - zb) / sb - self.qc * sb
+                column = first + int(np.argmax(angle))
+
+            angle = self._angle(column, k, zb)
+            if angle > the[1]:
+                the[1] = angle
+                dl[1] = (k - column) * self.xi
+
+        the = {key: float(value) for key, value in the.items()}
+        dl = {key: float(value) for key, value in dl.items()}
+
+        self._horizons = the, dl
+
+        return self._horizons
+
+    def _angle(self, i, k, zb):
+        """
+        Terrain angle of point i seen from the receiver at point k, as in hzns.
+
+        """
+        sb = (k - i) * self.xi
+        return (self.z[i] - zb) / sb - self.qc * sb
+
+    def _steepest(self, k, zb):
+        """
+        Point of the hull with the largest terrain angle seen from the receiver, the
+        first one on a tie.
+
+        """
+        hull = self._hull
+        lo = 0
+        hi = len(hull) - 1
+
+        #the angles rise and then fall along the hull
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._angle(hull[mid + 1], k, zb) > self._angle(hull[mid], k, zb):
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return hull[lo]
@@ -1,3 +1,7 @@
+import numpy
+
+from itmlogic.preparatory_subroutines.horizon_tracker import HorizonTracker
+
 def hzns(pfl, dist, hg, gme):
     """
     Subroutine to find horizon parameters as described in Section 48 by Hufford
@@ -5,7 +9,7 @@ def hzns(pfl, dist, hg, gme):
 
     Parameters
     ----------
-    pfl : List
+    pfl : List or ProfileIndex
         Terrain profile in meters.
     dist : float
         Distance in meters.
@@ -22,43 +26,240 @@ def hzns(pfl, dist, hg, gme):
         Horizon distances.
 
     """
-    the = {}
-    dl = {}
+    pfl = numpy.asarray(pfl, dtype=float)
 
-    np = pfl[0]
+    np = int(pfl[0])
     xi = pfl[1]
     za = pfl[2] + hg[0]
     zb = pfl[np + 2] + hg[1]
     qc = 0.5 * gme
     q = qc * dist
+
+    slope = (zb - za) / dist
+    the = {0: float(slope - q), 1: float(-slope - q)}
+    dl = {0: float(dist), 1: float(dist)}
+
+    if np < 2:
+        return the, dl
+
+    #interior points, stepped as in hzns_batch
+    zi = pfl[3:np + 2]
+    step = numpy.full(np - 1, xi)
+    sa = numpy.cumsum(step)
+    sb = numpy.cumsum(numpy.concatenate(([dist], -step)))[1:]
+
+    the[0], dl[0], first = _replay_points(zi, sa, za, qc, the[0], dl[0])
+
+    if first is not None:
+        the[1], dl[1], first = _replay_points(zi[first:], sb[first:], zb, qc, the[1], dl[1])
+
+    return the, dl
+
+
+def _replay_points(zi, s, zs, qc, the, dl):
+    """
+    Replays the horizon update of hzns for one terminal over the points whose terrain
+    angle comes within a small margin of the running maximum, returning the horizon
+    angle, horizon distance and the index of the first point which raised it.
+
+    """
+    angle = (zi - zs) / s - qc * s
+
+    previous = numpy.maximum(numpy.maximum.accumulate(angle), the)
+    previous = numpy.concatenate(([the], previous[:-1]))
+
+    #margin in meters, far wider than the rounding in the closed form angles
+    candidates = numpy.flatnonzero((angle - previous) * s > -1e-6)
+
+    first = None
+    for index, zk, sk in zip(candidates.tolist(), zi[candidates].tolist(),
+            s[candidates].tolist()):
+        q = zk - (qc * sk + the) * sk - zs
+        if q > 0:
+            the += q / sk
+            dl = sk
+            if first is None:
+                first = index
+
+    return float(the), float(dl), first
+
+
+def hzns_batch(pfl, dist, hg, gme, intervals=None):
+    """
+    Batch form of hzns, finding the horizon parameters of many terrain profiles at once.
+
+    The profiles are the rows of a 2-D array in the layout made by stack_profiles, with the
+    number of intervals in the first column, the spacing in the second and the (padded)
+    elevations in the rest.
+
+    The running search of hzns raises the horizon angle at each point where the terrain
+    angle (z - za) / sa - qc * sa exceeds the largest angle seen so far. These points are
+    found for the whole array from a cumulative maximum, and the update of hzns is then
+    replayed over just those points, in order, so that the results are identical to the
+    loop. As in hzns, the receiver side is only searched from the first point which
+    raises the transmitter horizon.
+
+    Parameters
+    ----------
+    pfl : numpy.ndarray
+        Terrain profiles in meters, one per row.
+    dist : array_like
+        Distance of each profile in meters.
+    hg : array_like
+        Heights of transmitter and receiver off ground (meters), with shape (2, N).
+    gme : array_like
+        Effective earth curvature.
+    intervals : array_like
+        Number of intervals of each profile, in place of the first column.
+
+    Returns
+    -------
+    the : numpy.ndarray
+        Horizon take-off angles, with shape (2, N).
+    dl : numpy.ndarray
+        Horizon distances, with shape (2, N).
+
+    """
+    pfl = numpy.asarray(pfl, dtype=float)
+    n_rows = pfl.shape[0]
+    rows = numpy.arange(n_rows)
+
+    if intervals is None:
+        np = pfl[:, 0].astype(int)
+    else:
+        np = numpy.broadcast_to(numpy.asarray(intervals, dtype=int), (n_rows,))
+    xi = pfl[:, 1]
+    z = pfl[:, 2:]
+
+    dist = numpy.broadcast_to(numpy.asarray(dist, dtype=float), (n_rows,))
+    gme = numpy.broadcast_to(numpy.asarray(gme, dtype=float), (n_rows,))
+
+    za = z[:, 0] + hg[0]
+    zb = z[rows, np] + hg[1]
+    qc = 0.5 * gme
+    q = qc * dist
+
+    the = numpy.empty((2, n_rows))
+    dl = numpy.empty((2, n_rows))
+
     the[1] = (zb - za) / dist
     the[0] = the[1] - q
     the[1] = -the[1] - q
-    dl[0]  = dist
-    dl[1]  = dist
+    dl[0] = dist
+    dl[1] = dist
+
+    #interior points, at index i of the elevations
+    i = numpy.arange(1, z.shape[1] - 1)
+    if i.size == 0:
+        return the, dl
+
+    valid = i[None, :] < np[:, None]
+    zi = z[:, 1:-1]
+
+    #cumulative sums step the distances exactly as the running sums of hzns
+    step = numpy.broadcast_to(xi[:, None], zi.shape)
+    sa = numpy.cumsum(step, axis=1)
+    sb = numpy.cumsum(numpy.hstack([dist[:, None], -step]), axis=1)[:, 1:]
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        angle = (zi - za[:, None]) / sa - qc[:, None] * sa
+    angle = numpy.where(valid, angle, -numpy.inf)
+
+    the[0], dl[0], first = _replay(angle, zi, sa, za, qc, the[0], dl[0])
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        angle = (zi - zb[:, None]) / sb - qc[:, None] * sb
+    columns = numpy.arange(zi.shape[1])
+    angle = numpy.where(valid & (columns[None, :] >= first[:, None]), angle, -numpy.inf)
+
+    the[1], dl[1], first = _replay(angle, zi, sb, zb, qc, the[1], dl[1])
+
+    return the, dl
+
+
+def _replay(angle, zi, s, zs, qc, the, dl):
+    """
+    Replays the horizon update of hzns for one terminal over the points whose terrain
+    angle comes within a small margin of the running maximum, returning the horizon
+    angle, horizon distance and the column of the first point which raised it.
+
+    """
+    n_rows = angle.shape[0]
+    rows = numpy.arange(n_rows)
+
+    previous = numpy.maximum(
+        numpy.maximum.accumulate(angle, axis=1), the[:, None]
+        )
+    previous = numpy.hstack([the[:, None], previous[:, :-1]])
+
+    #margin in meters, far wider than the rounding in the closed form angles
+    with numpy.errstate(invalid='ignore'):
+        candidates = numpy.isfinite(angle) & ((angle - previous) * s > -1e-6)
+
+    count = candidates.sum(axis=1)
+    order = numpy.argsort(~candidates, axis=1, kind='stable')
+
+    first = numpy.full(n_rows, angle.shape[1], dtype=int)
 
-    if np >= 2:
-        sa = 0
-        sb = dist
-        wq = 1
+    for k in range(count.max() if n_rows else 0):
+        index = order[:, k]
+        sk = s[rows, index]
 
-        for i in range(2, np + 1):
+        q = zi[rows, index] - (qc * sk + the) * sk - zs
+        update = (k < count) & (q > 0)
 
-            sa = sa + xi
-            sb = sb - xi
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            the = numpy.where(update, the + q / sk, the)
+        dl = numpy.where(update, sk, dl)
+
+        first = numpy.where(update & (first > index), index, first)
+
+    return the, dl, first
+
+
+def hzns_ray(z, xi, hg, gme):
+    """
+    Horizon parameters for every receiver along a single ray from the transmitter, as
+    found by hzns for the profile from the transmitter to each point of the ray.
+
+    Receivers along a ray share the start of their terrain profiles, so the ray is grown
+    one point at a time by a HorizonTracker. The horizon of the transmitter is kept from
+    a running maximum, and the receiver horizon of each point is found by a binary search
+    of the upper convex hull of the terrain before it, so a ray of R points takes
+    O(R log R) time and linear memory. The results agree with hzns to rounding.
+
+    Parameters
+    ----------
+    z : array_like
+        Elevations (meters) along the ray, starting at the transmitter.
+    xi : float
+        Spacing of the elevations (meters).
+    hg : list
+        Heights of transmitter and receiver off ground (meters).
+    gme : float
+        Effective earth curvature.
+
+    Returns
+    -------
+    the : numpy.ndarray
+        Horizon take-off angles of the receiver at each point of the ray after the first,
+        with shape (2, N).
+    dl : numpy.ndarray
+        Horizon distances, with shape (2, N).
+
+    """
+    z = numpy.asarray(z, dtype=float)
+    n = z.size - 1
 
-            q = pfl[i+1] - (qc * sa + the[0]) * sa - za
+    the = numpy.empty((2, n))
+    dl = numpy.empty((2, n))
 
-            if q > 0:
-                the[0] = the[0] + q / sa
-                dl[0] = sa
+    tracker = HorizonTracker(xi, hg, gme, z[:1])
 
-                wq = 0
+    for k in range(0, n):
+        tracker.append(z[k + 1])
 
-            if wq == 0:
-                q = pfl[i + 1] - (qc * sb + the[1]) * sb - zb
-                if q > 0:
-                    the[1] = the[1] + q / sb
-                    dl[1] = sb
+        the[:, k] = tracker.the[0], tracker.the[1]
+        dl[:, k] = tracker.dl[0], tracker.dl[1]
 
     return the, dl
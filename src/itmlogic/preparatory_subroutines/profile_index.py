@@ -0,0 +1,172 @@
+import numpy as np
+
+#number of points in each block of the prefix sums
+BLOCK = 256
+
+class ProfileIndex:
+    """
+    A terrain profile with precomputed prefix sums, for repeated least squares fits on the
+    same profile (e.g. when sweeping antenna heights over one path).
+
+    The profile is laid out as for qlrpfl, with the number of intervals as the first
+    element, the spacing as the second and the elevations in the rest. ProfileIndex
+    behaves as that sequence (len, indexing and conversion with np.asarray), so it can be
+    used as prop['pfl'] or passed to hzns, dlthx and zlsq1 in place of the list. The
+    prefix sums of z and i * z let zlsq1 evaluate the fit over any window in constant
+    time, rather than summing over the window on every call.
+
+    The prefix sums are kept within blocks of BLOCK points, with i counted from the start
+    of each block, and over whole blocks. A short window far along a long profile is then
+    summed from small local sums, rather than as the difference of two large ones, which
+    would lose most of its precision to cancellation.
+
+    Parameters
+    ----------
+    pfl : list
+        Terrain profile in meters.
+
+    """
+    def __init__(self, pfl):
+        self.profile = pfl
+        self.pfl = np.asarray(pfl, dtype=float)
+
+        self.np = int(self.pfl[0])
+        self.xi = self.pfl[1]
+        self.z = self.pfl[2:]
+
+        size = len(self.z)
+        blocks = -(-size // BLOCK)
+
+        #sums within each block, up to and including each point
+        z = np.zeros(blocks * BLOCK)
+        z[:size] = self.z
+        z = z.reshape(blocks, BLOCK)
+        offset = np.arange(BLOCK)
+
+        self.local_z = np.cumsum(z, axis=1).ravel()[:size]
+        self.local_iz = np.cumsum(offset * z, axis=1).ravel()[:size]
+
+        #sums over the whole blocks before each block, with i counted from 0
+        start = np.arange(blocks) * BLOCK
+        total_z = z.sum(axis=1)
+        total_iz = (offset * z).sum(axis=1) + start * total_z
+
+        self.block_z = np.concatenate(([0], np.cumsum(total_z)))
+        self.block_iz = np.concatenate(([0], np.cumsum(total_iz)))
+
+    def __len__(self):
+        return len(self.pfl)
+
+    def __getitem__(self, key):
+        return self.profile[key]
+
+    def __iter__(self):
+        return iter(self.profile)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.pfl
+        return self.pfl.astype(dtype)
+
+    def fit(self, x1, x2, intervals=None):
+        """
+        Least squares fit to the profile between x1 and x2, as in zlsq1, using the prefix
+        sums. x1 and x2 may be arrays, to fit many windows in one call.
+
+        Parameters
+        ----------
+        x1 : array_like
+            Location 1.
+        x2 : array_like
+            Location 2.
+        intervals : array_like
+            Number of intervals of the profile each window is fitted on, where the
+            profiles are the starts of this one (e.g. to receivers along a ray). Defaults
+            to the whole profile.
+
+        Returns
+        -------
+        z0 : float or numpy.ndarray
+            Interpolated height at location 0.
+        zn : float or numpy.ndarray
+            Interpolated height at the end of the profile.
+
+        """
+        xn = self.np if intervals is None else np.asarray(intervals, dtype=int)
+        last = len(self.z) - 1
+
+        xa = np.trunc(np.maximum(np.asarray(x1) / self.xi, 0)).astype(int)
+        xb = xn - np.trunc(np.maximum(xn - np.asarray(x2) / self.xi, 0)).astype(int)
+
+        overlap = xb <= xa
+        xa = np.where(overlap, np.maximum(xa - 1, 0), xa)
+        xb = np.where(overlap, xn - np.maximum(xn - xb + 1, 0), xb)
+
+        ja = np.clip(xa, 0, last)
+        jb = np.clip(xb, 0, last)
+        n = xb - xa
+
+        #sums over the window, with i counted from its start
+        a, b = self._sums(ja, jb)
+
+        #half weights at the two ends as in zlsq1
+        a = a - 0.5 * (self.z[ja] + self.z[jb])
+        b = b - 0.5 * (jb - ja) * self.z[jb]
+        b = b - 0.5 * n * a
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = np.where(n > 0, a / n, 0)
+            b = np.where(n > 0, b * 12 / ((n * n + 2) * n), 0)
+
+        centre = xb - 0.5 * n
+
+        z0 = a - b * centre
+        zn = a + (b * (xn - centre))
+
+        if z0.ndim == 0:
+            return float(z0), float(zn)
+
+        return z0, zn
+
+    def _sums(self, ja, jb):
+        """
+        Sums of z and (i - ja) * z over the points ja to jb inclusive, from the sums within
+        the blocks at the two ends and over the whole blocks between them.
+
+        """
+        last = len(self.z) - 1
+
+        ka = ja // BLOCK
+        kb = jb // BLOCK
+
+        #from ja to the end of its block (or to jb, if in the same block)
+        end = np.where(ka == kb, jb, np.minimum((ka + 1) * BLOCK - 1, last))
+        head_z, head_iz = self._segment(ja, end)
+
+        #from the start of the block of jb to jb
+        start = kb * BLOCK
+        tail_z, tail_iz = self._segment(np.minimum(start, last), jb)
+
+        #the whole blocks between, with i counted from 0
+        inner = np.minimum(ka + 1, kb)
+        whole_z = self.block_z[kb] - self.block_z[inner]
+        whole_iz = self.block_iz[kb] - self.block_iz[inner] - ja * whole_z
+
+        apart = ka < kb
+
+        sum_z = head_z + np.where(apart, whole_z + tail_z, 0)
+        sum_iz = head_iz + np.where(apart, whole_iz + tail_iz + (start - ja) * tail_z, 0)
+
+        return sum_z, sum_iz
+
+    def _segment(self, u, v):
+        """
+        Sums of z and (i - u) * z over the points u to v inclusive, within one block.
+
+        """
+        offset = u % BLOCK
+
+        sum_z = self.local_z[v] - self.local_z[u] + self.z[u]
+        sum_iz = self.local_iz[v] - self.local_iz[u] + offset * self.z[u]
+
+        return sum_z, sum_iz - offset * sum_z
@@ -1,14 +1,55 @@
 import math
-from itmlogic.preparatory_subroutines.hzns import hzns
-from itmlogic.preparatory_subroutines.dlthx import dlthx
-from itmlogic.preparatory_subroutines.zlsq1 import zlsq1
-from itmlogic.lrprop import lrprop
+import numpy
+from itmlogic.preparatory_subroutines.hzns import hzns, hzns_batch
+from itmlogic.preparatory_subroutines.profile_index import ProfileIndex
+from itmlogic.preparatory_subroutines.dlthx import dlthx, dlthx_batch
+from itmlogic.preparatory_subroutines.zlsq1 import zlsq1, zlsq1_batch
+from itmlogic.lrprop import lrprop, lrprop_batch
 
 def qlrpfl(prop):
     """
     Preparatory subroutine for point-to-point mode, as in Section 43 by Hufford
     (see references/itm.pdf).
 
+    prop['pfl'] may be a ProfileIndex built once for the profile, so that repeated calls
+    on the same path (e.g. over a range of antenna heights) fit the terrain from its
+    prefix sums.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains all input propagation parameters.
+
+    Returns
+    -------
+    prop : dict
+        Contains all input and output propagation parameters.
+
+    """
+    prop = qlrpfl_geometry(prop)
+
+    prop['mdp'] = -1
+    prop['lvar'] = max(prop['lvar'], 3)
+
+    if prop['mdvarx'] >= 0:
+        prop['mdvar'] = prop['mdvarx']
+        prop['lvar'] = max(prop['lvar'], 4)
+
+    if prop['klimx'] > 0:
+        prop['klim'] = prop['klimx']
+        prop['lvar'] = 5
+
+    prop = lrprop(0, prop)
+
+    return prop
+
+
+def qlrpfl_geometry(prop):
+    """
+    The terrain analysis of qlrpfl, finding the path distance (dist), horizon angles (the),
+    horizon distances (dl), terrain irregularity (dh) and effective heights (he) from the
+    profile and antenna heights. None of these depend on frequency.
+
     Parameters
     ----------
     prop : dict
@@ -74,6 +115,118 @@ def qlrpfl(prop):
         prop['he'].append(prop['hg'][0] + max(prop['pfl'][2] - za, 0))
         prop['he'].append(prop['hg'][1] + max(prop['pfl'][np+2] - zb, 0))
 
+    return prop
+
+
+def qlrpfl_batch(prop, horizons=None, intervals=None):
+    """
+    Batch form of qlrpfl, preparing many point-to-point links at once.
+
+    prop['pfl'] holds one terrain profile per row, in the layout made by stack_profiles,
+    or a single profile (a list or ProfileIndex) shared by every link, as when sweeping
+    antenna heights over one path. The other parameters are either shared by every link
+    or given as an array with an element per link. Terminal heights (hg) may be given
+    with shape (2, N). The horizon angles (the), horizon distances (dl), terrain
+    irregularity (dh), effective heights (he) and reference attenuation (aref) of every
+    link are returned as arrays, with the per-terminal values having shape (2, N).
+
+    Links sharing a single profile may end at different points along it, given by
+    intervals, as for receivers along a ray, so that the profile is not copied per link.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains all input propagation parameters.
+    horizons : tuple
+        Horizon angles and distances of every link, with shape (2, N), if already known
+        (e.g. from hzns_ray). Found with hzns_batch by default.
+    intervals : array_like
+        Number of intervals from the start of a single shared profile to each link's
+        receiver. Defaults to the number of intervals of each profile.
+
+    Returns
+    -------
+    prop : dict
+        Contains all input and output propagation parameters.
+
+    """
+    hg = numpy.asarray(prop['hg'], dtype=float).reshape(2, -1)
+
+    pfl = numpy.asarray(prop['pfl'], dtype=float)
+    fits = pfl
+
+    if pfl.ndim == 1:
+        #a single profile, shared by every link without copying
+        links = numpy.broadcast(hg[0], numpy.asarray(intervals)).size
+        pfl = numpy.broadcast_to(pfl, (links, pfl.size))
+        if isinstance(prop['pfl'], ProfileIndex):
+            fits = prop['pfl']
+
+    n_rows = pfl.shape[0]
+    rows = numpy.arange(n_rows)
+
+    if intervals is None:
+        np = pfl[:, 0].astype(int)
+    else:
+        np = numpy.broadcast_to(numpy.asarray(intervals, dtype=int), (n_rows,))
+    z = pfl[:, 2:]
+
+    hg = numpy.broadcast_to(hg, (2, n_rows))
+    prop['hg'] = hg
+
+    gme = prop['gme']
+
+    prop['dist'] = np * pfl[:, 1]
+
+    if horizons is None:
+        the, dl = hzns_batch(pfl, prop['dist'], hg, gme, intervals)
+    else:
+        the, dl = horizons
+
+    xl0 = numpy.minimum(15 * hg[0], 0.1 * dl[0])
+    xl1 = prop['dist'] - numpy.minimum(15 * hg[1], 0.1 * dl[1])
+
+    prop['dh'] = dlthx_batch(pfl, xl0, xl1, intervals)
+
+    smooth = dl[0] + dl[1] >= 1.5 * prop['dist']
+
+    #effective heights and horizons from the fit over the whole profile
+    za, zb = zlsq1_batch(fits, xl0, xl1, intervals)
+    he_fit = numpy.array([
+        hg[0] + numpy.maximum(z[:, 0] - za, 0),
+        hg[1] + numpy.maximum(z[rows, np - 1] - zb, 0),
+    ])
+
+    dl_fit = (
+        numpy.sqrt(2 * he_fit / gme) *
+        numpy.exp(-0.07 * numpy.sqrt(prop['dh'] / numpy.maximum(he_fit, 5)))
+        )
+
+    q = dl_fit[0] + dl_fit[1]
+
+    he_fit = numpy.where(q <= prop['dist'], he_fit * (prop['dist'] / q)**2, he_fit)
+
+    dl_fit = (
+        numpy.sqrt(2 * he_fit / gme) *
+        numpy.exp(-0.07 * numpy.sqrt(prop['dh'] / numpy.maximum(he_fit, 5)))
+        )
+
+    q = numpy.sqrt(2 * he_fit / gme)
+    the_fit = (0.65 * prop['dh'] * (q / dl_fit - 1) - 2 * he_fit) / q
+
+    #effective heights from the fits between each terminal and its horizon
+    za, q = zlsq1_batch(fits, xl0, 0.9 * dl[0], intervals)
+    q, zb = zlsq1_batch(fits, prop['dist'] - 0.9 * dl[1], xl1, intervals)
+
+    he = numpy.array([
+        hg[0] + numpy.maximum(z[:, 0] - za, 0),
+        hg[1] + numpy.maximum(z[rows, np] - zb, 0),
+    ])
+
+    prop['he'] = numpy.where(smooth, he_fit, he)
+    prop['dl'] = numpy.where(smooth, dl_fit, dl)
+    prop['the'] = numpy.where(smooth, the_fit, the)
+
     prop['mdp'] = -1
     prop['lvar'] = max(prop['lvar'], 3)
 
@@ -85,6 +238,37 @@ def qlrpfl(prop):
         prop['klim'] = prop['klimx']
         prop['lvar'] = 5
 
-    prop = lrprop(0, prop)
+    prop = lrprop_batch(0, prop)
 
     return prop
+
+
+def stack_profiles(pfls):
+    """
+    Stacks terrain profiles of different lengths into the 2-D array used by qlrpfl_batch.
+
+    Each row keeps the layout of a single profile, with the number of intervals in the
+    first column, the spacing in the second and the elevations in the rest. Shorter
+    profiles are padded by repeating their last elevation, so the number of intervals acts
+    as the length of each row.
+
+    Parameters
+    ----------
+    pfls : list
+        Terrain profiles, each laid out as for qlrpfl.
+
+    Returns
+    -------
+    pfl : numpy.ndarray
+        Terrain profiles in meters, one per row.
+
+    """
+    width = max(len(pfl) for pfl in pfls)
+
+    stacked = numpy.empty((len(pfls), width))
+
+    for row, pfl in enumerate(pfls):
+        stacked[row, :len(pfl)] = pfl
+        stacked[row, len(pfl):] = pfl[-1]
+
+    return stacked
@@ -1,3 +1,6 @@
+import numpy as np
+
+from itmlogic.preparatory_subroutines.profile_index import ProfileIndex
 
 
 def zlsq1(z, x1, x2):
@@ -11,9 +14,14 @@ def zlsq1(z, x1, x2):
     x1 and x2.  Returns the interpolated heights at location 0 and the end of the
     profile.
 
+    The sums over the window are taken with NumPy, in the same order as the original
+    loop, so that the fit is unchanged to the last digit.
+
+    If z is a ProfileIndex, the fit is taken from its prefix sums in constant time.
+
     Parameters
     ----------
-    z : list
+    z : list or ProfileIndex
         Terrain profile in meters.
     x1 : float
         Location 1.
@@ -28,7 +36,10 @@ def zlsq1(z, x1, x2):
         Interpolated height.
 
     """
-    xn  = z[0]
+    if isinstance(z, ProfileIndex):
+        return z.fit(x1, x2)
+
+    xn  = int(z[0])
 
     xa  = int(max(x1 / z[1], 0))
     xb  = xn - int(max(xn - x2 / z[1], 0))
@@ -44,17 +55,17 @@ def zlsq1(z, x1, x2):
     x  = -0.5 * xa
     xb = xb + x
 
-    a  = 0.5 * (z[(ja + 2)] + z[jb + 2])
-    b  = 0.5 * (z[ja + 2] - z[jb + 2]) * x
+    #the running sums over the window, added in order from the two end points
+    inside = np.asarray(z[ja + 3:jb + 2] if n > 1 else [], dtype=float)
 
-    for i in range(2, n+1):
-        ja = ja + 1
-        x  = x + 1
-        a  = a + z[ja + 2]
-        b  = b + z[ja + 2] * x
+    a = np.cumsum(np.concatenate(([0.5 * (z[(ja + 2)] + z[jb + 2])], inside)))[-1]
+    b = np.cumsum(np.concatenate((
+        [0.5 * (z[ja + 2] - z[jb + 2]) * x],
+        inside * (x + np.arange(1, max(n, 1)))
+        )))[-1]
 
-    a = avoid_zero_division(a, xa)
-    b = b * 12 / ((xa * xa + 2) * xa)
+    a = avoid_zero_division(float(a), xa)
+    b = float(b) * 12 / ((xa * xa + 2) * xa)
 
     z0 = a - b * xb
     zn = a + (b * (xn - xb))
@@ -63,3 +74,91 @@ def zlsq1(z, x1, x2):
 
 def avoid_zero_division(n, d):
     return n / d if d else 0
+
+
+def zlsq1_batch(z, x1, x2, intervals=None):
+    """
+    Batch form of zlsq1, evaluating the linear least squares fit for many windows in one
+    call, either for many (x1, x2) windows on a single profile or for each row of a 2-D
+    array of profiles.
+
+    Each profile is laid out as for zlsq1, with the number of samples in the first column,
+    the spacing in the second and the (padded) profile data in the rest. The running sums
+    of zlsq1 are formed with cumulative sums over each window, which add the terms in the
+    same order as the loop, so the results are identical to zlsq1.
+
+    Parameters
+    ----------
+    z : array_like or ProfileIndex
+        A terrain profile in meters, or terrain profiles one per row. A ProfileIndex is
+        fitted from its prefix sums.
+    x1 : array_like
+        Location 1 of each window.
+    x2 : array_like
+        Location 2 of each window.
+    intervals : array_like
+        Number of intervals of the profile to fit each window on, in place of the first
+        column (e.g. for the starts of a single profile shared by many links).
+
+    Returns
+    -------
+    z0 : numpy.ndarray
+        Interpolated heights at location 0.
+    zn : numpy.ndarray
+        Interpolated heights at the end of each profile.
+
+    """
+    if isinstance(z, ProfileIndex):
+        return z.fit(x1, x2, intervals)
+
+    z = np.asarray(z, dtype=float)
+
+    if z.ndim == 1:
+        windows = np.broadcast(np.asarray(x1), np.asarray(x2), np.asarray(intervals)).size
+        z = np.broadcast_to(z, (windows, z.size))
+
+    if intervals is None:
+        xn = z[:, 0].astype(int)
+    else:
+        xn = np.broadcast_to(np.asarray(intervals, dtype=int), (z.shape[0],))
+    values = z[:, 2:]
+
+    xa = np.trunc(np.maximum(x1 / z[:, 1], 0)).astype(int)
+    xb = xn - np.trunc(np.maximum(xn - x2 / z[:, 1], 0)).astype(int)
+
+    overlap = xb <= xa
+    xa = np.where(overlap, np.maximum(xa - 1, 0), xa)
+    xb = np.where(overlap, xn - np.maximum(xn - xb + 1, 0), xb)
+
+    rows = np.arange(values.shape[0])[:, None]
+    ja = xa[:, None]
+    n = xb - xa
+    x = -0.5 * n
+
+    #terms of the running sums, starting from the two ends of the window
+    j = np.arange(max(n.max(initial=0), 0) + 1)[None, :]
+    inside = (j >= 1) & (j < n[:, None])
+    window = values[rows, np.clip(ja + j, 0, values.shape[1] - 1)]
+
+    za = values[rows[:, 0], np.clip(xa, 0, values.shape[1] - 1)]
+    zb = values[rows[:, 0], np.clip(xb, 0, values.shape[1] - 1)]
+
+    a = np.where(inside, window, 0)
+    a[:, 0] = 0.5 * (za + zb)
+    a = np.cumsum(a, axis=1)[:, -1]
+
+    ends = 0.5 * (za - zb) * x
+    b = np.where(inside, window * (x[:, None] + j), 0)
+    b[:, 0] = ends
+    b = np.cumsum(b, axis=1)[:, -1]
+
+    centre = xb + x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.where(n != 0, a / n, 0)
+        b = np.where(n != 0, b * 12 / ((n * n + 2) * n), 0)
+
+    z0 = a - b * centre
+    zn = a + (b * (xn - centre))
+
+    return z0, zn
@@ -0,0 +1,136 @@
+from collections.abc import MutableMapping
+
+FIELDS = (
+    #User defined inputs
+    'd', 'dh', 'dist', 'ens', 'ens0', 'eps', 'fmhz', 'gma', 'gme', 'hg', 'ipol', 'kwx',
+    'klim', 'klimx', 'lvar', 'mdp', 'mdvar', 'mdvarx', 'pfl', 'sgm', 'wn', 'zgnd',
+    #Horizon and effective height geometry
+    'dl', 'he', 'the',
+    #lrprop setup and coefficients
+    'ad', 'aed', 'ael', 'aes', 'afo', 'aht', 'ak1', 'ak2', 'aref', 'ascat1', 'dla',
+    'dls', 'dlsa', 'dmin', 'dx', 'emd', 'ems', 'etq', 'h0s', 'qk', 'rr', 'tha', 'wd1',
+    'wis', 'wlos', 'wscat', 'xae', 'xd1', 'xht',
+    #avar coefficients
+    'cfm1', 'cfm2', 'cfm3', 'cfp1', 'cfp2', 'cfp3', 'csd1', 'csm1', 'csm2', 'csp1',
+    'csp2', 'cv1', 'cv2', 'dexa', 'gm', 'gp', 'kdv', 'sgl', 'sgtd', 'sgtm', 'sgtp',
+    'tgtd', 'vmd', 'vs0', 'wl', 'ws', 'ysm1', 'ysm2', 'ysm3', 'ysp1', 'ysp2', 'ysp3',
+    'yv1', 'yv2', 'yv3', 'zd',
+)
+
+_FIELD_SET = frozenset(FIELDS)
+
+_UNSET = object()
+
+
+class PropState(MutableMapping):
+    """
+    Typed propagation state, holding the parameters shared by all routines in fixed
+    slots rather than a dict.
+
+    Each model parameter listed in FIELDS is an attribute (e.g. state.he). PropState is
+    also a mutable mapping (e.g. state['he']), so it can be passed as prop to any routine
+    which takes the prop dict, and converted to and from a plain dict with to_dict and
+    from_dict. Keys which are not model parameters are kept in a separate dict. Only the
+    parameters which have been set are pickled, by their position in FIELDS, so the
+    state sent to worker processes is smaller than the dict.
+
+    The routines of the model keep their dict subscripts, which PropState serves through
+    the mapping, so reading through the mapping costs more than through a dict. Attribute
+    access is the fast path, for code which holds a PropState.
+
+    Parameters
+    ----------
+    *args, **kwargs
+        Initial parameters, in any form accepted by dict.
+
+    """
+    __slots__ = FIELDS + ('_extra',)
+
+    def __init__(self, *args, **kwargs):
+        self._extra = {}
+
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, prop):
+        """
+        Create a PropState from a prop dict.
+
+        """
+        return cls(prop)
+
+    def to_dict(self):
+        """
+        Return the state as a plain prop dict.
+
+        """
+        prop = {}
+
+        for name in FIELDS:
+            value = getattr(self, name, _UNSET)
+            if value is not _UNSET:
+                prop[name] = value
+
+        prop.update(self._extra)
+
+        return prop
+
+    def copy(self):
+        return type(self)(self.to_dict())
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in _FIELD_SET:
+            setattr(self, key, value)
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        for name in FIELDS:
+            if getattr(self, name, _UNSET) is not _UNSET:
+                yield name
+
+        yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return 'PropState({})'.format(self.to_dict())
+
+    def __getstate__(self):
+        #positions of the parameters which are set, rather than their names
+        fields = []
+        values = []
+
+        for i, name in enumerate(FIELDS):
+            value = getattr(self, name, _UNSET)
+            if value is not _UNSET:
+                fields.append(i)
+                values.append(value)
+
+        return bytes(fields), tuple(values), self._extra
+
+    def __setstate__(self, state):
+        fields, values, self._extra = state
+
+        for i, value in zip(fields, values):
+            setattr(self, FIELDS[i], value)
@@ -34,3 +34,32 @@ def ahd(td):
     ahd1 = a[i] + b[i] * td + c[i] * np.log(td)
 
     return ahd1
+
+
+def ahd_vec(td):
+    """
+    Vectorized form of ahd, returning the function F0(D) for an array of distances.
+
+    Parameters
+    ----------
+    td : array_like
+        Distance in meters.
+
+    Returns
+    -------
+    ahd1 : numpy.ndarray
+        The returned value for function F0(D).
+
+    """
+    a = np.array([133.4, 104.6, 71.8])
+    b = np.array([0.332e-3, 0.212e-3, 0.157e-3])
+    c = np.array([-4.343, -1.086, 2.171])
+
+    td = np.asarray(td, dtype=float)
+
+    i = np.where(td <= 10e3, 0, np.where(td <= 70e3, 1, 2))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ahd1 = a[i] + b[i] * td + c[i] * np.log(td)
+
+    return ahd1
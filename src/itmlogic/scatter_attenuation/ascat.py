@@ -1,7 +1,7 @@
 import math
 import numpy as np
-from itmlogic.scatter_attenuation.h0f import h0f
-from itmlogic.scatter_attenuation.ahd import ahd
+from itmlogic.scatter_attenuation.h0f import h0f, h0f_vec
+from itmlogic.scatter_attenuation.ahd import ahd, ahd_vec
 
 def ascat(d, prop):
     """
@@ -73,3 +73,78 @@ def ascat(d, prop):
         )
 
     return prop
+
+
+def ascat_vec(d, prop):
+    """
+    Vectorized form of ascat, in which d and the propagation parameters may be arrays, such
+    as when prop holds the parameters of many links (see lrprop_batch). The stored h0s and
+    ascat1 values are updated element by element, as ascat does for a single link.
+
+    Parameters
+    ----------
+    d : array_like
+        Distance in meters.
+    prop : dict
+        Contains all input propagation parameters
+
+    Returns
+    -------
+    prop : dict
+        Contains all input and output propagation parameters.
+
+    """
+    d = np.asarray(d, dtype=float)
+    h0s = prop['h0s']
+
+    th = prop['the'][0] + prop['the'][1] + d * prop['gme']
+    r2 = 2 * prop['wn'] * th
+
+    r1 = r2 * prop['he'][0]
+    r2 = r2 * prop['he'][1]
+
+    #a stored value of 1001 blocks the update of h0s, as in ascat
+    blocked = ((r1 < 0.2) & (r2 < 0.2)) | (prop['ascat1'] == 1001)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ss = (d - prop['ad']) / (d + prop['ad'])
+
+        q = prop['rr'] / ss
+        ss = np.maximum(0.1, ss)
+        q = np.minimum(np.maximum(0.1, q), 10)
+        z0 = (d - prop['ad']) * (d + prop['ad']) * th * 0.25 / d
+
+        et = (prop['etq'] * np.exp(-np.minimum(1.7, z0 / 8.0e3)**6) + 1) * z0 / 1.7556e3
+
+        ett = np.maximum(et, 1)
+
+        h0 = (h0f_vec(r1, ett) + h0f_vec(r2, ett)) * 0.5
+
+        h0 = h0 + np.minimum(h0, (1.38 - np.log(ett)) * np.log(ss) * np.log(q) * 0.49)
+
+        h0 = np.maximum(h0, 0)
+
+        h0 = np.where(
+            et < 1,
+            et * h0 + (1 - et) * 4.343 * np.log(((1 + 1.4142 / r1) *
+            (1 + 1.4142 / r2))**2 * (r1 + r2) / (r1 + r2 + 2.8284)),
+            h0
+            )
+
+    h0 = np.where((h0 > 15) & (h0s >= 0), h0s, h0)
+
+    previous = h0s > 15
+
+    prop['h0s'] = np.where(previous | blocked, h0s, h0)
+
+    h0 = np.where(previous, h0s, h0)
+
+    th = prop['tha'] + d * prop['gme']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prop['ascat1'] = (
+            ahd_vec(th*d) + 4.343 * np.log(47.7 * prop['wn'] * th**4) -
+            0.1 * (prop['ens'] - 301) * np.exp(-th * d / 40e3) + h0
+            )
+
+    return prop
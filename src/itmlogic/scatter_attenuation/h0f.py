@@ -46,3 +46,45 @@ def h0f(r, et):
         )
 
     return h0f1
+
+
+def h0f_vec(r, et):
+    """
+    Vectorized form of h0f, returning the H01 "frequency gain" function for arrays of r
+    and scattering efficiency coefficients.
+
+    Parameters
+    ----------
+    r : array_like
+        Input r parameter for Eqn (6.13) of "The ITS Irregular Terrain Model, version 1.2.2:
+        The Algorithm".
+    et : array_like
+        Scattering efficiency coefficient.
+
+    Returns
+    -------
+    h0f1 : numpy.ndarray
+        Frequency gain value used for computing path loss.
+
+    """
+    a = np.array([25, 80, 177, 395, 705])
+    b = np.array([24, 45, 68, 80, 105])
+
+    et = np.asarray(et, dtype=float)
+
+    it = np.floor(np.nan_to_num(et))
+
+    q = np.where((it <= 0) | (it >= 5), 0, et - it)
+
+    it = np.clip(it, 1, 5).astype(int)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (1 / np.asarray(r, dtype=float))**2
+        h0f1 = 4.343 * np.log((a[it - 1] * x + b[it - 1]) * x + 1)
+
+        upper = np.minimum(it, 4)
+        h0f2 = 4.343 * np.log((a[upper] * x + b[upper]) * x + 1)
+
+    h0f1 = np.where(q != 0, (1 - q) * h0f1 + q * h0f2, h0f1)
+
+    return h0f1
@@ -33,103 +33,11 @@ def avar(zzt, zzl, zzc, prop):
         Contains all input and output propagation parameters.
 
     """
-    third = 1 / 3
-
-    bv1 = [   -9.67,   -0.62,    1.26,   -9.21,   -0.62,   -0.39,    3.15]
-    bv2 = [    12.7,    9.19,    15.5,    9.05,    9.19,    2.86,   857.9]
-    xv1 = [ 144.9e3, 228.9e3, 262.6e3,  84.1e3, 228.9e3, 141.7e3, 2222.e3]
-    xv2 = [ 190.3e3, 205.2e3, 185.2e3, 101.1e3, 205.2e3, 315.9e3, 164.8e3]
-    xv3 = [ 133.8e3, 143.6e3,  99.8e3,  98.6e3, 143.6e3, 167.4e3, 116.3e3]
-    bsm1 = [    2.13,    2.66,    6.11,    1.98,    2.68,    6.86,    8.51]
-    bsm2 = [   159.5,    7.67,    6.65,   13.11,    7.16,   10.38,   169.8]
-    xsm1 = [ 762.2e3, 100.4e3, 138.2e3, 139.1e3,  93.7e3, 187.8e3, 609.8e3]
-    xsm2 = [ 123.6e3, 172.5e3, 242.2e3, 132.7e3, 186.8e3, 169.6e3, 119.9e3]
-    xsm3 = [  94.5e3, 136.4e3, 178.6e3, 193.5e3, 133.5e3, 108.9e3, 106.6e3]
-    bsp1 = [    2.11,    6.87,   10.08,    3.68,    4.75,    8.58,    8.43]
-    bsp2 = [   102.3,   15.53,    9.60,   159.3,    8.12,   13.97,    8.19]
-    xsp1 = [ 636.9e3, 138.7e3, 165.3e3, 464.4e3,  93.2e3, 216.0e3, 136.2e3]
-    xsp2 = [ 134.8e3, 143.7e3, 225.7e3,  93.1e3, 135.9e3, 152.0e3, 188.5e3]
-    xsp3 = [  95.6e3,  98.6e3, 129.7e3,  94.2e3, 113.4e3, 122.7e3, 122.9e3]
-    bsd1 = [   1.224,   0.801,   1.380,   1.000,   1.224,   1.518,   1.518]
-    bzd1 = [   1.282,   2.161,   1.282,     20.,   1.282,   1.282,   1.282]
-    bfm1 = [      1.,      1.,      1.,      1.,    0.92,      1.,      1.]
-    bfm2 = [      0.,      0.,      0.,      0.,    0.25,      0.,      0.]
-    bfm3 = [      0.,      0.,      0.,      0.,    1.77,      0.,      0.]
-    bfp1 = [      1.,    0.93,      1.,    0.93,    0.93,      1.,      1.]
-    bfp2 = [      0.,    0.31,      0.,    0.19,    0.31,      0.,      0.]
-    bfp3 = [      0.,    2.00,      0.,    1.79,    2.00,      0.,      0.]
-
     rt = 7.8
     rl = 24
 
     if prop['lvar'] > 0:
-        if prop['lvar'] > 4:
-            if prop['klim'] <= 0 or prop['klim'] > 7:
-                prop['klim'] = 5
-                prop['kwx'] = max(prop['kwx'], 2)
-
-            prop['cv1'] = bv1[prop['klim'] - 1]
-            prop['cv2'] = bv2[prop['klim'] - 1]
-            prop['yv1'] = xv1[prop['klim'] - 1]
-            prop['yv2'] = xv2[prop['klim'] - 1]
-            prop['yv3'] = xv3[prop['klim'] - 1]
-            prop['csm1'] = bsm1[prop['klim']- 1]
-            prop['csm2'] = bsm2[prop['klim']- 1]
-            prop['ysm1'] = xsm1[prop['klim']- 1]
-            prop['ysm2'] = xsm2[prop['klim']- 1]
-            prop['ysm3'] = xsm3[prop['klim']- 1]
-            prop['csp1'] = bsp1[prop['klim']- 1]
-            prop['csp2'] = bsp2[prop['klim']- 1]
-            prop['ysp1'] = xsp1[prop['klim']- 1]
-            prop['ysp2'] = xsp2[prop['klim']- 1]
-            prop['ysp3'] = xsp3[prop['klim']- 1]
-            prop['csd1'] = bsd1[prop['klim']- 1]
-            prop['zd'] = bzd1[prop['klim'] - 1]
-            prop['cfm1'] = bfm1[prop['klim'] - 1]
-            prop['cfm2'] = bfm2[prop['klim'] - 1]
-            prop['cfm3'] = bfm3[prop['klim'] - 1]
-            prop['cfp1'] = bfp1[prop['klim'] - 1]
-            prop['cfp2'] = bfp2[prop['klim'] - 1]
-            prop['cfp3'] = bfp3[prop['klim'] - 1]
-
-        if prop['lvar'] > 3:
-
-            prop['kdv'] = prop['mdvar']
-            prop['ws'] = (prop['kdv'] >= 20)
-
-            if prop['ws']:
-                prop['kdv'] = prop['kdv'] - 20
-
-            prop['wl'] = prop['kdv'] >= 10
-
-            if prop['wl']:
-                prop['kdv'] = prop['kdv'] - 10
-
-            if prop['kdv'] < 0 or prop['kdv'] > 3:
-                prop['kdv'] = 0
-                prop['kwx'] = max(prop['kwx'], 2)
-
-        if prop['lvar'] > 2:
-
-            q = np.log(0.133 * prop['wn'])
-
-            prop['gm'] = (
-                prop['cfm1'] + prop['cfm2'] /
-                ((prop['cfm3'] * q)**2 + 1)
-                )
-
-            prop['gp'] = (
-                prop['cfp1'] + prop['cfp2'] /
-                ((prop['cfp3'] * q)**2 + 1)
-                )
-
-        if prop['lvar'] > 1:
-
-            prop['dexa'] = (
-                math.sqrt(18e6 * prop['he'][0]) +
-                math.sqrt(18e6 * prop['he'][1]) +
-                (575.7e12 / prop['wn']) ** third
-                )
+        prop = _avar_setup(prop)
 
         if prop['dist'] < prop['dexa']:
             de = 130e3 * prop['dist'] / prop['dexa']
@@ -216,3 +124,286 @@ def avar(zzt, zzl, zzc, prop):
         avar1 = avar1 * (29 - avar1) / (29 - 10 * avar1)
 
     return avar1, prop
+
+
+def avar_vec(zzt, zzl, zzc, prop, dist=None, aref=None):
+    """
+    Vectorized form of avar which returns the quantiles of attenuation for broadcastable
+    arrays of standard normal deviates and distances in a single call.
+
+    The per-distance terms of Section V (vmd, sgtm, sgtp, sgl and vs0) are computed once
+    for each distance by avar_terms, and are then combined with every requested quantile.
+    For example, passing zzt with shape (nt, 1, 1), zzc with shape (1, nc, 1) and dist
+    with shape (nd,) returns an array of shape (nt, nc, nd).
+
+    The per-distance terms are returned for each distance rather than kept in prop, so
+    where avar resets prop['lvar'] to 0, avar_vec leaves it at 1 after any setup. A
+    following avar call then computes the terms again for prop['dist'], rather than
+    using stale ones.
+
+    Parameters
+    ----------
+    zzt : array_like
+        Standard normal deviates corresponding to user defined time quantiles.
+    zzl : array_like
+        Standard normal deviates corresponding to user defined location quantiles.
+    zzc : array_like
+        Standard normal deviates corresponding to user defined confidence quantiles.
+    prop : dict
+        Contains all input propagation parameters.
+    dist : array_like, optional
+        Distances in meters. Defaults to prop['dist'].
+    aref : array_like, optional
+        Reference attenuation at each distance, broadcastable against dist. Defaults to
+        prop['aref'].
+
+    Returns
+    -------
+    avar1 : numpy.ndarray
+        Additional attenuation from the median corresponding to the user defined quantiles
+        in time, location, and situation.
+    prop : dict
+        Contains all input and output propagation parameters.
+
+    """
+    if dist is None:
+        dist = prop['dist']
+
+    if aref is None:
+        aref = prop['aref']
+
+    if prop['lvar'] > 0:
+        prop = _avar_setup(prop)
+        prop['lvar'] = 1
+
+    terms = avar_terms(dist, prop)
+
+    avar1, prop = _avar_quantiles(zzt, zzl, zzc, np.asarray(aref), terms, prop)
+
+    return avar1, prop
+
+
+def avar_terms(dist, prop):
+    """
+    Computes the distance dependent terms of avar (vmd, sgtm, sgtp, sgtd, tgtd, sgl and
+    vs0) for an array of distances, using the climate and variability coefficients already
+    set up in prop.
+
+    Parameters
+    ----------
+    dist : array_like
+        Distances in meters.
+    prop : dict
+        Contains all input propagation parameters.
+
+    Returns
+    -------
+    terms : dict
+        Contains an array of each distance dependent term.
+
+    """
+    dist = np.asarray(dist, dtype=float)
+
+    de = np.where(
+        dist < prop['dexa'],
+        130e3 * dist / prop['dexa'],
+        130e3 + dist - prop['dexa']
+        )
+
+    terms = {}
+
+    terms['vmd'] = curv(
+        prop['cv1'], prop['cv2'], prop['yv1'],
+        prop['yv2'], prop['yv3'], de
+        )
+
+    terms['sgtm'] = curv(
+        prop['csm1'], prop['csm2'], prop['ysm1'],
+        prop['ysm2'], prop['ysm3'], de) * prop['gm']
+
+    terms['sgtp'] = curv(
+        prop['csp1'], prop['csp2'], prop['ysp1'],
+        prop['ysp2'], prop['ysp3'], de) * prop['gp']
+
+    terms['sgtd'] = terms['sgtp'] * prop['csd1']
+
+    terms['tgtd'] = (terms['sgtp'] - terms['sgtd']) * prop['zd']
+
+    if prop['wl']:
+        terms['sgl'] = np.zeros(dist.shape)
+    else:
+        q = (1 - 0.8 * np.exp(-dist / 50e3)) * prop['dh'] * prop['wn']
+        terms['sgl'] = 10 * q / (q + 13)
+
+    if prop['ws']:
+        terms['vs0'] = np.zeros(dist.shape)
+    else:
+        terms['vs0'] = (5 + 3 * np.exp(-de / 100e3))**2
+
+    return terms
+
+
+def _avar_quantiles(zzt, zzl, zzc, aref, terms, prop):
+    """
+    Combines the distance dependent terms of avar with arrays of standard normal deviates.
+
+    """
+    rt = 7.8
+    rl = 24
+
+    zt, zl, zc = np.broadcast_arrays(
+        np.asarray(zzt, dtype=float),
+        np.asarray(zzl, dtype=float),
+        np.asarray(zzc, dtype=float)
+        )
+
+    if prop['kdv'] == 0:
+        zt = zc
+        zl = zc
+    elif prop['kdv'] == 1:
+        zl = zc
+    elif prop['kdv'] == 2:
+        zl = zt
+
+    if (np.abs(zt) > 3.10).any() or (np.abs(zl) > 3.10).any() or (np.abs(zc) > 3.10).any():
+        prop['kwx'] = max(prop['kwx'], 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sgt = np.where(
+            zt < 0,
+            terms['sgtm'],
+            np.where(
+                zt <= prop['zd'],
+                terms['sgtp'],
+                terms['sgtd'] + terms['tgtd'] / zt
+                )
+            )
+
+    sgl = terms['sgl']
+
+    vs = (
+        terms['vs0'] + (sgt * zt)**2 / (rt + zc**2) +
+        (sgl * zl)**2 / (rl + zc**2)
+        )
+
+    if prop['kdv'] == 0:
+        yr = 0
+        sgc = np.sqrt(sgt**2 + sgl**2 + vs)
+    elif prop['kdv'] == 1:
+        yr = sgt * zt
+        sgc = np.sqrt(sgl**2 + vs)
+    elif prop['kdv'] == 2:
+        yr = np.sqrt(sgt**2 + sgl**2) * zt
+        sgc = np.sqrt(vs)
+    else:
+        yr = sgt * zt + sgl * zl
+        sgc = np.sqrt(vs)
+
+    avar1 = aref - terms['vmd'] - yr - sgc * zc
+
+    avar1 = np.where(avar1 < 0, avar1 * (29 - avar1) / (29 - 10 * avar1), avar1)
+
+    return avar1, prop
+
+
+def _avar_setup(prop):
+    """
+    Sets up the climate, variability mode and frequency dependent coefficients of avar,
+    according to the level of change signalled by lvar.
+
+    """
+    third = 1 / 3
+
+    bv1 = [   -9.67,   -0.62,    1.26,   -9.21,   -0.62,   -0.39,    3.15]
+    bv2 = [    12.7,    9.19,    15.5,    9.05,    9.19,    2.86,   857.9]
+    xv1 = [ 144.9e3, 228.9e3, 262.6e3,  84.1e3, 228.9e3, 141.7e3, 2222.e3]
+    xv2 = [ 190.3e3, 205.2e3, 185.2e3, 101.1e3, 205.2e3, 315.9e3, 164.8e3]
+    xv3 = [ 133.8e3, 143.6e3,  99.8e3,  98.6e3, 143.6e3, 167.4e3, 116.3e3]
+    bsm1 = [    2.13,    2.66,    6.11,    1.98,    2.68,    6.86,    8.51]
+    bsm2 = [   159.5,    7.67,    6.65,   13.11,    7.16,   10.38,   169.8]
+    xsm1 = [ 762.2e3, 100.4e3, 138.2e3, 139.1e3,  93.7e3, 187.8e3, 609.8e3]
+    xsm2 = [ 123.6e3, 172.5e3, 242.2e3, 132.7e3, 186.8e3, 169.6e3, 119.9e3]
+    xsm3 = [  94.5e3, 136.4e3, 178.6e3, 193.5e3, 133.5e3, 108.9e3, 106.6e3]
+    bsp1 = [    2.11,    6.87,   10.08,    3.68,    4.75,    8.58,    8.43]
+    bsp2 = [   102.3,   15.53,    9.60,   159.3,    8.12,   13.97,    8.19]
+    xsp1 = [ 636.9e3, 138.7e3, 165.3e3, 464.4e3,  93.2e3, 216.0e3, 136.2e3]
+    xsp2 = [ 134.8e3, 143.7e3, 225.7e3,  93.1e3, 135.9e3, 152.0e3, 188.5e3]
+    xsp3 = [  95.6e3,  98.6e3, 129.7e3,  94.2e3, 113.4e3, 122.7e3, 122.9e3]
+    bsd1 = [   1.224,   0.801,   1.380,   1.000,   1.224,   1.518,   1.518]
+    bzd1 = [   1.282,   2.161,   1.282,     20.,   1.282,   1.282,   1.282]
+    bfm1 = [      1.,      1.,      1.,      1.,    0.92,      1.,      1.]
+    bfm2 = [      0.,      0.,      0.,      0.,    0.25,      0.,      0.]
+    bfm3 = [      0.,      0.,      0.,      0.,    1.77,      0.,      0.]
+    bfp1 = [      1.,    0.93,      1.,    0.93,    0.93,      1.,      1.]
+    bfp2 = [      0.,    0.31,      0.,    0.19,    0.31,      0.,      0.]
+    bfp3 = [      0.,    2.00,      0.,    1.79,    2.00,      0.,      0.]
+
+    if prop['lvar'] > 4:
+        if prop['klim'] <= 0 or prop['klim'] > 7:
+            prop['klim'] = 5
+            prop['kwx'] = max(prop['kwx'], 2)
+
+        prop['cv1'] = bv1[prop['klim'] - 1]
+        prop['cv2'] = bv2[prop['klim'] - 1]
+        prop['yv1'] = xv1[prop['klim'] - 1]
+        prop['yv2'] = xv2[prop['klim'] - 1]
+        prop['yv3'] = xv3[prop['klim'] - 1]
+        prop['csm1'] = bsm1[prop['klim']- 1]
+        prop['csm2'] = bsm2[prop['klim']- 1]
+        prop['ysm1'] = xsm1[prop['klim']- 1]
+        prop['ysm2'] = xsm2[prop['klim']- 1]
+        prop['ysm3'] = xsm3[prop['klim']- 1]
+        prop['csp1'] = bsp1[prop['klim']- 1]
+        prop['csp2'] = bsp2[prop['klim']- 1]
+        prop['ysp1'] = xsp1[prop['klim']- 1]
+        prop['ysp2'] = xsp2[prop['klim']- 1]
+        prop['ysp3'] = xsp3[prop['klim']- 1]
+        prop['csd1'] = bsd1[prop['klim']- 1]
+        prop['zd'] = bzd1[prop['klim'] - 1]
+        prop['cfm1'] = bfm1[prop['klim'] - 1]
+        prop['cfm2'] = bfm2[prop['klim'] - 1]
+        prop['cfm3'] = bfm3[prop['klim'] - 1]
+        prop['cfp1'] = bfp1[prop['klim'] - 1]
+        prop['cfp2'] = bfp2[prop['klim'] - 1]
+        prop['cfp3'] = bfp3[prop['klim'] - 1]
+
+    if prop['lvar'] > 3:
+
+        prop['kdv'] = prop['mdvar']
+        prop['ws'] = (prop['kdv'] >= 20)
+
+        if prop['ws']:
+            prop['kdv'] = prop['kdv'] - 20
+
+        prop['wl'] = prop['kdv'] >= 10
+
+        if prop['wl']:
+            prop['kdv'] = prop['kdv'] - 10
+
+        if prop['kdv'] < 0 or prop['kdv'] > 3:
+            prop['kdv'] = 0
+            prop['kwx'] = max(prop['kwx'], 2)
+
+    if prop['lvar'] > 2:
+
+        q = np.log(0.133 * prop['wn'])
+
+        prop['gm'] = (
+            prop['cfm1'] + prop['cfm2'] /
+            ((prop['cfm3'] * q)**2 + 1)
+            )
+
+        prop['gp'] = (
+            prop['cfp1'] + prop['cfp2'] /
+            ((prop['cfp3'] * q)**2 + 1)
+            )
+
+    if prop['lvar'] > 1:
+
+        prop['dexa'] = (
+            np.sqrt(18e6 * prop['he'][0]) +
+            np.sqrt(18e6 * prop['he'][1]) +
+            (575.7e12 / prop['wn']) ** third
+            )
+
+    return prop
@@ -0,0 +1,209 @@
+import csv
+import os
+
+import numpy as np
+
+def read_table(path, chunk_size=10000, columns=None):
+    """
+    Reads a table of link definitions from a CSV or Parquet file, a chunk of rows at a
+    time, so that only one chunk is held in memory.
+
+    Parquet files (.parquet or .pq) are read with pyarrow, which must be installed.
+    Columns of a CSV file which hold only numbers in the first chunk are returned as float
+    arrays in every chunk, and any others as arrays of strings. Numbers written with
+    leading zeros (e.g. codes such as 00123) are kept as strings.
+
+    Parameters
+    ----------
+    path : str
+        Path to the CSV or Parquet file.
+    chunk_size : int
+        Number of rows in each chunk.
+    columns : list
+        Names of the columns to read. Defaults to all columns.
+
+    Yields
+    ------
+    chunk : dict
+        An array of the values of each column in the chunk.
+
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        source = pq.ParquetFile(path)
+        for batch in source.iter_batches(batch_size=chunk_size, columns=columns):
+            yield {
+                name: column.to_numpy(zero_copy_only=False)
+                for name, column in zip(batch.schema.names, batch.columns)
+            }
+        return
+
+    with open(path, newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader)
+
+        if columns is None:
+            columns = header
+        index = [header.index(name) for name in columns]
+        dtypes = None
+
+        while True:
+            rows = [row for _, row in zip(range(chunk_size), reader)]
+            if not rows:
+                return
+
+            chunk = {name: [row[i] for row in rows] for name, i in zip(columns, index)}
+
+            #the type of each column is fixed by the first chunk
+            if dtypes is None:
+                dtypes = {name: _dtype(values) for name, values in chunk.items()}
+
+            yield {name: _column(name, values, dtypes[name]) for name, values in chunk.items()}
+
+
+def _dtype(values):
+    """
+    Finds the type of a CSV column, float if all of its values are numbers and object
+    (strings) otherwise.
+
+    """
+    for value in values:
+        try:
+            float(value)
+        except ValueError:
+            return object
+
+        digits = value.strip().lstrip('+-')
+        if len(digits) > 1 and digits[0] == '0' and digits[1].isdigit():
+            return object
+
+    return float
+
+
+def _column(name, values, dtype):
+    """
+    Converts the values of a CSV column to an array of the given type.
+
+    """
+    try:
+        return np.array(values, dtype=dtype)
+    except ValueError:
+        raise ValueError(
+            'column {} holds numbers in the first chunk, but not in a later one'.format(name)
+            ) from None
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in ('.parquet', '.pq')
+
+
+class TableWriter:
+    """
+    Writes a table of results to a CSV or Parquet file incrementally, a chunk of rows at
+    a time, so that results need not be held in memory until the end of a run.
+
+    Parquet files (.parquet or .pq) are written with pyarrow, which must be installed, as
+    one row group per chunk. The columns are set by the first chunk.
+
+    Parameters
+    ----------
+    path : str
+        Path to the CSV or Parquet file.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.columns = None
+        self.rows = 0
+
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, chunk):
+        """
+        Appends a chunk of rows to the file.
+
+        Parameters
+        ----------
+        chunk : dict
+            An array (or list) of the values of each column, all of the same length.
+
+        """
+        if self.columns is None:
+            self.columns = list(chunk)
+            self._open(chunk)
+
+        values = [np.asarray(chunk[name]) for name in self.columns]
+
+        if _is_parquet(self.path):
+            import pyarrow as pa
+
+            self._writer.write_table(pa.table(dict(zip(self.columns, values))))
+        else:
+            self._writer.writerows(zip(*[column.tolist() for column in values]))
+
+        self.rows += len(values[0]) if values else 0
+
+    def _open(self, chunk):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = pa.table({name: np.asarray(chunk[name]) for name in chunk}).schema
+            self._writer = pq.ParquetWriter(self.path, schema)
+        else:
+            self._file = open(self.path, 'w', newline='')
+            self._writer = csv.writer(self._file, lineterminator='\n')
+            self._writer.writerow(self.columns)
+
+    def close(self):
+        if _is_parquet(self.path):
+            if self._writer is not None:
+                self._writer.close()
+        elif self._file is not None:
+            self._file.close()
+
+        self._file = None
+        self._writer = None
+
+
+def stream_table(source, destination, compute, chunk_size=10000):
+    """
+    Reads link definitions from a table, computes the results of each chunk of links and
+    writes them to another table as they are found, with memory bounded by the size of a
+    chunk however many links there are.
+
+    Parameters
+    ----------
+    source : str
+        Path to the CSV or Parquet file of link definitions.
+    destination : str
+        Path to the CSV or Parquet file to write the results to.
+    compute : function
+        Takes a chunk of link definitions, as a dict of column arrays, and returns the
+        results for the chunk in the same form.
+    chunk_size : int
+        Number of rows in each chunk.
+
+    Returns
+    -------
+    rows : int
+        Number of rows of results written.
+
+    """
+    with TableWriter(destination) as writer:
+        for chunk in read_table(source, chunk_size):
+            writer.write(compute(chunk))
+
+    return writer.rows
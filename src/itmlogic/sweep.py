@@ -0,0 +1,122 @@
+import numpy as np
+
+from itmlogic.preparatory_subroutines.profile_index import ProfileIndex
+from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl_batch, qlrpfl_geometry
+from itmlogic.lrprop import lrprop_batch
+from itmlogic.statistics.avar import avar_vec
+
+def sweep_heights(prop, hg, zzt=0, zzl=0, zzc=0):
+    """
+    Point-to-point prediction over a grid of antenna heights on a single terrain profile,
+    as used for tower and UAV placement.
+
+    The profile in prop['pfl'] is indexed once (see ProfileIndex) and shared by every
+    height, and the horizons, terrain irregularity, effective heights, reference
+    attenuation and quantiles of attenuation are then found for the whole grid with the
+    batch routines (qlrpfl_batch, avar_vec). The other parameters in prop are set as for
+    qlrpfl.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains all input propagation parameters.
+    hg : list
+        Heights of transmitter and receiver off ground (meters), each a float or an array
+        of heights. For example, [2.56, range(10, 131)] sweeps the height of the second
+        terminal with the first fixed.
+    zzt : array_like
+        Standard normal deviates corresponding to user defined time quantiles.
+    zzl : array_like
+        Standard normal deviates corresponding to user defined location quantiles.
+    zzc : array_like
+        Standard normal deviates corresponding to user defined confidence quantiles.
+
+    Returns
+    -------
+    avar1 : numpy.ndarray
+        Attenuation relative to free space at each height, for each quantile. The heights
+        are the last axis, with the deviates broadcast against them as in avar_vec.
+    prop : dict
+        Contains all input and output propagation parameters, with an element of he, dl,
+        the, dh and aref for each height.
+
+    """
+    if not isinstance(prop['pfl'], ProfileIndex):
+        prop['pfl'] = ProfileIndex(prop['pfl'])
+
+    prop['hg'] = np.array(np.broadcast_arrays(
+        np.asarray(hg[0], dtype=float), np.asarray(hg[1], dtype=float)
+        ))
+
+    prop = qlrpfl_batch(prop)
+
+    avar1, prop = avar_vec(zzt, zzl, zzc, prop)
+
+    return avar1, prop
+
+
+def sweep_frequencies(prop, fmhz, zzt=0, zzl=0, zzc=0):
+    """
+    Point-to-point prediction of a single link at many frequencies.
+
+    The terrain geometry of the path (dist, the, dl, dh and he) does not depend on
+    frequency, so it is found once by qlrpfl_geometry. The wave number (wn) and surface
+    impedance (zgnd) are then set up for every frequency, and the frequency dependent parts
+    of lrprop (through adiff, alos and ascat) and avar are evaluated with the frequencies
+    as an array. The other parameters in prop are set as for qlrpfl, with the ground
+    constants eps, sgm and ipol used in place of wn and zgnd.
+
+    Parameters
+    ----------
+    prop : dict
+        Contains all input propagation parameters.
+    fmhz : array_like
+        Carrier frequencies (MHz).
+    zzt : array_like
+        Standard normal deviates corresponding to user defined time quantiles.
+    zzl : array_like
+        Standard normal deviates corresponding to user defined location quantiles.
+    zzc : array_like
+        Standard normal deviates corresponding to user defined confidence quantiles.
+
+    Returns
+    -------
+    avar1 : numpy.ndarray
+        Attenuation relative to free space at each frequency, for each quantile. The
+        frequencies are the last axis, with the deviates broadcast against them as in
+        avar_vec.
+    prop : dict
+        Contains all input and output propagation parameters, with an element of wn, zgnd
+        and aref for each frequency.
+
+    """
+    prop = qlrpfl_geometry(prop)
+
+    prop['fmhz'] = np.asarray(fmhz, dtype=float)
+    prop['wn'] = prop['fmhz'] / 47.7
+
+    zq = prop['eps'] + 1j * (376.62 * prop['sgm'] / prop['wn'])
+    prop['zgnd'] = np.sqrt(zq - 1)
+
+    if prop['ipol'] != 0:
+        prop['zgnd'] = prop['zgnd'] / zq
+
+    for key in ['hg', 'he', 'dl', 'the']:
+        prop[key] = np.array([prop[key][0], prop[key][1]])
+
+    prop['mdp'] = -1
+    prop['lvar'] = max(prop['lvar'], 3)
+
+    if prop['mdvarx'] >= 0:
+        prop['mdvar'] = prop['mdvarx']
+        prop['lvar'] = max(prop['lvar'], 4)
+
+    if prop['klimx'] > 0:
+        prop['klim'] = prop['klimx']
+        prop['lvar'] = 5
+
+    prop = lrprop_batch(0, prop)
+
+    avar1, prop = avar_vec(zzt, zzl, zzc, prop)
+
+    return avar1, prop
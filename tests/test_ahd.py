@@ -1,5 +1,6 @@
 import pytest
-from itmlogic.scatter_attenuation.ahd import ahd
+import numpy as np
+from itmlogic.scatter_attenuation.ahd import ahd, ahd_vec
 
 def test_ahd():
     """
@@ -21,3 +22,17 @@ def test_ahd():
     expected_answer = 97.7575
 
     assert round(actual_answer, 4) == expected_answer
+
+
+def test_ahd_vec():
+    """
+    Tests the vectorized F0(D) function against ahd, for distances in each of its
+    three ranges.
+
+    """
+    td = np.array([5643.8, 10e3, 45e3, 70e3, 250e3])
+
+    actual_answer = ahd_vec(td)
+
+    for i, value in enumerate(td):
+        assert actual_answer[i] == pytest.approx(ahd(value), rel=1e-12)
@@ -1,5 +1,6 @@
 import pytest
-from itmlogic.diffraction_attenuation.aknfe import aknfe
+import numpy as np
+from itmlogic.diffraction_attenuation.aknfe import aknfe, aknfe_vec
 
 def test_aknfe():
     """
@@ -13,3 +14,16 @@ def test_aknfe():
     assert round(aknfe(3), 2) == 17.99
     assert round(aknfe(5), 2) == 20.04
     assert round(aknfe(6), 2) == 20.73
+
+
+def test_aknfe_vec():
+    """
+    Tests the vectorized knife edge attenuation against aknfe.
+
+    """
+    v2 = np.array([-1, 0, 2, 3, 5, 5.76, 6, 40])
+
+    actual_answer = aknfe_vec(v2)
+
+    for i, value in enumerate(v2):
+        assert actual_answer[i] == pytest.approx(aknfe(value), rel=1e-12)
@@ -10,6 +10,7 @@ from itmlogic.misc.qerfi import qerfi
 from itmlogic.preparatory_subroutines.qlra import qlra
 from itmlogic.lrprop import lrprop
 from itmlogic.statistics.avar import avar
+from itmlogic.area import area_loss, area_distances, area_prop, AreaTable, dh_grid
 
 
 def test_itmlogic_area():
@@ -217,3 +218,142 @@ def test_itmlogic_area():
             assert result['propagation_loss_dB'] == 221.71014370503855
         if result['distance_km'] == 500 and result['confidence_level_%'] == 10:
             assert result['propagation_loss_dB'] == 208.83828024848896
+
+
+def test_area_loss():
+    """
+    Tests the area prediction over the whole range grid in one call against the
+    values of the loop above.
+
+    """
+    prop = {
+        'hg': [3.3, 1.3], 'fmhz': 20, 'dh': 102, 'ens0': 301, 'eps': 15, 'sgm': 0.001,
+        'klimx': 5, 'ipol': 1, 'mdvarx': 3, 'gma': 157E-9, 'kwx': 0, 'lvar': 0,
+    }
+
+    prop['wn'] = prop['fmhz'] / 47.7
+    prop['ens'] = prop['ens0']
+    prop['gme'] = prop['gma'] * (1 - 0.04665 * math.exp(prop['ens'] / 179.3))
+
+    zq = complex(prop['eps'], 376.62 * prop['sgm'] / prop['wn'])
+    prop['zgnd'] = math.sqrt(zq.real - 1) / zq
+
+    d = area_distances(10, 150, 10, 500, 50)
+
+    assert list(d) == list(range(10, 151, 10)) + list(range(200, 501, 50))
+
+    zt = qerfi([0.5])[0]
+    zc = np.array(qerfi([0.5, 0.9, 0.1]))[:, None]
+
+    loss, prop = area_loss(prop, [2, 2], d * 1000, zt, zt, zc)
+
+    assert loss.shape == (3, 22)
+
+    assert list(loss[:, 0]) == [111.69200844812511, 121.59437954264777, 101.78963735360244]
+    assert list(loss[:, -1]) == [215.27421197676375, 221.71014370503855, 208.83828024848896]
+
+
+def test_area_loss_los():
+    """
+    Tests the area prediction against the loop of the runner over a range grid with
+    several line-of-sight distances, where lrprop sets aref at each distance.
+
+    """
+    prop = {'eps': 15, 'sgm': 0.001, 'ipol': 1, 'gma': 157E-9, 'klimx': 5, 'mdvarx': 3}
+    prop = area_prop(prop, 3000, [200, 10], 500, 301)
+
+    d = area_distances(10, 150, 10) * 1000
+
+    zt = qerfi([0.5])[0]
+    zc = qerfi([0.5, 0.9, 0.1])
+
+    loss, link = area_loss(dict(prop), [2, 2], d, zt, zt, np.array(zc)[:, None])
+
+    #the first seven distances are within line of sight
+    assert (d < link['dlsa']).sum() == 7
+
+    prop = qlra([2, 2], prop)
+
+    for jd, distance in enumerate(d):
+        prop['lvar'] = max(1, prop['lvar'])
+        prop = lrprop(distance, prop)
+
+        fs = 8.685890 * np.log(2 * prop['wn'] * prop['dist'])
+
+        for jc in range(0, len(zc)):
+            avar1, prop = avar(zt, zt, zc[jc], prop)
+
+            assert loss[jc, jd] == fs + avar1
+
+
+def test_area_table(tmp_path):
+    """
+    Tests the lookup table of area prediction loss against area_loss, at the grid points
+    and between them.
+
+    """
+    prop = {'eps': 15, 'sgm': 0.001, 'ipol': 1, 'gma': 157E-9, 'klimx': 5, 'mdvarx': 3}
+
+    axes = {
+        'fmhz': [20, 200], 'hg0': [3.3, 30], 'hg1': [1.3], 'dh': [50, 102],
+        'ens': [301, 320], 'd': np.geomspace(10e3, 500e3, 30),
+    }
+
+    table = AreaTable.build(prop, [2, 2], axes, checks=20)
+
+    assert table.loss.shape == (2, 2, 1, 2, 2, 30)
+    assert 0 < table.error < 10
+
+    expected, link = area_loss(
+        area_prop(prop, 20, [3.3, 1.3], 102, 301), [2, 2], axes['d'])
+
+    #the area mode runner, at 10 km and 500 km
+    assert expected[0] == pytest.approx(111.69200844812511, rel=1e-12)
+    assert expected[-1] == pytest.approx(215.27421197676375, rel=1e-12)
+
+    actual = table.query(20, 3.3, 1.3, 102, 301, axes['d'])
+    assert actual == pytest.approx(expected, rel=1e-12)
+
+    expected, link = area_loss(
+        area_prop(prop, 60, [10, 1.3], 80, 310), [2, 2], [123e3])
+    actual = table.query(60, 10, 1.3, 80, 310, 123e3)
+
+    assert abs(actual - expected[0]) < 2 * table.error
+
+    path = str(tmp_path / 'area_table.npz')
+    table.save(path)
+    loaded = AreaTable.load(path)
+
+    assert loaded.error == table.error
+    assert loaded.query(60, 10, 1.3, 80, 310, 123e3) == actual
+
+
+def test_dh_grid():
+    """
+    Tests the grid of delta h against the interdecile range of the elevations within
+    the radius of single cells.
+
+    """
+    rows, cols = np.mgrid[0:40, 0:50]
+    dem = 60 + 40 * np.sin(rows / 5.0) * np.cos(cols / 7.0) + 0.5 * cols
+    dem[3, 4] = np.nan
+
+    dh = dh_grid(dem, 100, cellsize=(20, 25), samples=10000, chunk_size=5000)
+
+    assert dh.shape == dem.shape
+
+    for i, j in [(20, 25), (0, 0), (2, 5), (39, 10)]:
+        y, x = np.mgrid[0:40, 0:50]
+        inside = ((y - i) * 20)**2 + ((x - j) * 25)**2 <= 100**2
+        values = dem[inside & ~np.isnan(dem)]
+
+        q90, q10 = np.percentile(values, [90, 10])
+
+        assert dh[i, j] == pytest.approx(q90 - q10, rel=1e-12)
+
+    #fewer samples give an estimate from every few rows and columns
+    estimate = dh_grid(dem, 250, cellsize=(20, 25), samples=50)
+    exact = dh_grid(dem, 250, cellsize=(20, 25), samples=10000)
+
+    assert np.nanmax(np.abs(estimate - exact)) < 0.25 * np.nanmax(exact)
+
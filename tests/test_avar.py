@@ -1,5 +1,8 @@
+import copy
 import pytest
-from itmlogic.statistics.avar import avar
+import numpy as np
+
+from itmlogic.statistics.avar import avar, avar_vec
 
 def test_avar(
     setup_prop_to_test_avar,
@@ -37,3 +40,63 @@ def test_avar(
     expected_answer = 33.44778607772954
 
     assert actual_answer == expected_answer
+
+
+def test_avar_vec(setup_prop_to_test_avar, setup_prop_to_test_avar_uarea):
+    """
+    Test the vectorized form of avar against one scalar avar call per quantile and
+    distance.
+
+    The first test uses the Crystal Palace to Mursley point-to-point path with a 5x3 grid
+    of reliability and confidence deviates. The second uses the area mode parameters over a
+    grid of distances.
+
+    """
+    zr = np.array([2.3268, 1.2817, 0, -1.2817, -2.3268])
+    zc = np.array([0, 1.2817, -1.2817])
+
+    actual_answer, actual_prop = avar_vec(
+        zr[:, np.newaxis], 0, zc[np.newaxis, :],
+        copy.deepcopy(setup_prop_to_test_avar)
+        )
+
+    assert actual_answer.shape == (5, 3)
+
+    prop = copy.deepcopy(setup_prop_to_test_avar)
+    for jr in range(0, len(zr)):
+        for jc in range(0, len(zc)):
+            expected_answer, prop = avar(zr[jr], 0, zc[jc], prop)
+            assert actual_answer[jr, jc] == pytest.approx(expected_answer)
+
+    distances = np.array([10e3, 50e3, 150e3, 500e3])
+    aref = np.array([30.0, 45.0, 60.0, 100.0])
+
+    actual_answer, actual_prop = avar_vec(
+        0, 0, zc[:, np.newaxis],
+        copy.deepcopy(setup_prop_to_test_avar_uarea),
+        dist=distances, aref=aref
+        )
+
+    assert actual_answer.shape == (3, 4)
+
+    for jd in range(0, len(distances)):
+        prop = copy.deepcopy(setup_prop_to_test_avar_uarea)
+        prop['dist'] = distances[jd]
+        prop['aref'] = aref[jd]
+        for jc in range(0, len(zc)):
+            expected_answer, prop = avar(0, 0, zc[jc], prop)
+            assert actual_answer[jc, jd] == pytest.approx(expected_answer)
+
+    #a deviate beyond 3.1 is flagged in kwx, which stays a plain int
+    actual_answer, actual_prop = avar_vec(
+        [0, 3.5], 0, 0, copy.deepcopy(setup_prop_to_test_avar))
+
+    assert actual_prop['kwx'] == 1 and type(actual_prop['kwx']) is int
+    assert actual_prop['lvar'] == 1
+
+    #so a scalar avar call afterwards computes the distance dependent terms again
+    expected_answer, prop = avar(0, 0, 0, copy.deepcopy(setup_prop_to_test_avar))
+    actual_prop['vmd'] = None
+
+    assert avar(0, 0, 0, actual_prop)[0] == expected_answer
+    assert actual_answer[0] == pytest.approx(expected_answer)
@@ -0,0 +1,78 @@
+import copy
+import pytest
+import numpy as np
+from itmlogic.misc.qerfi import qerfi
+from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl
+from itmlogic.statistics.avar import avar
+from itmlogic.batch import predict_links
+
+def setup_links(prop):
+    """
+    Links along the start of the Crystal Palace to Mursley path, every other one at a
+    frequency overriding that of prop.
+
+    """
+    pfl = prop['pfl']
+
+    links = []
+    for i, k in enumerate([156, 120, 80, 40, 20]):
+        links.append({
+            'pfl': [k, pfl[1]] + pfl[2:k + 3],
+            'hg': [143.9, 1.5 + i],
+        })
+
+        if i % 2:
+            links[-1]['wn'] = 800 / 47.7
+
+    return links
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_predict_links(setup_prop_to_test_qlrpfl, workers):
+    """
+    Tests the batch runner against qlrpfl and avar run for each link in turn.
+
+    """
+    prop = setup_prop_to_test_qlrpfl
+    links = setup_links(prop)
+
+    zr = np.array(qerfi([0.1, 0.5, 0.9]))
+
+    actual = list(predict_links(
+        links, copy.deepcopy(prop), zr, 0, 0, workers=workers, chunk_size=2
+        ))
+
+    assert len(actual) == len(links)
+
+    for link, loss in zip(links, actual):
+        expected = copy.deepcopy(prop)
+        expected.update(copy.deepcopy(link))
+        expected = qlrpfl(expected)
+
+        fs = 8.685890 * np.log(2 * expected['wn'] * expected['dist'])
+
+        assert loss.shape == (3,)
+
+        for k, z in enumerate(zr):
+            avar1, expected = avar(z, 0, 0, expected)
+            assert loss[k] == pytest.approx(fs + avar1, rel=1e-9)
+
+
+def test_predict_links_close(setup_prop_to_test_qlrpfl):
+    """
+    Tests that the batch runner can be closed before all results are read, cancelling
+    the chunks still queued.
+
+    """
+    prop = setup_prop_to_test_qlrpfl
+    links = setup_links(prop) * 8
+
+    results = predict_links(links, copy.deepcopy(prop), workers=2, chunk_size=1)
+
+    first = next(results)
+    results.close()
+
+    assert isinstance(first, float)
+
+    with pytest.raises(StopIteration):
+        next(results)
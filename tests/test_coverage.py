@@ -0,0 +1,99 @@
+import copy
+import pytest
+import numpy as np
+from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl
+from itmlogic.statistics.avar import avar
+from itmlogic.coverage import (sample_bilinear, line_profiles, coverage_map, ray_elevations,
+    radial_coverage)
+
+@pytest.fixture
+def setup_dem():
+    rows, cols = np.mgrid[0:81, 0:81]
+    return 60 + 40 * np.sin(rows / 9.0) * np.cos(cols / 13.0) + 0.5 * cols
+
+
+def test_sample_bilinear(setup_dem):
+
+    dem = setup_dem
+
+    assert sample_bilinear(dem, 3, 7) == dem[3, 7]
+    assert sample_bilinear(dem, 3.5, 7) == pytest.approx(0.5 * (dem[3, 7] + dem[4, 7]))
+    assert sample_bilinear(dem, -2, 90) == dem[0, 80]
+
+
+def test_line_profiles(setup_dem):
+
+    dem = setup_dem
+
+    pfl = line_profiles(dem, 30, (40, 40), [[40, 80], [0, 40]])
+
+    assert pfl[0, 0] == 40
+    assert pfl[0, 1] == 30
+    assert pfl[0, 2:] == pytest.approx(dem[40, 40::-1])
+    assert pfl[1, 2:] == pytest.approx(dem[40:, 40])
+
+
+def test_coverage_map(setup_dem, setup_prop_to_test_qlrpfl):
+    """
+    Tests the coverage map against qlrpfl and avar run for single receivers.
+
+    """
+    prop = setup_prop_to_test_qlrpfl
+    prop['hg'] = [30, 1.5]
+    prop['fmhz'] = 800
+    prop['wn'] = prop['fmhz'] / 47.7
+
+    loss = coverage_map(setup_dem, (40, 40), 1200, 100, copy.deepcopy(prop), cellsize=30)
+
+    assert loss.shape == (25, 25)
+    assert np.isnan(loss[12, 12])
+    assert np.isnan(loss[0, 0])
+
+    for i, j in [(0, 12), (12, 24), (5, 20), (20, 4)]:
+        rx = (40 + (i - 12) * 100 / 30, 40 + (j - 12) * 100 / 30)
+
+        expected = copy.deepcopy(prop)
+        expected['pfl'] = line_profiles(setup_dem, 30, (40, 40), rx)[0].tolist()
+        expected['pfl'][0] = int(expected['pfl'][0])
+        expected = qlrpfl(expected)
+
+        avar1, expected = avar(0, 0, 0, expected)
+        fs = 8.685890 * np.log(2 * expected['wn'] * expected['dist'])
+
+        assert loss[i, j] == pytest.approx(fs + avar1, rel=1e-9)
+
+
+def test_radial_coverage(setup_dem, setup_prop_to_test_qlrpfl):
+    """
+    Tests the radial sweep against qlrpfl and avar run on the profile to single receivers
+    along each ray.
+
+    """
+    prop = setup_prop_to_test_qlrpfl
+    prop['hg'] = [30, 1.5]
+    prop['fmhz'] = 800
+    prop['wn'] = prop['fmhz'] / 47.7
+
+    loss, distance = radial_coverage(
+        setup_dem, (40, 40), 1200, 100, copy.deepcopy(prop), azimuths=[0, 45, 200],
+        cellsize=30
+        )
+
+    assert loss.shape == (3, 12)
+    assert distance[-1] == 1200
+
+    rays = ray_elevations(setup_dem, 30, (40, 40), [0, 45, 200], 12, 100)
+
+    north = sample_bilinear(setup_dem, 40 - np.arange(13) * 10 / 3, 40)
+    assert rays[0] == pytest.approx(north)
+
+    for row in range(0, 3):
+        for k in [2, 5, 12]:
+            expected = copy.deepcopy(prop)
+            expected['pfl'] = [k, 100.0] + rays[row, :k + 1].tolist()
+            expected = qlrpfl(expected)
+
+            avar1, expected = avar(0, 0, 0, expected)
+            fs = 8.685890 * np.log(2 * expected['wn'] * expected['dist'])
+
+            assert loss[row, k - 1] == pytest.approx(fs + avar1, rel=1e-9)
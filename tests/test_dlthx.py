@@ -1,5 +1,6 @@
 import pytest
-from itmlogic.preparatory_subroutines.dlthx import dlthx
+import numpy as np
+from itmlogic.preparatory_subroutines.dlthx import dlthx, dlthx_batch
 
 def test_dlthx(setup_pfl1):
     """
@@ -15,3 +16,24 @@ def test_dlthx(setup_pfl1):
 
     """
     assert round(dlthx(setup_pfl1, 2158.5, 77672.5), 4) == 89.2126
+
+    #unchanged to the last digit from the original looped implementation
+    assert dlthx(setup_pfl1, 2158.5, 77672.5) == 89.21260017944768
+
+
+def test_dlthx_batch(setup_pfl1):
+    """
+    Tests the batch delta h against dlthx, over several ranges of the profile pfl1.
+
+    """
+    x1 = np.array([2158.5, 0, 500, 10000, 30000])
+    x2 = np.array([77672.5, 77800, 1000, 20000, 30500])
+
+    pfl = np.tile(setup_pfl1, (len(x1), 1))
+
+    actual_answer = dlthx_batch(pfl, x1, x2)
+
+    assert round(actual_answer[0], 4) == 89.2126
+
+    for i in range(len(x1)):
+        assert actual_answer[i] == dlthx(setup_pfl1, x1[i], x2[i])
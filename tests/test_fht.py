@@ -1,5 +1,6 @@
 import pytest
-from itmlogic.diffraction_attenuation.fht import fht
+import numpy as np
+from itmlogic.diffraction_attenuation.fht import fht, fht_vec
 
 def test_fht():
     """
@@ -21,3 +22,17 @@ def test_fht():
     assert round(fht(150, 20), 2) == 11.05
 
     assert round(fht(150, 1e-6), 2) == -29.96
+
+
+def test_fht_vec():
+    """
+    Tests the vectorized height gain function against fht, covering each of its branches.
+
+    """
+    x = np.array([372.8075813962142, 150, 150, 0.5, 1500, 2500])
+    pk = np.array([0.0015012964882592428, 20, 1e-6, 1e-6, 0.1, 0.1])
+
+    actual_answer = fht_vec(x, pk)
+
+    for i in range(len(x)):
+        assert actual_answer[i] == pytest.approx(fht(x[i], pk[i]), rel=1e-12)
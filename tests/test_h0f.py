@@ -1,5 +1,6 @@
 import pytest
-from itmlogic.scatter_attenuation.h0f import h0f
+import numpy as np
+from itmlogic.scatter_attenuation.h0f import h0f, h0f_vec
 
 def test_h0f():
     """
@@ -25,3 +26,17 @@ def test_h0f():
     actual_answer = h0f(2, 6)
 
     assert round(actual_answer, 2) == 18.53
+
+
+def test_h0f_vec():
+    """
+    Tests the vectorized frequency gain function against h0f.
+
+    """
+    r = np.array([0.4727387221558643, 2, 2, 2, 1.5])
+    et = np.array([2.5221451983881447, -1, 6, 0.5, 4.2])
+
+    actual_answer = h0f_vec(r, et)
+
+    for i in range(len(r)):
+        assert actual_answer[i] == pytest.approx(h0f(r[i], et[i]), rel=1e-12)
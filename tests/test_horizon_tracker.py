@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+from itmlogic.preparatory_subroutines.horizon_tracker import HorizonTracker
+from itmlogic.preparatory_subroutines.hzns import hzns
+
+def test_horizon_tracker(setup_prop_test_hzns):
+    """
+    Tests the horizons of a growing profile against hzns on the profile at each length.
+
+    """
+    pfl = setup_prop_test_hzns['pfl']
+    hg = setup_prop_test_hzns['hg']
+    gme = setup_prop_test_hzns['gme']
+
+    tracker = HorizonTracker(pfl[1], hg, gme, pfl[2:4])
+
+    for k in range(1, pfl[0] + 1):
+        if k > 1:
+            tracker.append(pfl[k + 2])
+
+        assert len(tracker) == k + 1
+        assert tracker.dist == k * pfl[1]
+
+        expected_the, expected_dl = hzns(tracker.profile, tracker.dist, hg, gme)
+
+        for j in range(0, 2):
+            assert tracker.the[j] == pytest.approx(expected_the[j], rel=1e-9)
+            assert tracker.dl[j] == pytest.approx(expected_dl[j], rel=1e-9)
+
+    assert tracker.the[0] == pytest.approx(-0.0038802364456099045, rel=1e-9)
+    assert tracker.dl == pytest.approx({0: 55357.69230769219, 1: 19450.0000000001})
+
+
+def test_horizon_tracker_rough():
+    """
+    Tests the receiver horizons found from the hull of a rough growing profile, with
+    many raises of both horizons, against hzns on the profile at each length.
+
+    """
+    rng = np.random.default_rng(0)
+    z = 300 + np.cumsum(rng.normal(0, 15, 400))
+
+    tracker = HorizonTracker(90, [20, 5], 1.148e-7, z[:1])
+
+    for value in z[1:]:
+        tracker.append(value)
+
+        expected_the, expected_dl = hzns(tracker.profile, tracker.dist, [20, 5], 1.148e-7)
+
+        for j in range(0, 2):
+            assert tracker.the[j] == pytest.approx(expected_the[j], rel=1e-9)
+            assert tracker.dl[j] == pytest.approx(expected_dl[j], rel=1e-9)
+
+    #only the points on the hull are kept for the receiver side
+    assert len(tracker._hull) < len(tracker) // 4
+
+
+def test_horizon_tracker_too_short():
+
+    tracker = HorizonTracker(100, [10, 2], 1.148e-7, [50])
+
+    with pytest.raises(ValueError):
+        tracker.the
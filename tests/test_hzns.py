@@ -1,5 +1,7 @@
 import pytest
-from itmlogic.preparatory_subroutines.hzns import hzns
+import numpy as np
+from itmlogic.preparatory_subroutines.hzns import hzns, hzns_batch, hzns_ray
+from itmlogic.preparatory_subroutines.qlrpfl import stack_profiles
 
 def test_hzns(setup_prop_test_hzns):
     """
@@ -21,3 +23,54 @@ def test_hzns(setup_prop_test_hzns):
 
     assert round(answer2[0], 4) == 55357.6923
     assert round(answer2[1], 4) == 19450.0000
+
+    #the vectorized search returns exactly the values of the original loop
+    assert answer1 == {0: -0.0038802364456099045, 1: 0.0004516926187812166}
+    assert answer2 == {0: 55357.69230769219, 1: 19450.0000000001}
+
+
+def test_hzns_batch(setup_prop_test_hzns):
+    """
+    Tests the batch horizon search against hzns, for profiles of different lengths
+    and terminal heights.
+
+    """
+    pfl = setup_prop_test_hzns['pfl']
+    gme = setup_prop_test_hzns['gme']
+
+    pfls = [pfl, [100, pfl[1]] + pfl[2:103], [20, pfl[1]] + pfl[2:23], [1, pfl[1]] + pfl[2:4]]
+    hg = np.array([[143.9, 8.5], [10, 8.5], [2, 2], [143.9, 8.5]]).T
+
+    stacked = stack_profiles(pfls)
+    dist = stacked[:, 0] * stacked[:, 1]
+
+    the, dl = hzns_batch(stacked, dist, hg, gme)
+
+    for i, profile in enumerate(pfls):
+        expected_the, expected_dl = hzns(profile, dist[i], list(hg[:, i]), gme)
+
+        for j in range(0, 2):
+            assert the[j, i] == expected_the[j]
+            assert dl[j, i] == expected_dl[j]
+
+
+def test_hzns_ray(setup_prop_test_hzns):
+    """
+    Tests the horizons of every receiver along a ray against hzns on the profile to
+    each receiver.
+
+    """
+    pfl = setup_prop_test_hzns['pfl']
+    hg = setup_prop_test_hzns['hg']
+    gme = setup_prop_test_hzns['gme']
+
+    the, dl = hzns_ray(pfl[2:], pfl[1], hg, gme)
+
+    assert the.shape == (2, pfl[0])
+
+    for k in [1, 2, 20, 100, pfl[0]]:
+        expected_the, expected_dl = hzns([k, pfl[1]] + pfl[2:k + 3], k * pfl[1], hg, gme)
+
+        for j in range(0, 2):
+            assert the[j, k - 1] == pytest.approx(expected_the[j], rel=1e-9)
+            assert dl[j, k - 1] == pytest.approx(expected_dl[j], rel=1e-9)
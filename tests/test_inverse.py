@@ -0,0 +1,173 @@
+import copy
+import math
+import pytest
+import numpy as np
+
+from itmlogic.misc.qerfi import qerfi
+from itmlogic.area import area_loss
+from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl, stack_profiles
+from itmlogic.statistics.avar import avar
+from itmlogic.sweep import sweep_heights
+from itmlogic.inverse import area_range, p2p_range, minimum_height, required_eirp
+
+@pytest.fixture
+def setup_area_prop():
+    prop = {
+        'hg': [30, 1.5], 'fmhz': 800, 'dh': 90, 'ens0': 301, 'eps': 15, 'sgm': 0.005,
+        'klimx': 5, 'ipol': 0, 'mdvarx': 3, 'gma': 157E-9, 'kwx': 0, 'lvar': 0,
+    }
+
+    prop['wn'] = prop['fmhz'] / 47.7
+    prop['ens'] = prop['ens0']
+    prop['gme'] = prop['gma'] * (1 - 0.04665 * math.exp(prop['ens'] / 179.3))
+
+    zq = complex(prop['eps'], 376.62 * prop['sgm'] / prop['wn'])
+    prop['zgnd'] = np.sqrt(zq - 1)
+
+    return prop
+
+
+def test_area_range(setup_area_prop):
+    """
+    Tests the distance at which the area prediction loss reaches a target, for several
+    confidence levels at once, against area_loss either side of it.
+
+    """
+    zc = np.array(qerfi([0.5, 0.9, 0.1]))
+
+    for target in [140, 180, 250]:
+        distance, evaluations = area_range(
+            copy.deepcopy(setup_area_prop), [0, 0], target, 0, 0, zc)
+
+        assert distance.shape == (3,)
+        assert evaluations <= 10
+
+        loss, prop = area_loss(
+            copy.deepcopy(setup_area_prop), [0, 0], np.stack([distance - 1, distance]),
+            0, 0, zc)
+
+        assert (loss[0] < target).all()
+        assert (loss[1] >= target).all()
+
+    distance, evaluations = area_range(copy.deepcopy(setup_area_prop), [0, 0], 100)
+    assert distance == 1e3
+
+    distance, evaluations = area_range(copy.deepcopy(setup_area_prop), [0, 0], 500)
+    assert np.isnan(distance)
+
+
+def test_p2p_range(setup_prop_to_test_qlrpfl):
+    """
+    Tests the distance along the Crystal Palace to Mursley profile at which the loss
+    reaches a target, against qlrpfl and avar on the truncated profiles.
+
+    """
+    prop = setup_prop_to_test_qlrpfl
+    prop['lvar'] = 5
+    prop['mdvarx'] = 11
+
+    n = prop['pfl'][0]
+    xi = prop['pfl'][1]
+
+    def loss(k, z):
+        link = copy.deepcopy(prop)
+        link['pfl'] = [k] + link['pfl'][1:]
+        link = qlrpfl(link)
+        avar1, link = avar(z, 0, z, link)
+        return 8.685890 * np.log(2 * link['wn'] * link['dist']) + avar1
+
+    zc = np.array(qerfi([0.5, 0.9]))
+
+    #every point of the profile evaluated in the scan
+    distance, evaluations = p2p_range(
+        copy.deepcopy(prop), 130, zc, 0, zc, d_min=0, samples=n)
+
+    assert evaluations == 1
+
+    for d, z in zip(distance, zc):
+        k = int(round(d / xi))
+        assert loss(k, z) >= 130
+        assert all(loss(j, z) < 130 for j in range(2, k))
+
+    distance, evaluations = p2p_range(copy.deepcopy(prop), 130, zc, 0, zc, d_min=0)
+
+    assert evaluations < 10
+
+    for d, z in zip(distance, zc):
+        k = int(round(d / xi))
+        assert loss(k, z) >= 130
+        assert loss(k - 1, z) < 130
+
+
+def test_minimum_height(setup_prop_to_test_qlrpfl_pimter):
+    """
+    Tests the minimum UAV height meeting a loss budget on the PIMTER profile against the
+    height sweep either side of it, and the solution of many sites at once.
+
+    """
+    prop = setup_prop_to_test_qlrpfl_pimter
+    prop['lvar'] = 5
+    prop['mdvarx'] = 11
+
+    zr = np.array(qerfi([0.5, 0.9]))
+
+    def loss(heights, z):
+        avar1, swept = sweep_heights(copy.deepcopy(prop), [2.56, heights], z, 0, z)
+        return 8.685890 * np.log(2 * swept['wn'] * swept['dist']) + avar1
+
+    height, evaluations = minimum_height(
+        copy.deepcopy(prop), 125, zr, 0, zr, terminal=1, tol=0.01)
+
+    assert evaluations <= 10
+
+    for h, z in zip(height, zr):
+        before, after = loss([h - 0.01, h], z)
+        assert before > 125
+        assert after <= 125
+
+    height, evaluations = minimum_height(copy.deepcopy(prop), 200, terminal=1)
+    assert height == 1
+
+    height, evaluations = minimum_height(copy.deepcopy(prop), 50, terminal=1)
+    assert np.isnan(height)
+
+    #sites given as stacked profiles, the second a shortened copy of the first
+    pfl = list(prop['pfl'])
+    short = [2000, pfl[1]] + pfl[2:2003]
+
+    sites = copy.deepcopy(prop)
+    sites['pfl'] = stack_profiles([pfl, short])
+    sites['hg'] = [0, [2.56, 2.2]]
+
+    height, evaluations = minimum_height(sites, 125, zr[:, None], 0, zr[:, None])
+
+    assert height.shape == (2, 2)
+
+    for i, (profile, fixed) in enumerate(zip([pfl, short], [2.56, 2.2])):
+        single = copy.deepcopy(prop)
+        single['pfl'] = profile
+        single['hg'] = [0, fixed]
+
+        expected, _ = minimum_height(single, 125, zr, 0, zr)
+        assert height[:, i] == pytest.approx(expected)
+
+
+def test_required_eirp(setup_prop_to_test_qlrpfl):
+    """
+    Tests the EIRP needed to reach the receiver sensitivity against qlrpfl and avar.
+
+    """
+    prop = setup_prop_to_test_qlrpfl
+    prop['lvar'] = 5
+    prop['mdvarx'] = 11
+
+    zr = np.array(qerfi([0.5, 0.9]))
+
+    eirp = required_eirp(copy.deepcopy(prop), -100, zr, 0, zr, gain=3)
+
+    expected = qlrpfl(copy.deepcopy(prop))
+    fs = 8.685890 * np.log(2 * expected['wn'] * expected['dist'])
+
+    for actual, z in zip(eirp, zr):
+        avar1, expected = avar(z, 0, z, expected)
+        assert actual == pytest.approx(-100 + fs + avar1 - 3)
@@ -1,5 +1,10 @@
+import copy
 import pytest
-from itmlogic.lrprop import lrprop
+import numpy as np
+
+from itmlogic import lrprop as lrprop_module
+from itmlogic.lrprop import (
+    lrprop, lrprop_vec, clear_lrprop_cache, LrpropCoefficients)
 
 def test_lrprop(
     setup_prop_to_test_lrprop,
@@ -41,3 +46,135 @@ def test_lrprop(
     assert actual_prop['kwx'] == pytest.approx(expected_prop['kwx'])
     assert actual_prop['ael'] == pytest.approx(expected_prop['ael'])
     assert actual_prop['aref'] == pytest.approx(expected_prop['aref'])
+
+
+def test_lrprop_vec(setup_prop_to_test_lrprop_uarea, setup_prop_to_test_lrprop):
+    """
+    Test the vectorized form of lrprop against one scalar lrprop call per distance,
+    covering the line-of-sight, diffraction and scatter regions in area mode, and the
+    point-to-point mode setup.
+
+    """
+    distances = np.concatenate([
+        np.linspace(1e3, 20e3, 20),
+        np.linspace(25e3, 600e3, 24)
+    ])
+
+    actual_aref, actual_prop = lrprop_vec(
+        distances, copy.deepcopy(setup_prop_to_test_lrprop_uarea))
+
+    for d, actual in zip(distances, actual_aref):
+        expected_prop = lrprop(d, copy.deepcopy(setup_prop_to_test_lrprop_uarea))
+        assert actual == pytest.approx(expected_prop['aref'])
+
+    assert actual_prop['mdp'] == 0
+    assert actual_prop['wlos'] == 1
+    assert actual_prop['wscat'] == 1
+
+    actual_aref, actual_prop = lrprop_vec(
+        [77800.0], copy.deepcopy(setup_prop_to_test_lrprop))
+
+    expected_prop = lrprop(0, copy.deepcopy(setup_prop_to_test_lrprop))
+
+    assert actual_aref[0] == pytest.approx(expected_prop['aref'])
+    assert actual_prop['mdp'] == -1
+
+
+def test_lrprop_consecutive(setup_prop_to_test_lrprop_uarea):
+    """
+    Test the vectorized form of lrprop against consecutive scalar lrprop calls on the same
+    prop, as in the area mode sequence of distances, which sets aref at every
+    line-of-sight distance and not only the first.
+
+    """
+    distances = np.concatenate([
+        np.linspace(1e3, 20e3, 20),
+        np.linspace(25e3, 600e3, 24)
+    ])
+
+    actual_aref, actual_prop = lrprop_vec(
+        distances, copy.deepcopy(setup_prop_to_test_lrprop_uarea))
+
+    prop = copy.deepcopy(setup_prop_to_test_lrprop_uarea)
+    for d, actual in zip(distances, actual_aref):
+        prop = lrprop(d, prop)
+        assert actual == prop['aref']
+
+    assert actual_prop['kwx'] == prop['kwx']
+
+
+def test_lrprop_cache(setup_prop_to_test_lrprop_uarea):
+    """
+    Test that links sharing the same geometry take the setup, line-of-sight and scatter
+    coefficients from the cache, with the same results as computing them afresh.
+
+    """
+    clear_lrprop_cache()
+
+    first = lrprop(100e3, copy.deepcopy(setup_prop_to_test_lrprop_uarea))
+    second = lrprop(100e3, copy.deepcopy(setup_prop_to_test_lrprop_uarea))
+
+    assert lrprop_module._setup_values.cache_info().hits == 1
+    assert lrprop_module._scatter_values.cache_info().hits == 1
+
+    prop = copy.deepcopy(setup_prop_to_test_lrprop_uarea)
+    prop = lrprop_module._lrprop_setup(prop)
+    prop = lrprop_module._scatter_coefficients(prop)
+
+    for key in ('dls', 'dlsa', 'kwx', 'xht', 'aed', 'emd', 'ems', 'aes', 'dx'):
+        assert first[key] == prop[key]
+        assert second[key] == prop[key]
+
+    assert second['aref'] == first['aref']
+
+    #results held in the cache are not changed through a prop
+    second['dls'][0] = 0
+    third = lrprop(100e3, copy.deepcopy(setup_prop_to_test_lrprop_uarea))
+    assert third['dls'] == prop['dls']
+
+    #a key which cannot be hashed bypasses the cache
+    calls = []
+
+    def function(*key):
+        calls.append(key)
+        raise TypeError('from the computation')
+
+    function.__wrapped__ = lambda *key: 'uncached'
+
+    assert lrprop_module._cached(function, [1], 2) == 'uncached'
+    assert calls == []
+
+    #but errors from the computation itself are not caught
+    with pytest.raises(TypeError, match='from the computation'):
+        lrprop_module._cached(function, (1,), 2)
+
+    assert calls == [((1,), 2)]
+
+
+def test_lrprop_coefficients(setup_prop_to_test_lrprop_uarea):
+    """
+    Test that the line-of-sight and scatter blocks are only computed when distances in
+    their regions are asked for, with the same results as lrprop_vec.
+
+    """
+    prop = copy.deepcopy(setup_prop_to_test_lrprop_uarea)
+    coefficients = LrpropCoefficients(prop)
+
+    assert coefficients.computed == ['setup']
+
+    short = np.linspace(1e3, 0.9 * coefficients.prop['dlsa'], 10)
+    aref = coefficients.aref(short)
+
+    assert coefficients.computed == ['setup', 'los']
+    assert 'ems' not in coefficients.prop
+
+    expected, _ = lrprop_vec(short, copy.deepcopy(setup_prop_to_test_lrprop_uarea))
+    assert aref == pytest.approx(expected)
+
+    far = np.linspace(1.1 * coefficients.prop['dlsa'], 600e3, 10)
+    aref = coefficients.aref(far)
+
+    assert coefficients.computed == ['setup', 'los', 'scatter']
+
+    expected, _ = lrprop_vec(far, copy.deepcopy(setup_prop_to_test_lrprop_uarea))
+    assert aref == pytest.approx(expected)
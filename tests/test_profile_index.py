@@ -0,0 +1,88 @@
+import copy
+import pytest
+import numpy as np
+from itmlogic.preparatory_subroutines.profile_index import ProfileIndex
+from itmlogic.preparatory_subroutines.zlsq1 import zlsq1
+from itmlogic.preparatory_subroutines.dlthx import dlthx
+from itmlogic.preparatory_subroutines.hzns import hzns
+from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl
+
+def test_profile_index(setup_pfl1):
+    """
+    Tests that a ProfileIndex behaves as the terrain profile it was built from, and that
+    its constant time fits agree with zlsq1.
+
+    """
+    index = ProfileIndex(setup_pfl1)
+
+    assert len(index) == len(setup_pfl1)
+    assert index[0] == 156
+    assert list(index) == setup_pfl1
+    assert np.array_equal(np.asarray(index), setup_pfl1)
+
+    length = setup_pfl1[0] * setup_pfl1[1]
+    x1 = np.array([0, 0.1 * length, 2158.5, 1500, 1200])
+    x2 = np.array([length, 0.3 * length, 77672.5, 1700, 1400])
+
+    z0, zn = index.fit(x1, x2)
+
+    for i in range(len(x1)):
+        expected = zlsq1(setup_pfl1, x1[i], x2[i])
+
+        assert zlsq1(index, x1[i], x2[i]) == (z0[i], zn[i])
+        assert z0[i] == pytest.approx(expected[0], rel=1e-9)
+        assert zn[i] == pytest.approx(expected[1], rel=1e-9)
+
+    assert dlthx(index, 2158.5, 77672.5) == dlthx(setup_pfl1, 2158.5, 77672.5)
+    assert hzns(index, 77800, [143.9, 8.5], 1.148e-7) == hzns(
+        setup_pfl1, 77800, [143.9, 8.5], 1.148e-7)
+
+
+def test_profile_index_qlrpfl(setup_prop_to_test_qlrpfl_pimter):
+    """
+    Tests qlrpfl with a ProfileIndex against the plain profile, over a sweep of antenna
+    heights on the one path.
+
+    """
+    index = ProfileIndex(setup_prop_to_test_qlrpfl_pimter['pfl'])
+
+    for height in [10, 50, 130]:
+        prop = copy.deepcopy(setup_prop_to_test_qlrpfl_pimter)
+        prop['hg'] = [2.56, height]
+        expected = qlrpfl(prop)
+
+        prop = copy.deepcopy(setup_prop_to_test_qlrpfl_pimter)
+        prop['hg'] = [2.56, height]
+        prop['pfl'] = index
+        actual = qlrpfl(prop)
+
+        assert actual['dist'] == expected['dist']
+        assert actual['dh'] == expected['dh']
+        assert actual['aref'] == pytest.approx(expected['aref'], rel=1e-9)
+
+        for j in range(0, 2):
+            assert actual['he'][j] == pytest.approx(expected['he'][j], rel=1e-9)
+            assert actual['dl'][j] == pytest.approx(expected['dl'][j], rel=1e-9)
+            assert actual['the'][j] == pytest.approx(expected['the'][j], rel=1e-9)
+
+
+def test_profile_index_long(setup_prop_to_test_qlrpfl_pimter_5):
+    """
+    Tests fits over short windows far along a long profile, where plain prefix sums
+    lose precision, against zlsq1.
+
+    """
+    pfl = setup_prop_to_test_qlrpfl_pimter_5['pfl']
+    index = ProfileIndex(pfl)
+
+    n = pfl[0]
+    xi = pfl[1]
+
+    windows = [(n - 5, n), (n // 2, n // 2 + 3), (n - 600, n - 1), (1, n - 1)]
+
+    for ja, jb in windows:
+        expected = zlsq1(pfl, ja * xi, jb * xi)
+        actual = index.fit(ja * xi, jb * xi)
+
+        assert actual[0] == pytest.approx(expected[0], abs=1e-4)
+        assert actual[1] == pytest.approx(expected[1], abs=1e-4)
@@ -0,0 +1,43 @@
+import copy
+import pickle
+import pytest
+
+from itmlogic.lrprop import lrprop
+from itmlogic.prop_state import PropState
+
+def test_prop_state(setup_prop_to_test_lrprop_uarea):
+    """
+    Test the typed propagation state, which holds the model parameters as attributes and
+    can be passed to any routine in place of the prop dict.
+
+    """
+    state = PropState.from_dict(setup_prop_to_test_lrprop_uarea)
+
+    assert state.he == [11.42820998659979, 5.744074582550858]
+    assert state['gme'] == 1.1775146373917748e-07
+    assert state.to_dict() == setup_prop_to_test_lrprop_uarea
+    assert 'aref' not in state
+
+    with pytest.raises(AttributeError):
+        state.aref
+
+    with pytest.raises(KeyError):
+        state['aref']
+
+    state['note'] = 'not a model parameter'
+    assert state['note'] == 'not a model parameter'
+
+    actual_state = lrprop(10000, state)
+    expected_prop = lrprop(10000, copy.deepcopy(setup_prop_to_test_lrprop_uarea))
+
+    assert actual_state is state
+    assert actual_state.aref == expected_prop['aref']
+    assert actual_state.ael == expected_prop['ael']
+
+    #the parameters are pickled by position rather than by name
+    assert len(pickle.dumps(state)) < len(pickle.dumps(state.to_dict()))
+
+    actual_state = pickle.loads(pickle.dumps(state))
+
+    assert isinstance(actual_state, PropState)
+    assert actual_state.to_dict() == state.to_dict()
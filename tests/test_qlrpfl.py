@@ -1,5 +1,8 @@
+import copy
 import pytest
-from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl
+import numpy as np
+from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl, qlrpfl_batch, stack_profiles
+from itmlogic.preparatory_subroutines.profile_index import ProfileIndex
 
 def test_qlrpfl(
     setup_prop_to_test_qlrpfl,
@@ -50,3 +53,59 @@ def test_qlrpfl(
     assert actual_answer['lvar'] == expected_answer['lvar']
     assert actual_answer['he'] == expected_answer['he']
     assert actual_answer['aref'] == expected_answer['aref']
+
+
+def test_qlrpfl_batch(setup_prop_to_test_qlrpfl_pimter):
+    """
+    Tests the batch preparatory subroutine against qlrpfl, for a set of links with
+    profiles of different lengths and different transmitter heights.
+
+    """
+    prop = setup_prop_to_test_qlrpfl_pimter
+    pfl = prop['pfl']
+
+    pfls = [pfl, [800, pfl[1]] + pfl[2:803], [60, pfl[1]] + pfl[2:63], pfl]
+    hg = [[10, 2.56], [50, 2.2], [130, 2.56], [3, 3]]
+
+    expected = []
+    for profile, heights in zip(pfls, hg):
+        link = copy.deepcopy(prop)
+        link['pfl'] = profile
+        link['hg'] = heights
+        expected.append(qlrpfl(link))
+
+    batch = copy.deepcopy(prop)
+    batch['pfl'] = stack_profiles(pfls)
+    batch['hg'] = np.array(hg).T
+
+    actual = qlrpfl_batch(batch)
+
+    assert actual['mdp'] == -1
+
+    for i, link in enumerate(expected):
+        assert actual['dist'][i] == link['dist']
+        assert actual['dh'][i] == pytest.approx(link['dh'], rel=1e-9)
+        assert actual['aref'][i] == pytest.approx(link['aref'], rel=1e-9, abs=1e-9)
+        assert actual['kwx'][i] == link['kwx']
+
+        for j in range(0, 2):
+            assert actual['the'][j, i] == pytest.approx(link['the'][j], rel=1e-9)
+            assert actual['dl'][j, i] == pytest.approx(link['dl'][j], rel=1e-9)
+            assert actual['he'][j, i] == pytest.approx(link['he'][j], rel=1e-9)
+
+    #the same links as the starts of one shared profile, with and without an index
+    for shared in [pfl, ProfileIndex(pfl)]:
+        batch = copy.deepcopy(prop)
+        batch['pfl'] = shared
+        batch['hg'] = np.array(hg).T
+
+        actual = qlrpfl_batch(batch, intervals=[pfl[0], 800, 60, pfl[0]])
+
+        for i, link in enumerate(expected):
+            assert actual['dist'][i] == link['dist']
+            assert actual['dh'][i] == pytest.approx(link['dh'], rel=1e-9)
+            assert actual['aref'][i] == pytest.approx(link['aref'], rel=1e-9, abs=1e-9)
+
+            for j in range(0, 2):
+                assert actual['the'][j, i] == pytest.approx(link['the'][j], rel=1e-9)
+                assert actual['he'][j, i] == pytest.approx(link['he'][j], rel=1e-9)
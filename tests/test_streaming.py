@@ -0,0 +1,91 @@
+import pytest
+import numpy as np
+from itmlogic.streaming import read_table, TableWriter, stream_table
+
+def test_read_table(tmp_path):
+
+    path = str(tmp_path / 'links.csv')
+
+    with open(path, 'w') as csv_file:
+        csv_file.write('id,d,hg\n')
+        for i in range(0, 7):
+            csv_file.write('link{},{},{}\n'.format(i, 10 * (i + 1), 1.5))
+
+    chunks = list(read_table(path, chunk_size=3))
+
+    assert [len(chunk['d']) for chunk in chunks] == [3, 3, 1]
+    assert chunks[0]['d'].dtype == float
+    assert list(chunks[2]['id']) == ['link6']
+    assert list(chunks[1]['d']) == [40, 50, 60]
+
+    chunks = list(read_table(path, chunk_size=10, columns=['hg']))
+
+    assert list(chunks[0]) == ['hg']
+
+    #codes with leading zeros stay strings, and the first chunk fixes each column type
+    with open(path, 'w') as csv_file:
+        csv_file.write('code,site,d\n')
+        csv_file.write('00123,a,10\n0042,b,20\n00007,12,30\n')
+
+    chunks = list(read_table(path, chunk_size=2))
+
+    assert list(chunks[0]['code']) == ['00123', '0042']
+    assert list(chunks[1]['site']) == ['12']
+    assert chunks[1]['d'].dtype == float
+
+    with open(path, 'w') as csv_file:
+        csv_file.write('d\n10\n20\nfar\n')
+
+    with pytest.raises(ValueError):
+        list(read_table(path, chunk_size=2))
+
+
+def test_stream_table(tmp_path):
+    """
+    Tests that results are written a chunk at a time, in the order of the links.
+
+    """
+    source = str(tmp_path / 'links.csv')
+    destination = str(tmp_path / 'results' / 'results.csv')
+
+    with TableWriter(source) as writer:
+        writer.write({'d': np.arange(0, 5)})
+        writer.write({'d': np.arange(5, 10)})
+
+    sizes = []
+
+    def compute(chunk):
+        sizes.append(len(chunk['d']))
+        return {'d': chunk['d'], 'loss': chunk['d'] * 2}
+
+    rows = stream_table(source, destination, compute, chunk_size=4)
+
+    assert rows == 10
+    assert sizes == [4, 4, 2]
+
+    results = list(read_table(destination))[0]
+
+    assert list(results['d']) == list(range(0, 10))
+    assert list(results['loss']) == [2 * i for i in range(0, 10)]
+
+
+def test_stream_table_parquet(tmp_path):
+
+    pytest.importorskip('pyarrow')
+
+    source = str(tmp_path / 'links.parquet')
+    destination = str(tmp_path / 'results.parquet')
+
+    with TableWriter(source) as writer:
+        writer.write({'d': np.arange(0, 5.0)})
+        writer.write({'d': np.arange(5, 10.0)})
+
+    rows = stream_table(
+        source, destination, lambda chunk: {'loss': chunk['d'] * 2}, chunk_size=3
+        )
+
+    assert rows == 10
+
+    results = np.concatenate([chunk['loss'] for chunk in read_table(destination)])
+
+    assert list(results) == [2 * i for i in range(0, 10)]
@@ -0,0 +1,72 @@
+import copy
+import pytest
+import numpy as np
+from itmlogic.misc.qerfi import qerfi
+from itmlogic.preparatory_subroutines.qlrpfl import qlrpfl
+from itmlogic.statistics.avar import avar
+from itmlogic.sweep import sweep_heights, sweep_frequencies
+
+def test_sweep_heights(setup_prop_to_test_qlrpfl_pimter):
+    """
+    Tests the antenna height sweep against qlrpfl and avar run for each height in turn, as
+    in scripts/pimter.py.
+
+    """
+    prop = setup_prop_to_test_qlrpfl_pimter
+    prop['lvar'] = 5
+    prop['mdvarx'] = 11
+
+    heights = [10, 25, 60, 130]
+    zr = np.array(qerfi([0.1, 0.5, 0.9]))[:, None]
+
+    avar1, actual = sweep_heights(copy.deepcopy(prop), [2.56, heights], zr, 0, zr)
+
+    assert avar1.shape == (3, 4)
+
+    for i, height in enumerate(heights):
+        expected = copy.deepcopy(prop)
+        expected['hg'] = [2.56, height]
+        expected = qlrpfl(expected)
+
+        assert actual['dh'][i] == expected['dh']
+        assert actual['aref'][i] == pytest.approx(expected['aref'], rel=1e-9)
+
+        for j in range(0, 2):
+            assert actual['he'][j, i] == pytest.approx(expected['he'][j], rel=1e-9)
+            assert actual['the'][j, i] == pytest.approx(expected['the'][j], rel=1e-9)
+
+        for k, z in enumerate(zr[:, 0]):
+            expected_avar, expected = avar(z, 0, z, expected)
+            assert avar1[k, i] == pytest.approx(expected_avar, rel=1e-9)
+
+
+def test_sweep_frequencies(setup_prop_to_test_qlrpfl):
+    """
+    Tests the frequency sweep against qlrpfl and avar run for each frequency in turn,
+    for the Crystal Palace to Mursley path.
+
+    """
+    prop = setup_prop_to_test_qlrpfl
+    prop['lvar'] = 5
+    prop['mdvarx'] = 11
+
+    frequencies = [41.5, 700, 1800, 3500]
+    zr = np.array(qerfi([0.1, 0.5, 0.9]))[:, None]
+
+    avar1, actual = sweep_frequencies(copy.deepcopy(prop), frequencies, zr, 0, zr)
+
+    assert avar1.shape == (3, 4)
+
+    for i, fmhz in enumerate(frequencies):
+        expected = copy.deepcopy(prop)
+        expected['wn'] = fmhz / 47.7
+        zq = complex(expected['eps'], 376.62 * expected['sgm'] / expected['wn'])
+        expected['zgnd'] = np.sqrt(zq - 1)
+        expected = qlrpfl(expected)
+
+        assert actual['dh'] == expected['dh']
+        assert actual['aref'][i] == pytest.approx(expected['aref'], rel=1e-9)
+
+        for k, z in enumerate(zr[:, 0]):
+            expected_avar, expected = avar(z, 0, z, expected)
+            assert avar1[k, i] == pytest.approx(expected_avar, rel=1e-9)
@@ -0,0 +1,423 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import numpy as np
+
+#the terrain module is a script, and needs the GIS packages it imports
+for package in ['pyproj', 'shapely', 'rasterio', 'fiona', 'rasterstats']:
+    pytest.importorskip(package)
+
+import pyproj
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import Point
+from shapely.ops import transform
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from terrain_module import (
+    DemSource, TileCache, build_tile_cache, geodesic_point_buffers, aeqd_transformer,
+    terrain_p2p, determine_num_samples, terrain_area, terrain_area_grid, lookup_grid)
+
+#a small raster, with cells of 0.01 degrees from 0.5 W, 51.6 N, tiled in blocks of 16
+DEM_TRANSFORM = from_origin(-0.5, 51.6, 0.01, 0.01)
+NODATA = -9999
+
+
+def dem_elevations():
+    """
+    Elevations of the small raster, linear in the row and column so that bilinear
+    interpolation between cell centres is exact, with a few nodata cells.
+
+    """
+    rows, cols = np.mgrid[0:40, 0:48]
+    z = (100 + 2 * rows + 3 * cols).astype('float32')
+    z[5, 30] = NODATA
+    z[22:24, 10] = NODATA
+
+    return z
+
+
+@pytest.fixture
+def dem_path(tmp_path):
+    """
+    Writes the small raster to a GeoTIFF.
+
+    """
+    z = dem_elevations()
+    path = str(tmp_path / 'dem.tif')
+
+    with rasterio.open(
+            path, 'w', driver='GTiff', width=48, height=40, count=1, dtype='float32',
+            crs='epsg:4326', transform=DEM_TRANSFORM, nodata=NODATA, tiled=True,
+            blockxsize=16, blockysize=16) as dst:
+        dst.write(z, 1)
+
+    return path
+
+
+def write_vrt(path, source):
+    """
+    Writes a vrt mosaic of a single raster file.
+
+    """
+    with open(path, 'w') as vrt:
+        vrt.write('''<VRTDataset rasterXSize="48" rasterYSize="40">
+  <SRS>EPSG:4326</SRS>
+  <GeoTransform>-0.5, 0.01, 0, 51.6, 0, -0.01</GeoTransform>
+  <VRTRasterBand dataType="Float32" band="1">
+    <NoDataValue>-9999</NoDataValue>
+    <SimpleSource>
+      <SourceFilename relativeToVRT="1">{}</SourceFilename>
+      <SourceBand>1</SourceBand>
+    </SimpleSource>
+  </VRTRasterBand>
+</VRTDataset>
+'''.format(os.path.basename(source)))
+
+    return path
+
+
+def cell_centre(row, col):
+    """
+    Coordinates of the centre of a cell of the small raster.
+
+    """
+    return DEM_TRANSFORM * (col + 0.5, row + 0.5)
+
+def single_site_buffer(lon, lat, distance_m):
+    """
+    The single site buffer, with a new transformer for every point, as the buffers were
+    found before geodesic_point_buffers.
+
+    """
+    aeqd = '+proj=aeqd +lat_0={lat} +lon_0={lon} +x_0=0 +y_0=0'
+    crs = aeqd.format(lat=lat, lon=lon)
+
+    transformer = pyproj.Transformer.from_crs(crs, "epsg:4326", always_xy=True)
+
+    return transform(transformer.transform, Point(0, 0).buffer(distance_m))
+
+
+def test_geodesic_point_buffers():
+    """
+    Tests the buffers of many points at once against the single site buffer.
+
+    """
+    lons = [-0.0749, 26.9976, -0.0749, 151.2]
+    lats = [51.4241, -3.5409, 51.4241, -33.9]
+
+    for distance_m in [20000, [500, 20000, 1000, 75000]]:
+        buffers = geodesic_point_buffers(lons, lats, distance_m)
+
+        distances = np.broadcast_to(distance_m, (len(lons),))
+
+        assert len(buffers) == len(lons)
+
+        for buffer, lon, lat, distance in zip(buffers, lons, lats, distances):
+            expected = single_site_buffer(lon, lat, distance)
+
+            assert np.allclose(
+                np.array(buffer.exterior.coords), np.array(expected.exterior.coords),
+                rtol=0, atol=1e-9
+                )
+
+
+def test_aeqd_transformer():
+    """
+    Tests that the transformer of each point is set up once and then served from the
+    cache.
+
+    """
+    aeqd_transformer.cache_clear()
+
+    geodesic_point_buffers([-0.0749, 26.9976, -0.0749], [51.4241, -3.5409, 51.4241], 1000)
+
+    info = aeqd_transformer.cache_info()
+    assert info.misses == 2
+    assert info.hits == 1
+
+    assert aeqd_transformer(-0.0749, 51.4241) is aeqd_transformer(-0.0749, 51.4241)
+    assert aeqd_transformer.cache_info().hits == 3
+
+
+def test_dem_source_read(dem_path):
+    """
+    Tests reading cells across blocks, with NaN for nodata and outside the raster.
+
+    """
+    z = dem_elevations()
+
+    with DemSource(dem_path) as dem:
+        assert (dem.block_height, dem.block_width) == (16, 16)
+
+        rows, cols = np.mgrid[0:40, 0:48]
+        actual = dem.read(rows, cols)
+
+        assert np.array_equal(np.isnan(actual), z == NODATA)
+        assert np.array_equal(actual[z != NODATA], z[z != NODATA])
+
+        assert np.isnan(dem.read([-1, 0, 40, 0], [0, -1, 0, 48])).all()
+
+
+def test_dem_source_cache(dem_path):
+    """
+    Tests that the decoded blocks are kept up to the byte budget, evicting the least
+    recently used.
+
+    """
+    block_bytes = 16 * 16 * 4
+
+    with DemSource(dem_path, cache_bytes=2 * block_bytes) as dem:
+        dem.read(0, 0)
+        dem.read(0, 16)
+        assert list(dem._blocks) == [(0, 0), (0, 1)]
+        assert dem._size == 2 * block_bytes
+
+        #reading the first block again makes the second the least recently used
+        dem.read(1, 1)
+        dem.read(16, 0)
+
+        assert list(dem._blocks) == [(0, 0), (1, 0)]
+        assert dem._size == 2 * block_bytes
+
+        #a block at the edge is smaller than the others
+        dem.read(39, 47)
+
+        assert list(dem._blocks) == [(1, 0), (2, 2)]
+        assert dem._size == block_bytes + 8 * 16 * 4
+
+    assert dem._size == 0 and not dem._blocks
+
+
+def test_dem_source_sample(dem_path):
+    """
+    Tests bilinear sampling between cell centres, and the fallback to the nearest cell at
+    the edge of the raster and next to nodata.
+
+    """
+    with DemSource(dem_path) as dem:
+        #between cell centres, a quarter of the way down and a third across
+        x, y = DEM_TRANSFORM * (10.5 + 1 / 3, 20.75)
+
+        assert dem.sample([x], [y])[0] == pytest.approx(100 + 2 * 20.25 + 3 * (10 + 1 / 3))
+
+        #cell centres
+        x, y = cell_centre(np.array([0, 39, 12]), np.array([0, 47, 33]))
+        assert np.allclose(dem.sample(x, y), [100, 100 + 78 + 141, 100 + 24 + 99])
+
+        #within half a cell of the edge of the raster, the nearest cell is used
+        x, y = DEM_TRANSFORM * (np.array([0.2, 47.9, 20.5]), np.array([10.5, 39.8, 0.1]))
+        assert np.allclose(dem.sample(x, y), [100 + 20, 100 + 78 + 141, 100 + 60])
+
+        #next to a nodata cell, the nearest cell is used, and NaN in a nodata cell
+        x, y = DEM_TRANSFORM * (np.array([29.7, 30.5, 10.2]), np.array([5.5, 5.5, 23.3]))
+        assert np.allclose(dem.sample(x, y)[0], 100 + 10 + 87)
+        assert np.isnan(dem.sample(x, y)[1:]).all()
+
+        #outside the raster
+        x, y = DEM_TRANSFORM * (np.array([-0.5, 48.5]), np.array([5, 5]))
+        assert np.isnan(dem.sample(x, y)).all()
+
+        #along a line, including both ends
+        start = cell_centre(3, 2)
+        end = cell_centre(3, 12)
+        assert np.allclose(dem.sample_line(start, end, 6), 100 + 6 + 3 * np.arange(2, 13, 2))
+
+
+def test_dem_source_read_bounds(dem_path):
+    """
+    Tests reading the cells within a bounding box, including cells beyond the raster.
+
+    """
+    z = dem_elevations()
+
+    with DemSource(dem_path) as dem:
+        left, top = DEM_TRANSFORM * (44, 2)
+        right, bottom = DEM_TRANSFORM * (50.5, 5.5)
+
+        actual, actual_transform = dem.read_bounds((left, bottom, right, top))
+
+        assert actual.shape == (4, 7)
+        assert np.array_equal(actual[:, :4], z[2:6, 44:48])
+        assert np.isnan(actual[:, 4:]).all()
+
+        assert actual_transform.c == pytest.approx(left)
+        assert actual_transform.f == pytest.approx(top)
+
+
+def test_tile_cache(dem_path, tmp_path):
+    """
+    Tests sampling the tile cache against the raster it was built from.
+
+    """
+    directory = build_tile_cache(dem_path, str(tmp_path / 'cache'), tile_size=16)
+
+    assert sorted(os.listdir(str(tmp_path))) == ['cache', 'dem.tif']
+    assert len(os.listdir(directory)) == 3 * 3 + 1
+
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-0.52, -0.0, 500)
+    y = rng.uniform(51.18, 51.62, 500)
+
+    rows, cols = np.mgrid[-1:41, -1:49]
+
+    with DemSource(dem_path) as dem, TileCache(directory) as tiles:
+        assert np.array_equal(tiles.read(rows, cols), dem.read(rows, cols), equal_nan=True)
+        assert np.array_equal(tiles.sample(x, y), dem.sample(x, y), equal_nan=True)
+
+        bounds = (-0.3, 51.3, -0.05, 51.45)
+        expected, expected_transform = dem.read_bounds(bounds)
+        actual, actual_transform = tiles.read_bounds(bounds)
+
+        assert np.array_equal(actual, expected, equal_nan=True)
+        assert actual_transform == expected_transform
+
+        #the tiles are memory maps of their files
+        assert all(isinstance(tile, np.memmap) for tile in tiles._blocks.values())
+
+
+def test_build_tile_cache_stale(dem_path, tmp_path):
+    """
+    Tests that the tile cache of a vrt is only rebuilt when the vrt or one of the files
+    it reads changes.
+
+    """
+    vrt = write_vrt(str(tmp_path / 'dem.vrt'), dem_path)
+    directory = str(tmp_path / 'cache')
+
+    build_tile_cache(vrt, directory, tile_size=16)
+    index = os.path.join(directory, 'index.json')
+    built = os.stat(index).st_mtime_ns
+
+    assert build_tile_cache(vrt, directory, tile_size=16) == directory
+    assert os.stat(index).st_mtime_ns == built
+
+    #a new version of the raster behind the vrt, which itself is unchanged
+    z = dem_elevations()
+    z[z != NODATA] += 1
+
+    with rasterio.open(dem_path, 'r+') as dst:
+        dst.write(z, 1)
+    os.utime(dem_path, ns=(built + 10**9, built + 10**9))
+
+    build_tile_cache(vrt, directory, tile_size=16)
+
+    with TileCache(directory) as tiles:
+        assert tiles.read(0, 0) == 101
+        assert np.isnan(tiles.read(5, 30))
+
+    assert sorted(os.listdir(str(tmp_path))) == ['cache', 'dem.tif', 'dem.vrt']
+
+
+def test_build_tile_cache_concurrent(dem_path, tmp_path):
+    """
+    Tests that several processes rebuilding a stale tile cache at once leave a single
+    complete cache.
+
+    """
+    directory = str(tmp_path / 'cache')
+
+    build_tile_cache(dem_path, directory, tile_size=32)
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(
+            lambda _: build_tile_cache(dem_path, directory, tile_size=16), range(4)))
+
+    assert results == [directory] * 4
+    assert sorted(os.listdir(str(tmp_path))) == ['cache', 'dem.tif']
+    assert len(os.listdir(directory)) == 3 * 3 + 1
+
+    rows, cols = np.mgrid[0:40, 0:48]
+
+    with DemSource(dem_path) as dem, TileCache(directory) as tiles:
+        assert tiles.block_height == 16
+        assert np.array_equal(tiles.read(rows, cols), dem.read(rows, cols), equal_nan=True)
+
+
+def test_terrain_p2p(dem_path):
+    """
+    Tests the sample positions of a terrain profile, evenly spaced along the geodesic
+    from the transmitter to the receiver inclusive, and NaN elevations in nodata cells.
+
+    """
+    #along the edge between rows 22 and 23, across the nodata cells in column 10
+    line = {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'LineString',
+            'coordinates': [(-0.45, 51.37), (-0.05, 51.37)],
+        },
+        'properties': {},
+    }
+
+    profile, distance_km, points = terrain_p2p(dem_path, line)
+
+    geod = pyproj.Geod(ellps='WGS84')
+    distance_m = geod.inv(-0.45, 51.37, -0.05, 51.37)[2]
+
+    assert distance_km == distance_m / 1e3
+    assert isinstance(profile, np.ndarray)
+    assert len(profile) == len(points) == determine_num_samples(distance_m) == 596
+
+    lons, lats = np.array([point['geometry']['coordinates'] for point in points]).T
+
+    assert (lons[0], lats[0]) == (-0.45, 51.37)
+    assert lons[-1] == pytest.approx(-0.05, abs=1e-9)
+    assert lats[-1] == pytest.approx(51.37, abs=1e-9)
+
+    spacing = geod.inv(lons[:-1], lats[:-1], lons[1:], lats[1:])[2]
+    assert np.allclose(spacing, distance_m / 595, rtol=0, atol=1e-6)
+
+    #the geodesic bows north of the parallel, by less than a fiftieth of a cell
+    assert (lats[1:-1] > 51.37).all() and (lats < 51.37 + 2e-4).all()
+
+    cols = (lons + 0.5) / 0.01
+    rows = (51.6 - lats) / 0.01
+
+    nodata = np.floor(cols) == 10
+    assert nodata.sum() == 15
+    assert np.isnan(profile[nodata]).all()
+    assert np.isnan([point['properties']['elevation'] for point in points])[nodata].all()
+
+    #away from the nodata cells, the elevations are interpolated bilinearly
+    away = np.abs(cols - 10.5) > 1
+    assert np.allclose(profile[away], 100 + 2 * (rows[away] - 0.5) + 3 * (cols[away] - 0.5))
+
+    with DemSource(dem_path) as dem:
+        actual, actual_km, actual_points = terrain_p2p(dem, line, return_points=False)
+
+    assert np.array_equal(actual, profile, equal_nan=True)
+    assert actual_km == distance_km and actual_points is None
+
+
+def test_terrain_area_grid(dem_path):
+    """
+    Tests the terrain irregularity parameter looked up from the grid against
+    terrain_area at single sites, including one beside a nodata cell at the edge of the
+    raster.
+
+    """
+    bounds = (-0.35, 51.3, -0.1, 51.56)
+
+    with DemSource(dem_path) as dem:
+        dh, transform = terrain_area_grid(dem, bounds, 5000)
+
+        lons = [-0.3, -0.2, -0.105, -0.2, -0.345]
+        lats = [51.35, 51.45, 51.33, 51.54, 51.555]
+
+        actual = lookup_grid(dh, transform, lons, lats)
+
+        #terrain_area rounds to whole meters, and its zone is a geodesic buffer
+        for value, lon, lat in zip(actual, lons, lats):
+            assert abs(value - terrain_area(dem, lon, lat, 5000)) <= 1
+
+        #the lookup is the grid cell containing each site
+        cols, rows = ~transform * (np.array(lons), np.array(lats))
+        assert np.array_equal(actual, dh[rows.astype(int), cols.astype(int)])
+
+    expected, expected_transform = terrain_area_grid(dem_path, bounds, 5000)
+
+    assert np.array_equal(dh, expected, equal_nan=True)
+    assert transform == expected_transform
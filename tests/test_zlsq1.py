@@ -1,5 +1,6 @@
 import pytest
-from itmlogic.preparatory_subroutines.zlsq1 import zlsq1
+import numpy as np
+from itmlogic.preparatory_subroutines.zlsq1 import zlsq1, zlsq1_batch
 
 def test_zlsq1(setup_z):
     """
@@ -14,3 +15,31 @@ def test_zlsq1(setup_z):
 
     assert xa == 57.3924
     assert xb == 408.1239
+
+    #unchanged to the last digit from the original looped implementation
+    assert zlsq1(setup_z, 0, 144) == (57.39243855258562, 408.123856226287)
+
+
+def test_zlsq1_batch(setup_z):
+    """
+    Tests the batch least squares fit against zlsq1, over several fitting ranges.
+
+    """
+    x1 = np.array([0, 10, 50.5, 3, 70])
+    x2 = np.array([144, 100, 51, 144, 71])
+
+    z = np.tile(setup_z, (len(x1), 1))
+
+    z0, zn = zlsq1_batch(z, x1, x2)
+
+    for i in range(len(x1)):
+        expected_z0, expected_zn = zlsq1(setup_z, x1[i], x2[i])
+
+        assert z0[i] == expected_z0
+        assert zn[i] == expected_zn
+
+    #many windows on the one profile
+    z0, zn = zlsq1_batch(setup_z, x1, x2)
+
+    for i in range(len(x1)):
+        assert (z0[i], zn[i]) == zlsq1(setup_z, x1[i], x2[i])